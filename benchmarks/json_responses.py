@@ -0,0 +1,85 @@
+"""Compare the response_model path with the pre-serialized JSON path.
+
+Run with `python -m benchmarks.json_responses [--rows 10000] [--repeat 5]`.
+It needs no database, rows are built in memory.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, List
+from uuid import uuid4
+
+from fastapi.responses import UJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from car_rental_service.db.models.car import Car
+from car_rental_service.services.catalog.catalog import CarRecord
+from car_rental_service.web.api.search.schema import SearchOutputDTO
+from car_rental_service.web.responses import RawJSONResponse, encode_rows
+
+
+def make_records(count: int) -> List[CarRecord]:
+    now = datetime(2022, 8, 1, 12, 30)
+    return [
+        CarRecord(
+            id=car_id,
+            uuid=uuid4(),
+            created_at=now,
+            updated_at=now + timedelta(seconds=car_id),
+            name=f"Car {car_id}",
+            brand="Brand",
+            registered_number=f"KA-{car_id:06d}",
+            category_id=car_id % 5 + 1,
+            zone_id=car_id % 3 + 1,
+        )
+        for car_id in range(1, count + 1)
+    ]
+
+
+async def response_model_path(cars: List[Car]) -> bytes:
+    field = create_response_field(name="search", type_=List[SearchOutputDTO])
+    content = await serialize_response(field=field, response_content=cars)
+    return UJSONResponse(content).body
+
+
+async def raw_json_path(records: List[CarRecord]) -> bytes:
+    body = encode_rows(records, SearchOutputDTO.__fields__)
+    return RawJSONResponse(body).body
+
+
+async def measure(
+    name: str,
+    path: Callable[[Any], Awaitable[bytes]],
+    rows: List[Any],
+    repeat: int,
+) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await path(rows)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(f"{name:<16} best {best * 1000:8.1f} ms over {repeat} runs")
+    return best
+
+
+async def main(rows: int, repeat: int) -> None:
+    records = make_records(rows)
+    cars = [Car(**record._asdict()) for record in records]
+
+    assert await response_model_path(cars) == await raw_json_path(records)
+
+    print(f"Serializing {rows} cars")
+    model = await measure("response_model", response_model_path, cars, repeat)
+    raw = await measure("raw json", raw_json_path, records, repeat)
+    print(f"speedup x{model / raw:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
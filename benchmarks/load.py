@@ -0,0 +1,317 @@
+"""Load test searches and bookings against a seeded database.
+
+Run with `python -m benchmarks.load [--cars 500] [--reservations 20000]
+[--requests 5000] [--concurrency 50]`. It creates its own database next
+to the configured one, seeds it, then drives concurrent searches and
+bookings through the application in process with httpx, so no server
+is needed. Redis is faked unless `--redis-url` is given.
+
+It reports throughput and p50/p95/p99 latencies per operation. With
+`--baseline`, the run fails when an operation is slower or less
+throughput than the saved report by more than `--max-regression`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_scoped_session
+from sqlalchemy.orm import sessionmaker
+
+from car_rental_service.web.application import get_app  # noqa: I001
+from car_rental_service.db.meta import meta
+from car_rental_service.db.models import load_all_models
+from car_rental_service.db.models.car import Car
+from car_rental_service.db.models.category import Category
+from car_rental_service.db.models.reservation import Reservation
+from car_rental_service.db.models.user import User
+from car_rental_service.db.pool import create_pooled_engine
+from car_rental_service.db.replicas import ReplicaSet
+from car_rental_service.db.utils import create_database, drop_database
+from car_rental_service.db.warmup import warm_up_pool
+from car_rental_service.schema import ReservationStatus
+from car_rental_service.services.catalog.catalog import CarCatalog
+from car_rental_service.services.payment.gateway import SimulatedPaymentGateway
+from car_rental_service.services.redis.pool import (
+    InstrumentedConnectionPool,
+    create_redis_pool,
+)
+from car_rental_service.settings import settings
+
+SEED_BATCH_SIZE = 5000
+SEARCH, BOOKING = "search", "booking"
+# Booking outcomes which are a correct answer under contention.
+REJECTED_BOOKINGS = frozenset((402, 406, 409))
+PERCENTILES = {"p50": 49, "p95": 94, "p99": 98}
+
+
+def trip(rng: random.Random, first_day: date, days: int) -> Dict[str, str]:
+    """A trip of one to seven days starting within `days` of `first_day`."""
+    start = first_day + timedelta(days=rng.randrange(days))
+    end = start + timedelta(days=rng.randint(0, 6))
+    return {"start_date": start.isoformat(), "end_date": end.isoformat()}
+
+
+async def seed(
+    engine: AsyncEngine,
+    args: argparse.Namespace,
+    rng: random.Random,
+) -> None:
+    """Create the schema, then the fleet, users and past reservations.
+
+    Reservations of a car follow each other with a gap, so none overlap.
+    """
+    async with engine.begin() as connection:
+        await connection.run_sync(meta.create_all)
+        await connection.execute(
+            insert(Category),
+            [{"name": f"Category {index}"} for index in range(1, 6)],
+        )
+        await connection.execute(
+            insert(Car),
+            [
+                {
+                    "name": f"Car {car_id}",
+                    "brand": rng.choice(("Audi", "BMW", "Kia", "Seat", "Tata")),
+                    "registered_number": f"KA-{car_id:06d}",
+                    "category_id": car_id % 5 + 1,
+                }
+                for car_id in range(1, args.cars + 1)
+            ],
+        )
+        await connection.execute(
+            insert(User),
+            [
+                {"name": f"User {user_id}", "email": f"user{user_id}@example.com"}
+                for user_id in range(1, args.users + 1)
+            ],
+        )
+        next_free = [args.first_day] * args.cars
+        rows = []
+        for index in range(args.reservations):
+            car_index = index % args.cars
+            start = next_free[car_index] + timedelta(days=rng.randint(0, 3))
+            end = start + timedelta(days=rng.randint(0, 6))
+            next_free[car_index] = end + timedelta(days=1)
+            rows.append(
+                {
+                    "car_id": car_index + 1,
+                    "user_id": rng.randint(1, args.users),
+                    "start_date": start,
+                    "end_date": end,
+                    "status": ReservationStatus.success.value,
+                },
+            )
+            if len(rows) == SEED_BATCH_SIZE:
+                await connection.execute(insert(Reservation), rows)
+                rows = []
+        if rows:
+            await connection.execute(insert(Reservation), rows)
+    # Seeded trips end within this many days, searches and bookings land there.
+    args.days = max((day - args.first_day).days for day in next_free) + 1
+
+
+async def start_app(engine: AsyncEngine, args: argparse.Namespace) -> FastAPI:
+    """Build the application with the state its startup would set."""
+    app = get_app()
+    app.state.db_engine = engine
+    app.state.db_session_factory = async_scoped_session(
+        sessionmaker(engine, expire_on_commit=False, class_=AsyncSession),
+        scopefunc=asyncio.current_task,
+    )
+    app.state.db_replicas = ReplicaSet([], settings.db_replica_max_lag)
+    if args.redis_url:
+        app.state.redis_pool = create_redis_pool(args.redis_url)
+    else:
+        from fakeredis import FakeServer  # noqa: WPS433
+        from fakeredis.aioredis import FakeConnection  # noqa: WPS433
+
+        app.state.redis_pool = InstrumentedConnectionPool(
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+            connection_class=FakeConnection,
+            server=FakeServer(),
+        )
+    app.state.payment_gateway = SimulatedPaymentGateway(
+        latency=args.payment_latency,
+    )
+    app.state.car_catalog = CarCatalog()
+    if settings.car_catalog:
+        async with AsyncSession(engine) as session:
+            await app.state.car_catalog.load(session)
+    await warm_up_pool(engine, min(args.concurrency, settings.db_worker_pool_size))
+    return app
+
+
+async def drive(
+    client: AsyncClient,
+    args: argparse.Namespace,
+    rng: random.Random,
+) -> Dict[str, Any]:
+    """Send the requests from `concurrency` workers, timing each one."""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    remaining = args.requests
+
+    async def worker() -> None:  # noqa: WPS430
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            dates = trip(rng, args.first_day, args.days)
+            if rng.random() < args.booking_ratio:
+                operation = BOOKING
+                request = client.post(
+                    "/api/reservations/",
+                    json={
+                        "car_id": rng.randint(1, args.cars),
+                        "user_id": rng.randint(1, args.users),
+                        **dates,
+                    },
+                )
+            else:
+                operation = SEARCH
+                request = client.get("/api/search/", params=dates)
+            started = time.perf_counter()
+            response = await request
+            latencies[operation].append(time.perf_counter() - started)
+            statuses[operation][response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    return {
+        "elapsed": time.perf_counter() - started,
+        "latencies": latencies,
+        "statuses": statuses,
+    }
+
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Throughput, latency percentiles in ms and outcomes per operation."""
+    report = {}
+    for operation, latencies in sorted(run["latencies"].items()):
+        statuses = run["statuses"][operation]
+        if operation == SEARCH:
+            errors = sum(count for code, count in statuses.items() if code != 200)
+            rejected = 0
+        else:
+            rejected = sum(statuses[code] for code in REJECTED_BOOKINGS)
+            errors = sum(statuses.values()) - statuses[204] - rejected
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        report[operation] = {
+            "requests": len(latencies),
+            "throughput": len(latencies) / run["elapsed"],
+            **{name: quantiles[index] * 1000 for name, index in PERCENTILES.items()},
+            "rejected": rejected,
+            "errors": errors,
+        }
+    return report
+
+
+def regressions(
+    report: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    max_regression: float,
+) -> List[str]:
+    """Describe every metric worse than the baseline by more than the margin."""
+    found = []
+    for operation, metrics in report.items():
+        previous = baseline.get(operation)
+        if previous is None:
+            continue
+        for name in PERCENTILES:
+            if metrics[name] > previous[name] * (1 + max_regression):
+                found.append(
+                    f"{operation} {name} {metrics[name]:.1f} ms "
+                    f"> {previous[name]:.1f} ms",
+                )
+        if metrics["throughput"] < previous["throughput"] * (1 - max_regression):
+            found.append(
+                f"{operation} throughput {metrics['throughput']:.0f}/s "
+                f"< {previous['throughput']:.0f}/s",
+            )
+    return found
+
+
+def print_report(report: Dict[str, Dict[str, float]]) -> None:
+    print(
+        f"{'operation':<10}{'requests':>10}{'req/s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rejected':>10}{'errors':>8}",
+    )
+    for operation, metrics in report.items():
+        print(
+            f"{operation:<10}{metrics['requests']:>10}"
+            f"{metrics['throughput']:>10.0f}{metrics['p50']:>10.1f}"
+            f"{metrics['p95']:>10.1f}{metrics['p99']:>10.1f}"
+            f"{metrics['rejected']:>10}{metrics['errors']:>8}",
+        )
+
+
+async def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    settings.db_base = args.database
+    load_all_models()
+    await create_database()
+    engine = create_pooled_engine(str(settings.db_url))
+    try:
+        started = time.perf_counter()
+        await seed(engine, args, rng)
+        print(
+            f"Seeded {args.cars} cars and {args.reservations} reservations "
+            f"in {time.perf_counter() - started:.1f} s",
+        )
+        app = await start_app(engine, args)
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            run = await drive(client, args, rng)
+        await app.state.redis_pool.disconnect()
+    finally:
+        await engine.dispose()
+        if not args.keep_database:
+            await drop_database()
+
+    report = summarize(run)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if any(metrics["errors"] for metrics in report.values()):
+        print("Some requests failed.")
+        return 1
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            found = regressions(report, json.load(baseline), args.max_regression)
+        for regression in found:
+            print(f"Regression: {regression}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--database", default=f"{settings.db_base}_load")
+    parser.add_argument("--keep-database", action="store_true")
+    parser.add_argument("--cars", type=int, default=500)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reservations", type=int, default=20_000)
+    parser.add_argument("--first-day", type=date.fromisoformat, default="2023-01-01")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--booking-ratio", type=float, default=0.2)
+    parser.add_argument("--payment-latency", type=float, default=0.05)
+    parser.add_argument("--redis-url", help="defaults to an in-process fake")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,10 +1,38 @@
+import os
+import tempfile
+from pathlib import Path
+
 import uvicorn
 
+from car_rental_service.services.metrics.metrics import (
+    MULTIPROC_DIR_ENV,
+    multiprocess_dir,
+)
 from car_rental_service.settings import settings
 
 
+def share_metrics_dir() -> None:
+    """
+    Makes the workers write their metrics to a shared directory.
+
+    Each worker otherwise keeps its own metrics in memory and a scrape
+    only sees the worker which answered it.
+    """
+    if settings.workers_count == 1:
+        return
+    directory = Path(
+        multiprocess_dir() or tempfile.mkdtemp(prefix="car_rental_service_metrics_"),
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    # Files left by a previous run would be added to the new values.
+    for metrics_file in directory.glob("*.db"):
+        metrics_file.unlink()
+    os.environ[MULTIPROC_DIR_ENV] = str(directory)
+
+
 def main() -> None:
     """Entrypoint of the application."""
+    share_metrics_dir()
     uvicorn.run(
         "car_rental_service.web.application:get_app",
         workers=settings.workers_count,
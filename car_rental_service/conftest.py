@@ -5,12 +5,20 @@ from fakeredis import FakeServer
 from fakeredis.aioredis import FakeConnection
 from fastapi import FastAPI
 from httpx import AsyncClient
-from redis.asyncio import ConnectionPool
+from redis.asyncio import ConnectionPool, Redis
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from car_rental_service.db.dependencies import get_db_session
+from car_rental_service.db.dependencies import get_db_read_session, get_db_session
 from car_rental_service.db.utils import create_database, drop_database
+from car_rental_service.services.catalog.catalog import CarCatalog
+from car_rental_service.services.catalog.dependency import get_car_catalog
+from car_rental_service.services.payment.dependency import get_payment_gateway
+from car_rental_service.services.payment.gateway import (
+    PaymentGateway,
+    SimulatedPaymentGateway,
+)
 from car_rental_service.services.redis.dependency import get_redis_pool
 from car_rental_service.settings import settings
 from car_rental_service.web.application import get_app
@@ -66,6 +74,9 @@ async def dbsession(
     """
     connection = await _engine.connect()
     trans = await connection.begin()
+    # DAOs commit and roll back their own transactions, which only end
+    # a savepoint of the test's transaction then.
+    await connection.begin_nested()
 
     session_maker = sessionmaker(
         connection,
@@ -74,6 +85,11 @@ async def dbsession(
     )
     session = session_maker()
 
+    @event.listens_for(session.sync_session, "after_transaction_end")
+    def restart_savepoint(*args: Any) -> None:  # noqa: WPS430
+        if not connection.sync_connection.in_nested_transaction():
+            connection.sync_connection.begin_nested()
+
     try:
         await setup_db(session)
         yield session
@@ -99,6 +115,40 @@ async def fake_redis_pool() -> AsyncGenerator[ConnectionPool, None]:
     await pool.disconnect()
 
 
+@pytest.fixture
+async def fake_redis(
+    fake_redis_pool: ConnectionPool,
+) -> AsyncGenerator[Redis, None]:
+    """
+    Get a client of the fake redis, as requests get one.
+
+    :param fake_redis_pool: pool of the fake redis.
+    :yield: redis client.
+    """
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        yield redis
+
+
+@pytest.fixture
+def payment_gateway() -> PaymentGateway:
+    """
+    Get a payment gateway which approves every charge instantly.
+
+    :return: simulated payment gateway.
+    """
+    return SimulatedPaymentGateway(latency=0)
+
+
+@pytest.fixture
+def car_catalog() -> CarCatalog:
+    """
+    Get a car catalog which is not loaded, so searches use SQL.
+
+    :return: empty car catalog.
+    """
+    return CarCatalog()
+
+
 async def setup_db(dbsession: AsyncSession):
     await dbsession.execute(
         """
@@ -119,10 +169,10 @@ async def setup_db(dbsession: AsyncSession):
     )
     await dbsession.execute(
         """
-        INSERT INTO "public"."cars" ("id", "uuid", "created_at", "updated_at", "is_active", "name", "brand", "registered_number", "category_id") VALUES
-        (1, '754bb404-90a9-423c-b512-513f25374eb0', '2022-08-04 22:36:55.150335', '2022-08-04 22:36:55.150335', 't', 'Car A', 'Brand A', 'HR26AZ1234', 1),
-        (2, '5bf40d50-d32b-4019-806b-8ec4b83c6764', '2022-08-04 22:36:55.150335', '2022-08-04 22:36:55.150335', 't', 'Car B', 'Brand B', 'HR26AZ5678', 2),
-        (3, '9d0aa319-8bbe-4ac7-955b-9271d15480b0', '2022-08-04 22:36:55.150335', '2022-08-04 22:36:55.150335', 't', 'Car C', 'Brand C', 'HR26AZ7891', 3);
+        INSERT INTO "public"."cars" ("id", "uuid", "created_at", "updated_at", "is_active", "name", "brand", "registered_number", "category_id", "zone_id") VALUES
+        (1, '754bb404-90a9-423c-b512-513f25374eb0', '2022-08-04 22:36:55.150335', '2022-08-04 22:36:55.150335', 't', 'Car A', 'Brand A', 'HR26AZ1234', 1, 1),
+        (2, '5bf40d50-d32b-4019-806b-8ec4b83c6764', '2022-08-04 22:36:55.150335', '2022-08-04 22:36:55.150335', 't', 'Car B', 'Brand B', 'HR26AZ5678', 2, 1),
+        (3, '9d0aa319-8bbe-4ac7-955b-9271d15480b0', '2022-08-04 22:36:55.150335', '2022-08-04 22:36:55.150335', 't', 'Car C', 'Brand C', 'HR26AZ7891', 3, 2);
         """,
     )
 
@@ -142,12 +192,25 @@ async def setup_db(dbsession: AsyncSession):
         (24, 'fd5c5ee5-ddc5-422a-8bcf-7b131bca5f78', '2022-08-05 01:17:53.427526', '2022-08-05 01:17:53.427526', 't', 1, '2022-08-05', '2022-08-05', 'SUCCESS', 2);
         """,
     )
+    # Rows above have explicit ids, new rows must be numbered after them.
+    for table in (
+        "car_availability_zones",
+        "categories",
+        "cars",
+        "users",
+        "reservations",
+    ):
+        await dbsession.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), max(id)) FROM {table}",  # noqa: E501, S608
+        )
 
 
 @pytest.fixture
 def fastapi_app(
     dbsession: AsyncSession,
     fake_redis_pool: ConnectionPool,
+    payment_gateway: PaymentGateway,
+    car_catalog: CarCatalog,
 ) -> FastAPI:
     """
     Fixture for creating FastAPI app.
@@ -156,7 +219,10 @@ def fastapi_app(
     """
     application = get_app()
     application.dependency_overrides[get_db_session] = lambda: dbsession
+    application.dependency_overrides[get_db_read_session] = lambda: dbsession
     application.dependency_overrides[get_redis_pool] = lambda: fake_redis_pool
+    application.dependency_overrides[get_payment_gateway] = lambda: payment_gateway
+    application.dependency_overrides[get_car_catalog] = lambda: car_catalog
     return application  # noqa: WPS331
 
 
@@ -1,14 +1,38 @@
-from datetime import date, datetime
-from typing import List
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from fastapi import Depends
 
-from sqlalchemy import select
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import and_, exists, func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
 
-from car_rental_service.db.dependencies import get_db_session
-from car_rental_service.schema import ReservationStatus
+from car_rental_service.db.dependencies import get_db_read_session, get_db_session
 from car_rental_service.db.models.reservation import Reservation
 from car_rental_service.db.models.car import Car
+from car_rental_service.schema import CarSort
+from car_rental_service.services.catalog.catalog import (
+    CAR_RECORD_COLUMNS,
+    FACETS,
+    CarCatalog,
+    CarFilters,
+    CarRecord,
+)
+from car_rental_service.services.catalog.dependency import get_car_catalog
+from car_rental_service.services.metrics.metrics import (
+    DAO_STAGE_SECONDS,
+    SINGLE_FLIGHT_SHARED_TOTAL,
+)
+from car_rental_service.services.redis import search_cache
+from car_rental_service.services.redis.dependency import get_redis
+from car_rental_service.services.redis.occupancy import reserved_car_ids
+from car_rental_service.settings import settings
+from car_rental_service.utils import SingleFlight, free_ranges
+
+# Searches in flight in this worker, by their parameters.
+SEARCH_FLIGHTS = SingleFlight()
 
 
 class CarDAO:
@@ -16,45 +40,444 @@ class CarDAO:
 
     def __init__(
         self,
-        session: AsyncSession = Depends(get_db_session),
+        session: AsyncSession = Depends(get_db_read_session),
+        redis: Redis = Depends(get_redis),
+        catalog: CarCatalog = Depends(get_car_catalog),
+        primary_session: AsyncSession = Depends(get_db_session),
     ) -> None:
         self.session = session
+        self.redis = redis
+        self.catalog = catalog
+        # Shared results must come from the primary, a replica may lag.
+        self.primary_session = primary_session
+        self.reads_replica = session is not primary_session
 
     async def get_available_cars(
         self,
         start_date: str,
         end_date: str,
         car_id: int = None,
-    ) -> List[Car]:
+        filters: CarFilters = CarFilters(),
+        sort: CarSort = CarSort.id,
+        limit: Optional[int] = None,
+    ) -> List[CarRecord]:
+        """Get all cars which are not reserved for any day of the given interval.
+
+        Reserved cars come from the occupancy index when it is enabled
+        and ready. With the car catalog loaded, only reserved car ids are
+        looked up and the catalog is filtered in memory. Otherwise
+        availability is resolved in a single anti-join so the reserved car
+        ids never travel to Python and back.
+
+        Identical searches running at the same time in the worker share
+        one lookup, if they read the same database. With the search cache
+        enabled, reserved cars are reused across workers until a booking
+        touches the window.
+
+        Args:
+            start_date (str): Start date of the interval, `YYYY-MM-DD`
+            end_date (str): End date of the interval (inclusive), `YYYY-MM-DD`
+            car_id (int, optional): Restrict the search to a single car
+            filters (CarFilters, optional): Attributes the cars must have
+            sort (CarSort, optional): Order of the cars, by id by default
+            limit (int, optional): Most cars to return
+
+        Returns:
+            List[CarRecord]: Cars free for the whole interval
+        """
         start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
         end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
-
-        reserved_cars: List[int] = await self.get_reserved_cars(
+        search = partial(
+            self.find_available_cars,
             start_date,
             end_date,
             car_id,
+            filters,
+            sort,
+            limit,
         )
+        if not settings.search_single_flight:
+            return await search()
+
+        key = (start_date, end_date, car_id, filters, sort, limit, self.reads_replica)
+        if SEARCH_FLIGHTS.in_flight(key):
+            SINGLE_FLIGHT_SHARED_TOTAL.labels("get_available_cars").inc()
+        return await SEARCH_FLIGHTS.run(key, search)
+
+    async def find_available_cars(
+        self,
+        start_date: date,
+        end_date: date,
+        car_id: int = None,
+        filters: CarFilters = CarFilters(),
+        sort: CarSort = CarSort.id,
+        limit: Optional[int] = None,
+    ) -> List[CarRecord]:
+        """Look up the cars which are not reserved for any day of the interval.
+
+        Args:
+            start_date (date): Start date of the interval
+            end_date (date): End date of the interval (inclusive)
+            car_id (int, optional): Restrict the search to a single car
+            filters (CarFilters, optional): Attributes the cars must have
+            sort (CarSort, optional): Order of the cars, by id by default
+            limit (int, optional): Most cars to return
+
+        Returns:
+            List[CarRecord]: Cars free for the whole interval
+        """
+        stage = partial(DAO_STAGE_SECONDS.labels, "get_available_cars")
+        reserved_cars = await self.lookup_reserved_cars(start_date, end_date, stage)
+
+        if self.catalog.is_loaded:
+            if reserved_cars is None:
+                with stage("reserved_cars").time():
+                    reserved_cars = await self.get_reserved_cars(
+                        start_date,
+                        end_date,
+                        car_id,
+                        filters,
+                    )
+            with stage("catalog").time():
+                return self.catalog.available(
+                    reserved_cars,
+                    car_id,
+                    filters,
+                    sort,
+                    limit,
+                )
+
+        with stage("cars").time():
+            return await self.select_available_cars(
+                start_date,
+                end_date,
+                reserved_cars,
+                car_id,
+                filters,
+                sort,
+                limit,
+            )
+
+    async def select_available_cars(
+        self,
+        start_date: date,
+        end_date: date,
+        reserved_cars: Optional[List[int]] = None,
+        car_id: int = None,
+        filters: CarFilters = CarFilters(),
+        sort: CarSort = CarSort.id,
+        limit: Optional[int] = None,
+    ) -> List[CarRecord]:
+        """Select the available cars from the database.
 
-        query = select(Car).where(Car.id.not_in(reserved_cars))
+        Args:
+            start_date (date): Start date of the interval
+            end_date (date): End date of the interval (inclusive)
+            reserved_cars (List[int], optional): Ids of the reserved cars,
+                resolved by an anti-join when not given
+            car_id (int, optional): Restrict the search to a single car
+            filters (CarFilters, optional): Attributes the cars must have
+            sort (CarSort, optional): Order of the cars, by id by default
+            limit (int, optional): Most cars to return
+
+        Returns:
+            List[CarRecord]: Cars free for the whole interval
+        """
+        query = (
+            select(*CAR_RECORD_COLUMNS)
+            .where(
+                self.availability_clause(start_date, end_date, reserved_cars),
+                *self.car_clauses(car_id, filters),
+            )
+            .order_by(*self.sort_columns(sort))
+            .limit(limit)
+        )
         rows = await self.session.execute(query)
-        return rows.scalars().unique().fetchall()
+        return [CarRecord(*row) for row in rows]
+
+    async def get_car_facets(
+        self,
+        start_date: date,
+        end_date: date,
+        filters: CarFilters = CarFilters(),
+    ) -> Dict[str, Dict[Any, int]]:
+        """Count the available cars by category, brand and zone.
+
+        Counts cover the cars matching the filters, cars lacking a value
+        of a facet are left out of its counts.
+
+        Args:
+            start_date (date): Start date of the interval
+            end_date (date): End date of the interval (inclusive)
+            filters (CarFilters, optional): Attributes the cars must have
+
+        Returns:
+            Dict[str, Dict[Any, int]]: Number of cars by value of each facet
+        """
+        stage = partial(DAO_STAGE_SECONDS.labels, "get_car_facets")
+        reserved_cars = await self.lookup_reserved_cars(start_date, end_date, stage)
+        facets: Dict[str, Dict[Any, int]] = {facet: {} for facet in FACETS}
+
+        if self.catalog.is_loaded:
+            if reserved_cars is None:
+                with stage("reserved_cars").time():
+                    reserved_cars = await self.get_reserved_cars(
+                        start_date,
+                        end_date,
+                        filters=filters,
+                    )
+            with stage("catalog").time():
+                for car in self.catalog.available(reserved_cars, filters=filters):
+                    for facet in FACETS:
+                        value = getattr(car, facet)
+                        if value is not None:
+                            facets[facet][value] = facets[facet].get(value, 0) + 1
+            return facets
+
+        columns = [getattr(Car, facet) for facet in FACETS]
+        query = (
+            select(*columns, func.count())
+            .where(
+                self.availability_clause(start_date, end_date, reserved_cars),
+                *self.car_clauses(None, filters),
+            )
+            .group_by(func.grouping_sets(*[tuple_(column) for column in columns]))
+        )
+        with stage("cars").time():
+            rows = await self.session.execute(query)
+        for row in rows:
+            *values, count = row
+            for facet, value in zip(FACETS, values):
+                if value is not None:
+                    facets[facet][value] = count
+        return facets
+
+    async def lookup_reserved_cars(
+        self,
+        start_date: date,
+        end_date: date,
+        stage: Callable[[str], Any],
+    ) -> Optional[List[int]]:
+        """Get the reserved cars of the interval from Redis, when enabled.
+
+        Args:
+            start_date (date): Start date of the interval
+            end_date (date): End date of the interval (inclusive)
+            stage (Callable[[str], Any]): Stage timer of the operation
+
+        Returns:
+            Optional[List[int]]: Ids of the reserved cars, None when they
+            must be looked up in the database
+        """
+        reserved_cars = None
+        if settings.occupancy_index:
+            with stage("occupancy").time():
+                try:
+                    reserved_cars = await reserved_car_ids(
+                        self.redis,
+                        start_date,
+                        end_date,
+                    )
+                except RedisError:
+                    # Searches fall back to the database without the index.
+                    reserved_cars = None
+        if reserved_cars is None and settings.search_cache_ttl_ms:
+            with stage("cache").time():
+                reserved_cars = await self.get_cached_reserved_cars(
+                    start_date,
+                    end_date,
+                )
+        return reserved_cars
+
+    @staticmethod
+    def availability_clause(
+        start_date: date,
+        end_date: date,
+        reserved_cars: Optional[List[int]],
+    ) -> ColumnElement:
+        """Filter for cars not reserved in the interval.
+
+        Args:
+            start_date (date): Start date of the interval
+            end_date (date): End date of the interval (inclusive)
+            reserved_cars (Optional[List[int]]): Ids of the reserved cars,
+                None to anti-join the reservations instead
+
+        Returns:
+            ColumnElement: Where clause on `Car`
+        """
+        if reserved_cars is not None:
+            return Car.id.not_in(reserved_cars)
+        return ~exists().where(
+            Reservation.car_id == Car.id,
+            Reservation.overlaps(start_date, end_date),
+        )
+
+    @staticmethod
+    def car_clauses(
+        car_id: Optional[int],
+        filters: CarFilters,
+    ) -> List[ColumnElement]:
+        """Filters on the attributes of the cars.
+
+        Args:
+            car_id (Optional[int]): Restrict to a single car
+            filters (CarFilters): Attributes the cars must have
+
+        Returns:
+            List[ColumnElement]: Where clauses on `Car`
+        """
+        clauses = [
+            getattr(Car, facet) == value
+            for facet, value in zip(FACETS, filters)
+            if value is not None
+        ]
+        if car_id:
+            clauses.append(Car.id == car_id)
+        return clauses
+
+    @staticmethod
+    def sort_columns(sort: CarSort) -> List[ColumnElement]:
+        """Order of the cars, ties are broken by id.
+
+        Args:
+            sort (CarSort): Requested order
+
+        Returns:
+            List[ColumnElement]: Columns to order by
+        """
+        if sort == CarSort.id:
+            return [Car.id]
+        return [getattr(Car, sort.value), Car.id]
+
+    async def get_cached_reserved_cars(
+        self,
+        start_date: date,
+        end_date: date,
+    ) -> Optional[List[int]]:
+        """Get ids of the cars reserved in the interval through the search cache.
+
+        A missing or stale entry is refilled from the primary database.
+        The day versions are read before the query, so a booking made
+        meanwhile leaves the new entry stale rather than wrong. A lagging
+        replica could miss a booking whose versions were already bumped,
+        and the wrong entry would be served to everyone.
+
+        Args:
+            start_date (date): Start date of the interval
+            end_date (date): End date of the interval (inclusive)
+
+        Returns:
+            Optional[List[int]]: Ids of the reserved cars, None when
+                Redis can't be reached
+        """
+        try:
+            car_ids, versions = await search_cache.get_reserved_cars(
+                self.redis,
+                start_date,
+                end_date,
+            )
+            if car_ids is None:
+                car_ids = await self.get_reserved_cars(
+                    start_date,
+                    end_date,
+                    session=self.primary_session,
+                )
+                await search_cache.store_reserved_cars(
+                    self.redis,
+                    start_date,
+                    end_date,
+                    versions,
+                    car_ids,
+                    settings.search_cache_ttl_ms,
+                )
+        except RedisError:
+            # Searches fall back to the database without the cache.
+            return None
+        return car_ids
 
     async def get_reserved_cars(
         self,
         start_date: date,
         end_date: date,
         car_id: int = None,
+        filters: CarFilters = CarFilters(),
+        session: Optional[AsyncSession] = None,
     ) -> List[int]:
-        reservations_query = select(Reservation).where(
-            Reservation.start_date == start_date,
-            Reservation.end_date == end_date,
-            Reservation.status == ReservationStatus.success.value,
+        """Get ids of the cars reserved on any day of the given interval.
+
+        With filters, only the reservations of the matching cars are
+        looked up, through the car indexes.
+
+        Args:
+            start_date (date): Start date of the interval
+            end_date (date): End date of the interval (inclusive)
+            car_id (int, optional): Restrict the lookup to a single car
+            filters (CarFilters, optional): Attributes of the cars to look up
+            session (AsyncSession, optional): Session to query, the DAO's
+                read session by default
+
+        Returns:
+            List[int]: Ids of the reserved cars
+        """
+        reservations_query = (
+            select(Reservation.car_id)
+            .where(Reservation.overlaps(start_date, end_date))
+            .distinct()
         )
         if car_id:
             reservations_query = reservations_query.where(Reservation.car_id == car_id)
+        if filters.is_set():
+            reservations_query = reservations_query.join(
+                Car,
+                Car.id == Reservation.car_id,
+            ).where(*self.car_clauses(None, filters))
 
-        reservation_rows = await self.session.execute(reservations_query)
-        return [
-            reservation.car_id
-            for reservation in reservation_rows.columns("car_id").fetchall()
-        ]
+        session = session or self.session
+        reservation_rows = await session.execute(reservations_query)
+        return reservation_rows.scalars().fetchall()
+
+    async def get_availability_calendar(
+        self,
+        car_ids: Sequence[int],
+        start_date: date,
+        days: int,
+    ) -> Dict[int, List[Tuple[date, date]]]:
+        """Get the free days of several cars over a horizon.
+
+        The reservations of every car come from one range query, which
+        the exclusion constraint's GiST index on `(car_id, period)`
+        serves. They are then flattened into free runs in Python.
+
+        Args:
+            car_ids (Sequence[int]): Cars of the calendar, unknown ones
+                are left out
+            start_date (date): First day of the horizon
+            days (int): Length of the horizon in days
+
+        Returns:
+            Dict[int, List[Tuple[date, date]]]: First and last day of each
+            free run, by car id in ascending order
+        """
+        end_date = start_date + timedelta(days=days - 1)
+        query = (
+            select(Car.id, Reservation.start_date, Reservation.end_date)
+            .outerjoin(
+                Reservation,
+                and_(
+                    Reservation.car_id == Car.id,
+                    Reservation.overlaps(start_date, end_date),
+                ),
+            )
+            .where(Car.id.in_(car_ids))
+            .order_by(Car.id)
+        )
+        booked: Dict[int, List[Tuple[date, date]]] = {}
+        for car_id, booked_start, booked_end in await self.session.execute(query):
+            bookings = booked.setdefault(car_id, [])
+            if booked_start is not None:
+                bookings.append((booked_start, booked_end))
+        return {
+            car_id: free_ranges(start_date, days, bookings)
+            for car_id, bookings in booked.items()
+        }
@@ -1,23 +1,79 @@
-from time import sleep
-from typing import List
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
 from fastapi import Depends
-from sqlalchemy import select
+from prometheus_client import Histogram
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from redis.asyncio import ConnectionPool, Redis
+from sqlalchemy.sql.elements import ColumnElement
+from redis.asyncio import Redis
 
-from car_rental_service.db.dependencies import get_db_session
-from car_rental_service.db.models.reservation import Reservation
-from car_rental_service.services.redis.dependency import get_redis_pool
-from car_rental_service.schema import ReservationStatus
+from car_rental_service.db.dependencies import get_db_read_session, get_db_session
+from car_rental_service.db.models.outbox import OutboxEvent
+from car_rental_service.db.models.reservation import ACTIVE_STATUSES, Reservation
+from car_rental_service.db.unit_of_work import unit_of_work
+from car_rental_service.services.metrics.metrics import DAO_STAGE_SECONDS
+from car_rental_service.services.payment.dependency import get_payment_gateway
+from car_rental_service.services.payment.gateway import PaymentGateway
+from car_rental_service.services.redis.dependency import get_redis
+from car_rental_service.services.redis.lock import (
+    acquire_lock,
+    acquire_lock_groups,
+    release_lock,
+)
+from car_rental_service.services.redis.occupancy import (
+    mark_occupancy_unready,
+    queue_occupancy_update,
+)
+from car_rental_service.services.redis.search_cache import queue_invalidation
+from car_rental_service.schema import OutboxTopic, ReservationStatus
+from car_rental_service.settings import settings
+from car_rental_service.utils import iter_days
 from car_rental_service.web.api.reservation.schema import (
+    BulkItemStatus,
+    BulkReservationItemDTO,
+    ReservationChangeDTO,
+    ReservationFilterDTO,
+    ReservationHoldDTO,
     ReservationInputDTO,
     ReservationOutputDTO,
 )
 from car_rental_service.web.exceptions import (
     CarIsLockedForReservation,
+    PaymentFailed,
     ReservationAlreadyExist,
+    ReservationHoldExpired,
+    ReservationNotActive,
+    ReservationNotFound,
+    ReservationNotOnHold,
 )
 
+# SQLSTATE raised by Postgres when an exclusion constraint is violated.
+EXCLUSION_VIOLATION = "23P01"
+
+# Rows fetched per round trip by the reservations export.
+EXPORT_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+# Columns listed by the API, selected as plain rows.
+RESERVATION_OUTPUT_COLUMNS = [
+    getattr(Reservation, field) for field in ReservationOutputDTO.__fields__
+]
+# Columns of a held reservation.
+RESERVATION_HOLD_COLUMNS = [
+    getattr(Reservation, field) for field in ReservationHoldDTO.__fields__
+]
+
+# A car with the first and last day of its booking.
+Booking = Tuple[int, date, date]
+
 
 class ReservationDAO:
     """Class for doing operations on reservation model."""
@@ -25,10 +81,16 @@ class ReservationDAO:
     def __init__(
         self,
         session: AsyncSession = Depends(get_db_session),
-        redis_pool: ConnectionPool = Depends(get_redis_pool),
+        redis: Redis = Depends(get_redis),
+        payment_gateway: PaymentGateway = Depends(get_payment_gateway),
+        read_session: AsyncSession = Depends(get_db_read_session),
     ) -> None:
         self.session = session
-        self.redis_pool = redis_pool
+        # Client of the request, shared with its other users.
+        self.redis = redis
+        self.payment_gateway = payment_gateway
+        # Listings may be served by a read replica.
+        self.read_session = read_session
 
     async def create_reservation(
         self,
@@ -36,162 +98,949 @@ class ReservationDAO:
     ) -> ReservationOutputDTO:
         """Create a car reservation for a given date slot
 
+        Double booking is rejected by the `reservations` exclusion
+        constraint, so there is no separate existence check. The insert
+        is committed on its own, no connection is held during the payment.
+
         Args:
             row (ReservationInputDTO): _description_
         """
-        does_reservation_exists = await self.does_reservation_exists(
-            row.user_id,
-            row.car_id,
-            row.start_date,
-            row.end_date,
-        )
-        if does_reservation_exists:
-            raise ReservationAlreadyExist()
-
-        is_car_selection_locked = await self.is_car_selection_locked(
-            row.user_id,
-            row.car_id,
-            row.start_date,
-            row.end_date,
-        )
-        if is_car_selection_locked:
-            raise CarIsLockedForReservation()
-        else:
-            await self.lock_car_selection(
-                row.user_id,
+        stage = partial(DAO_STAGE_SECONDS.labels, "create_reservation")
+        with stage("lock").time():
+            lock_token = await self.lock_car_selection(
                 row.car_id,
                 row.start_date,
                 row.end_date,
             )
+        if lock_token is None:
+            raise CarIsLockedForReservation()
+
+        try:
+            with stage("payment").time():
+                transaction_id = await self.payment_gateway.charge(
+                    row.user_id,
+                    self.payment_reference(row),
+                )
+
+            reservation_row = Reservation(
+                user_id=row.user_id,
+                car_id=row.car_id,
+                start_date=row.start_date,
+                end_date=row.end_date,
+                status=ReservationStatus.success,
+            )
+            try:
+                with stage("insert").time():
+                    async with unit_of_work(self.session):
+                        await self.insert_reservation(reservation_row)
+                        self.session.add(
+                            self.reservation_event(
+                                OutboxTopic.reservation_created,
+                                reservation_row,
+                                transaction_id=transaction_id,
+                            ),
+                        )
+            except Exception:
+                await self.refund_payment(transaction_id)
+                raise
+
+            await self.update_availability(
+                stage,
+                booked=[(row.car_id, row.start_date, row.end_date)],
+            )
+        finally:
+            with stage("release").time():
+                await self.release_car_selection_lock(
+                    row.car_id,
+                    row.start_date,
+                    row.end_date,
+                    lock_token,
+                )
+
+        return reservation_row
+
+    async def create_reservations(
+        self,
+        rows: List[ReservationInputDTO],
+        atomic: bool = True,
+    ) -> List[BulkReservationItemDTO]:
+        """Create several car reservations at once.
+
+        The days of every car are locked by one Redis call, the payments
+        run concurrently and the reservations are inserted by a single
+        multi-row INSERT. With `atomic`, any failure cancels the whole
+        batch: nothing is inserted and every payment is refunded.
+
+        Args:
+            rows (List[ReservationInputDTO]): Reservations to create
+            atomic (bool): Create every reservation or none of them
+
+        Returns:
+            List[BulkReservationItemDTO]: Outcome of each reservation, in order
+        """
+        statuses: List[Optional[BulkItemStatus]] = [None] * len(rows)
+        for index in self.overlapping_items(rows):
+            statuses[index] = BulkItemStatus.conflict
+        pending = [index for index, status in enumerate(statuses) if status is None]
+        if atomic and len(pending) < len(rows):
+            return self.bulk_report(statuses)
+
+        lock_groups = [
+            self.car_selection_lock_keys(
+                rows[index].car_id,
+                rows[index].start_date,
+                rows[index].end_date,
+            )
+            for index in pending
+        ]
+        stage = partial(DAO_STAGE_SECONDS.labels, "create_reservations")
+        with stage("lock").time():
+            lock_token, acquired = await acquire_lock_groups(
+                self.redis,
+                lock_groups,
+                settings.reservation_lock_ttl_ms,
+                atomic,
+            )
+        locked = [index for index, is_locked in zip(pending, acquired) if is_locked]
+        locked_keys = [
+            key
+            for keys, is_locked in zip(lock_groups, acquired)
+            if is_locked
+            for key in keys
+        ]
+        for index, is_locked in zip(pending, acquired):
+            if not is_locked:
+                statuses[index] = BulkItemStatus.locked
+        if not locked:
+            return self.bulk_report(statuses)
+
+        inserted: Dict[int, Row] = {}
+        try:
+            with stage("payment").time():
+                transactions = await self.charge_reservations(rows, locked)
+            for index in locked:
+                if index not in transactions:
+                    statuses[index] = BulkItemStatus.payment_failed
+            if atomic and len(transactions) < len(locked):
+                await self.refund_payments(transactions.values())
+                return self.bulk_report(statuses)
+
+            try:
+                with stage("insert").time():
+                    async with unit_of_work(self.session):
+                        inserted, conflicts = await self.insert_reservations(
+                            rows,
+                            list(transactions),
+                            atomic,
+                        )
+                        self.session.add_all(
+                            [
+                                self.reservation_event(
+                                    OutboxTopic.reservation_created,
+                                    row,
+                                    transaction_id=transactions[index],
+                                )
+                                for index, row in inserted.items()
+                            ],
+                        )
+            except Exception:
+                await self.refund_payments(transactions.values())
+                raise
+            for index in conflicts:
+                statuses[index] = BulkItemStatus.conflict
+            await self.refund_payments(
+                transaction_id
+                for index, transaction_id in transactions.items()
+                if index not in inserted
+            )
+
+            await self.update_availability(
+                stage,
+                booked=[
+                    (row.car_id, row.start_date, row.end_date)
+                    for row in inserted.values()
+                ],
+            )
+        finally:
+            with stage("release").time():
+                await release_lock(self.redis, locked_keys, lock_token)
+
+        for index in inserted:
+            statuses[index] = BulkItemStatus.created
+        return self.bulk_report(statuses, inserted)
+
+    async def hold_reservation(self, row: ReservationInputDTO) -> Row:
+        """Hold a car for a customer, who confirms the reservation once paid.
+
+        The hold is a PROCESSING reservation, so the exclusion constraint
+        arbitrates between concurrent holds and bookings without a lock,
+        and nothing waits for the payment. It expires after
+        `reservation_hold_ttl` seconds.
+
+        Args:
+            row (ReservationInputDTO): Reservation to hold
+
+        Raises:
+            ReservationAlreadyExist: The car is already booked or held for an
+            overlapping interval
+
+        Returns:
+            Row: Held reservation, with the end of its hold
+        """
+        stage = partial(DAO_STAGE_SECONDS.labels, "hold_reservation")
+        statement = (
+            insert(Reservation)
+            .values(
+                user_id=row.user_id,
+                car_id=row.car_id,
+                start_date=row.start_date,
+                end_date=row.end_date,
+                status=ReservationStatus.processing.value,
+                hold_expires_at=func.now()
+                + timedelta(seconds=settings.reservation_hold_ttl),
+            )
+            .returning(*RESERVATION_HOLD_COLUMNS)
+        )
+        try:
+            with stage("insert").time():
+                async with unit_of_work(self.session):
+                    reservation = (await self.session.execute(statement)).one()
+        except IntegrityError as error:
+            if getattr(error.orig, "pgcode", None) == EXCLUSION_VIOLATION:
+                raise ReservationAlreadyExist() from error
+            raise
+        await self.update_availability(
+            stage,
+            booked=[(row.car_id, row.start_date, row.end_date)],
+        )
+        return reservation
+
+    async def confirm_reservation(self, reservation_id: int) -> Row:
+        """Charge the customer of a held reservation and confirm it.
+
+        The hold is checked and confirmed by two short transactions, no
+        connection is held while the customer pays. A hold expiring or
+        confirmed by another request meanwhile refunds the payment.
+
+        Args:
+            reservation_id (int): Id of the held reservation
+
+        Raises:
+            ReservationNotFound: No reservation has this id
+            ReservationNotOnHold: The reservation is confirmed or cancelled
+            ReservationHoldExpired: The hold expired before the confirmation
+            PaymentFailed: The payment was declined, the hold is kept
+
+        Returns:
+            Row: Confirmed reservation
+        """
+        stage = partial(DAO_STAGE_SECONDS.labels, "confirm_reservation")
+        with stage("check").time():
+            async with unit_of_work(self.session):
+                hold = (
+                    await self.session.execute(
+                        select(
+                            Reservation.car_id,
+                            Reservation.user_id,
+                            Reservation.start_date,
+                            Reservation.end_date,
+                            Reservation.status,
+                            (Reservation.hold_expires_at <= func.now()).label(
+                                "expired",
+                            ),
+                        ).where(Reservation.id == reservation_id),
+                    )
+                ).one_or_none()
+        if hold is None:
+            raise ReservationNotFound()
+        if hold.status == ReservationStatus.expired.value or hold.expired:
+            raise ReservationHoldExpired()
+        if hold.status != ReservationStatus.processing.value:
+            raise ReservationNotOnHold()
+
+        with stage("payment").time():
+            transaction_id = await self.payment_gateway.charge(
+                hold.user_id,
+                self.payment_reference(hold),
+            )
+        try:
+            with stage("update").time():
+                async with unit_of_work(self.session):
+                    reservation = await self.confirm_hold(
+                        reservation_id,
+                        transaction_id,
+                    )
+        except Exception:
+            await self.refund_payment(transaction_id)
+            raise
+        return reservation
+
+    async def confirm_hold(self, reservation_id: int, transaction_id: str) -> Row:
+        """Flip a paid hold to SUCCESS, unless it expired meanwhile.
+
+        Args:
+            reservation_id (int): Id of the held reservation
+            transaction_id (str): Transaction id of its payment
 
-        await self.make_payment()
+        Raises:
+            ReservationHoldExpired: The hold expired or was confirmed by
+            another request
 
-        reservation_row = Reservation(
-            user_id=row.user_id,
-            car_id=row.car_id,
-            start_date=row.start_date,
-            end_date=row.end_date,
-            status=ReservationStatus.success,
+        Returns:
+            Row: Confirmed reservation
+        """
+        reservation = (
+            await self.session.execute(
+                update(Reservation)
+                .where(
+                    Reservation.id == reservation_id,
+                    Reservation.status == ReservationStatus.processing.value,
+                    Reservation.hold_expires_at > func.now(),
+                )
+                .values(
+                    status=ReservationStatus.success.value,
+                    hold_expires_at=None,
+                )
+                .returning(*RESERVATION_OUTPUT_COLUMNS)
+                .execution_options(synchronize_session=False),
+            )
+        ).one_or_none()
+        if reservation is None:
+            raise ReservationHoldExpired()
+        self.session.add(
+            self.reservation_event(
+                OutboxTopic.reservation_created,
+                reservation,
+                transaction_id=transaction_id,
+            ),
         )
+        return reservation
+
+    async def expire_holds(self, batch_size: int) -> int:
+        """Release a batch of expired holds, oldest first.
+
+        Holds being released by another sweeper are skipped, so every
+        worker may sweep.
 
-        self.session.add(reservation_row)
-        await self.session.flush()
-        await self.release_car_selection_lock(
-            row.user_id,
-            row.car_id,
-            row.start_date,
-            row.end_date,
+        Args:
+            batch_size (int): Most holds to release
+
+        Returns:
+            int: Number of released holds
+        """
+        stage = partial(DAO_STAGE_SECONDS.labels, "expire_holds")
+        expired = (
+            select(Reservation.id)
+            .where(
+                Reservation.status == ReservationStatus.processing.value,
+                Reservation.hold_expires_at <= func.now(),
+            )
+            .order_by(Reservation.hold_expires_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
         )
+        with stage("update").time():
+            async with unit_of_work(self.session):
+                released = (
+                    await self.session.execute(
+                        update(Reservation)
+                        .where(Reservation.id.in_(expired))
+                        .values(status=ReservationStatus.expired.value)
+                        .returning(
+                            Reservation.car_id,
+                            Reservation.start_date,
+                            Reservation.end_date,
+                        )
+                        .execution_options(synchronize_session=False),
+                    )
+                ).all()
+        await self.update_availability(stage, released=released)
+        return len(released)
 
-        return reservation_row
+    async def cancel_reservation(self, reservation_id: int) -> Row:
+        """Cancel a confirmed or held reservation, freeing its days.
+
+        Args:
+            reservation_id (int): Id of the reservation
+
+        Raises:
+            ReservationNotFound: No reservation has this id
+            ReservationNotActive: The reservation is cancelled or expired
+
+        Returns:
+            Row: Cancelled reservation
+        """
+        stage = partial(DAO_STAGE_SECONDS.labels, "cancel_reservation")
+        with stage("update").time():
+            async with unit_of_work(self.session):
+                current = await self.lock_active_reservation(reservation_id)
+                reservation = (
+                    await self.session.execute(
+                        update(Reservation)
+                        .where(Reservation.id == reservation_id)
+                        .values(
+                            status=ReservationStatus.cancelled.value,
+                            hold_expires_at=None,
+                        )
+                        .returning(*RESERVATION_OUTPUT_COLUMNS)
+                        .execution_options(synchronize_session=False),
+                    )
+                ).one()
+                self.session.add(
+                    self.reservation_event(
+                        OutboxTopic.reservation_cancelled,
+                        reservation,
+                    ),
+                )
+        await self.update_availability(
+            stage,
+            released=[(current.car_id, current.start_date, current.end_date)],
+        )
+        return reservation
+
+    async def change_reservation(
+        self,
+        reservation_id: int,
+        change: ReservationChangeDTO,
+    ) -> Row:
+        """Move a confirmed or held reservation to other days.
+
+        The days it no longer covers are freed and the new ones taken
+        in the same transaction, the exclusion constraint rejecting new
+        days booked by someone else.
+
+        Args:
+            reservation_id (int): Id of the reservation
+            change (ReservationChangeDTO): New days of the reservation
+
+        Raises:
+            ReservationNotFound: No reservation has this id
+            ReservationNotActive: The reservation is cancelled or expired
+            ReservationAlreadyExist: The car is already booked for an
+            overlapping interval
+
+        Returns:
+            Row: Changed reservation
+        """
+        stage = partial(DAO_STAGE_SECONDS.labels, "change_reservation")
+        try:
+            with stage("update").time():
+                async with unit_of_work(self.session):
+                    current = await self.lock_active_reservation(reservation_id)
+                    reservation = (
+                        await self.session.execute(
+                            update(Reservation)
+                            .where(Reservation.id == reservation_id)
+                            .values(
+                                start_date=change.start_date,
+                                end_date=change.end_date,
+                            )
+                            .returning(*RESERVATION_OUTPUT_COLUMNS)
+                            .execution_options(synchronize_session=False),
+                        )
+                    ).one()
+                    self.session.add(
+                        self.reservation_event(
+                            OutboxTopic.reservation_changed,
+                            reservation,
+                            previous_start_date=current.start_date.isoformat(),
+                            previous_end_date=current.end_date.isoformat(),
+                        ),
+                    )
+        except IntegrityError as error:
+            if getattr(error.orig, "pgcode", None) == EXCLUSION_VIOLATION:
+                raise ReservationAlreadyExist() from error
+            raise
+        await self.update_availability(
+            stage,
+            booked=[(current.car_id, change.start_date, change.end_date)],
+            released=[(current.car_id, current.start_date, current.end_date)],
+        )
+        return reservation
+
+    async def lock_active_reservation(self, reservation_id: int) -> Row:
+        """Lock the row of a confirmed or held reservation until the commit.
+
+        Concurrent changes of the reservation wait for the lock, then see
+        its outcome. Only use it in a `unit_of_work`, which keeps the lock
+        as short as the SQL of the change.
+
+        Args:
+            reservation_id (int): Id of the reservation
+
+        Raises:
+            ReservationNotFound: No reservation has this id
+            ReservationNotActive: The reservation is cancelled or expired,
+            or is a hold past its expiry not swept yet
+
+        Returns:
+            Row: Car, days and status of the reservation
+        """
+        reservation = (
+            await self.session.execute(
+                select(
+                    Reservation.car_id,
+                    Reservation.start_date,
+                    Reservation.end_date,
+                    Reservation.status,
+                    (Reservation.hold_expires_at <= func.now()).label("expired"),
+                )
+                .where(Reservation.id == reservation_id)
+                .with_for_update(),
+            )
+        ).one_or_none()
+        if reservation is None:
+            raise ReservationNotFound()
+        if reservation.status not in ACTIVE_STATUSES or reservation.expired:
+            raise ReservationNotActive()
+        return reservation
+
+    async def update_availability(
+        self,
+        stage: Callable[[str], Histogram],
+        booked: Iterable[Booking] = (),
+        released: Iterable[Booking] = (),
+    ) -> None:
+        """Show booked and released cars to the searches.
 
-    async def make_payment(self) -> None:
+        Runs after the commit of the change. Searches racing the commit
+        may cache a window without the change for one TTL at most, and a
+        worker dying in between leaves the occupancy index stale until
+        its next rebuild. The occupancy bitmaps and the search cache
+        versions are updated together, by one transactional pipeline.
+
+        The change is committed already, so a failure is only logged.
+        The occupancy index is then marked not ready, searches use SQL
+        until it is rebuilt, and cached windows expire after their TTL.
+
+        Args:
+            stage (Callable): Timer of the DAO stages
+            booked (Iterable[Booking]): Cars taken by new reservations
+            released (Iterable[Booking]): Cars freed by released reservations
         """
-        **NOTE** mocking the payment flow and assuming it
-        takes 300 ms for the round trip
+        booked, released = list(booked), list(released)
+        if not booked and not released:
+            return
+        if not settings.occupancy_index and not settings.search_cache_ttl_ms:
+            return
+        try:
+            with stage("availability").time():
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    if settings.occupancy_index:
+                        queue_occupancy_update(pipe, booked, released)
+                    if settings.search_cache_ttl_ms:
+                        queue_invalidation(
+                            pipe,
+                            [(start, end) for _, start, end in booked + released],
+                        )
+                    await pipe.execute()
+        except Exception:
+            logger.exception("Updating the availability of the cars failed.")
+            if settings.occupancy_index:
+                await self.distrust_occupancy()
+
+    async def distrust_occupancy(self) -> None:
+        """Make searches stop reading the occupancy index until its rebuild.
+
+        Failures are logged, searches then can't read the index either.
         """
-        sleep(0.3)
+        try:
+            await mark_occupancy_unready(self.redis)
+        except Exception:
+            logger.exception("Marking the occupancy index not ready failed.")
 
-    async def does_reservation_exists(
+    async def charge_reservations(
         self,
-        user_id: int,
-        car_id: str,
-        start_date: str,
-        end_date: str,
-    ) -> bool:
-        """Does the reservation already exists for the given car and date slots.
+        rows: List[ReservationInputDTO],
+        indexes: List[int],
+    ) -> Dict[int, str]:
+        """Charge the customers of several reservations concurrently.
+
+        Declined payments are left out of the result. Any other error
+        refunds the successful payments and is raised.
+
+        Args:
+            rows (List[ReservationInputDTO]): Reservations of the batch
+            indexes (List[int]): Positions of the reservations to charge
+
+        Returns:
+            Dict[int, str]: Transaction id of each paid reservation
+        """
+        results = await asyncio.gather(
+            *[
+                self.payment_gateway.charge(
+                    rows[index].user_id,
+                    self.payment_reference(rows[index]),
+                )
+                for index in indexes
+            ],
+            return_exceptions=True,
+        )
+        transactions = {
+            index: result
+            for index, result in zip(indexes, results)
+            if not isinstance(result, BaseException)
+        }
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(
+                result,
+                PaymentFailed,
+            ):
+                await self.refund_payments(transactions.values())
+                raise result
+        return transactions
+
+    async def refund_payment(self, transaction_id: str) -> None:
+        """Refund a payment, logging instead of raising a failed refund.
+
+        Refunds run while handling another error, which is the one to
+        surface. A failed refund leaves the customer charged, the log
+        keeps its transaction id to refund it by hand.
+
+        Args:
+            transaction_id (str): Transaction to refund
+        """
+        try:
+            await self.payment_gateway.refund(transaction_id)
+        except Exception:
+            logger.exception(
+                "Refund of transaction %s failed, the customer is still charged.",
+                transaction_id,
+            )
+
+    async def refund_payments(self, transaction_ids: Iterable[str]) -> None:
+        """Refund several payments concurrently.
+
+        Args:
+            transaction_ids (Iterable[str]): Transactions to refund
+        """
+        await asyncio.gather(
+            *[
+                self.refund_payment(transaction_id)
+                for transaction_id in transaction_ids
+            ],
+        )
+
+    async def insert_reservations(
+        self,
+        rows: List[ReservationInputDTO],
+        indexes: List[int],
+        atomic: bool,
+    ) -> Tuple[Dict[int, Row], List[int]]:
+        """Insert several reservations with one `INSERT ... RETURNING`.
+
+        Reservations overlapping an existing one are skipped by
+        `ON CONFLICT DO NOTHING`, the exclusion constraint being the
+        arbiter. With `atomic`, a skipped reservation rolls back the
+        others. The insert runs in a savepoint, so the surrounding
+        transaction stays usable.
+
+        Args:
+            rows (List[ReservationInputDTO]): Reservations of the batch
+            indexes (List[int]): Positions of the reservations to insert
+            atomic (bool): Insert every reservation or none of them
+
+        Returns:
+            Tuple[Dict[int, Row], List[int]]: Inserted reservation of each
+            position, and the positions rejected as overlapping
+        """
+        statement = (
+            insert(Reservation)
+            .values(
+                [
+                    {
+                        "user_id": rows[index].user_id,
+                        "car_id": rows[index].car_id,
+                        "start_date": rows[index].start_date,
+                        "end_date": rows[index].end_date,
+                        "status": ReservationStatus.success.value,
+                    }
+                    for index in indexes
+                ],
+            )
+            .on_conflict_do_nothing()
+            .returning(*RESERVATION_OUTPUT_COLUMNS)
+        )
+        async with self.session.begin_nested() as savepoint:
+            result = await self.session.execute(statement)
+            by_booking = {
+                (row.car_id, row.start_date, row.end_date): row for row in result
+            }
+            inserted = {}
+            conflicts = []
+            for index in indexes:
+                row = rows[index]
+                reservation = by_booking.get((row.car_id, row.start_date, row.end_date))
+                if reservation is None:
+                    conflicts.append(index)
+                else:
+                    inserted[index] = reservation
+            if atomic and conflicts:
+                await savepoint.rollback()
+                return {}, conflicts
+        return inserted, conflicts
+
+    @staticmethod
+    def overlapping_items(rows: List[ReservationInputDTO]) -> List[int]:
+        """Positions of the reservations overlapping an earlier one of the batch.
+
+        Args:
+            rows (List[ReservationInputDTO]): Reservations of the batch
+
+        Returns:
+            List[int]: Positions of the overlapping reservations
+        """
+        booked: Dict[int, List[Tuple[date, date]]] = defaultdict(list)
+        overlapping = []
+        for index, row in enumerate(rows):
+            intervals = booked[row.car_id]
+            if any(
+                row.start_date <= end_date and start_date <= row.end_date
+                for start_date, end_date in intervals
+            ):
+                overlapping.append(index)
+            else:
+                intervals.append((row.start_date, row.end_date))
+        return overlapping
+
+    @staticmethod
+    def bulk_report(
+        statuses: List[Optional[BulkItemStatus]],
+        inserted: Optional[Dict[int, Row]] = None,
+    ) -> List[BulkReservationItemDTO]:
+        """Outcome of each reservation of a batch.
+
+        Reservations without an outcome were not attempted because
+        another one failed the atomic batch.
 
         Args:
-            car_id (UUID): Unique identifier for the car
-            start_date (str): Start date
-            end_date (str): End date
+            statuses (List[Optional[BulkItemStatus]]): Outcome of each position
+            inserted (Optional[Dict[int, Row]]): Inserted reservation of each position
 
         Returns:
-            bool: Signifies if the reservation is already made for
-            the given car and date slots
+            List[BulkReservationItemDTO]: Outcome of each reservation, in order
         """
-        query = select(Reservation).where(
-            Reservation.user_id == user_id,
-            Reservation.car_id == car_id,
-            Reservation.start_date == start_date,
-            Reservation.end_date == end_date,
+        inserted = inserted or {}
+        return [
+            BulkReservationItemDTO(
+                index=index,
+                status=status or BulkItemStatus.skipped,
+                reservation=inserted.get(index),
+            )
+            for index, status in enumerate(statuses)
+        ]
+
+    @staticmethod
+    def reservation_event(
+        topic: OutboxTopic,
+        reservation: Reservation,
+        **details: Any,
+    ) -> OutboxEvent:
+        """Outbox event announcing a change of a reservation, committed with it.
+
+        Side effects of the change, such as the confirmation mail, are
+        delivered from the outbox by the worker, after the commit.
+
+        Args:
+            topic (OutboxTopic): Kind of change
+            reservation (Reservation): Changed reservation, or its row
+            details (Any): More JSON fields of the payload
+
+        Returns:
+            OutboxEvent: Event to add to the session
+        """
+        return OutboxEvent(
+            topic=topic.value,
+            payload={
+                "reservation_id": reservation.id,
+                "uuid": str(reservation.uuid),
+                "car_id": reservation.car_id,
+                "user_id": reservation.user_id,
+                "start_date": reservation.start_date.isoformat(),
+                "end_date": reservation.end_date.isoformat(),
+                **details,
+            },
         )
-        rows = await self.session.execute(query)
-        resp = rows.scalars().one_or_none()
-        return True if resp else False
+
+    @staticmethod
+    def payment_reference(row: ReservationInputDTO) -> str:
+        return f"{row.car_id}_{row.start_date}_{row.end_date}"
+
+    async def insert_reservation(self, reservation_row: Reservation) -> None:
+        """Insert a reservation, translating overlaps into a domain error.
+
+        The insert runs in a savepoint, so a rejected row leaves the
+        surrounding transaction usable.
+
+        Args:
+            reservation_row (Reservation): Reservation to persist
+
+        Raises:
+            ReservationAlreadyExist: The car is already booked for an
+            overlapping interval
+        """
+        try:
+            async with self.session.begin_nested():
+                self.session.add(reservation_row)
+        except IntegrityError as error:
+            if getattr(error.orig, "pgcode", None) == EXCLUSION_VIOLATION:
+                raise ReservationAlreadyExist() from error
+            raise
 
     async def lock_car_selection(
         self,
-        user_id: int,
         car_id: int,
-        start_date: str,
-        end_date: str,
-    ):
-        lock_key = f"{user_id}_{car_id}_{start_date}_{end_date}"
-        async with Redis(connection_pool=self.redis_pool) as redis:
-            await redis.set(lock_key, 1, ex=300)
+        start_date: date,
+        end_date: date,
+    ) -> Optional[str]:
+        """Lock every day of the interval for the car while it is being paid for.
+
+        All days are taken in one atomic Redis call, so two customers
+        can't pay for overlapping intervals of the same car at once.
+
+        Args:
+            car_id (int): Unique identifier of the car
+            start_date (date): Start date of the reservation
+            end_date (date): End date of the reservation
+
+        Returns:
+            Optional[str]: Owner token of the lock, None if any day is
+            already locked
+        """
+        return await acquire_lock(
+            self.redis,
+            self.car_selection_lock_keys(car_id, start_date, end_date),
+            settings.reservation_lock_ttl_ms,
+        )
 
     async def release_car_selection_lock(
         self,
-        user_id: int,
         car_id: int,
-        start_date: str,
-        end_date: str,
-    ):
-        lock_key = f"{user_id}_{car_id}_{start_date}_{end_date}"
-        async with Redis(connection_pool=self.redis_pool) as redis:
-            await redis.delete(lock_key)
-
-    async def is_car_selection_locked(
-        self,
-        user_id: int,
+        start_date: date,
+        end_date: date,
+        lock_token: str,
+    ) -> None:
+        """Release a car selection lock, unless another owner holds it by now.
+
+        Args:
+            car_id (int): Unique identifier of the car
+            start_date (date): Start date of the reservation
+            end_date (date): End date of the reservation
+            lock_token (str): Token returned by `lock_car_selection`
+        """
+        await release_lock(
+            self.redis,
+            self.car_selection_lock_keys(car_id, start_date, end_date),
+            lock_token,
+        )
+
+    @staticmethod
+    def car_selection_lock_keys(
         car_id: int,
-        start_date: str,
-        end_date: str,
-    ) -> bool:
-        """Check if a customer is already about to make payment for the same car
-        and on the same date intervals.
+        start_date: date,
+        end_date: date,
+    ) -> List[str]:
+        return [
+            f"reservation_lock:{car_id}:{day.isoformat()}"
+            for day in iter_days(start_date, end_date)
+        ]
+
+    async def get_all_reservation(
+        self,
+        limit: int,
+        offset: int = 0,
+        after_id: Optional[int] = None,
+        filters: Optional[ReservationFilterDTO] = None,
+    ) -> List[Row]:
+        """Get all reservations ordered by id.
+
+        Pages are fetched by keyset (`id > after_id`), which costs the
+        same however deep the page is. Only the listed columns are
+        selected, no `Reservation` object is hydrated.
 
         Args:
-            car_id (UUID): Unique identifier of the car
-            start_date (str): Start date of the reservation
-            end_date (str): End date of the reservation
+            limit (int): limit of records to fetch
+            offset (int): deprecated, records to skip when `after_id` is not given
+            after_id (Optional[int]): id of the last record of the previous page
+            filters (Optional[ReservationFilterDTO]): filters to apply
 
         Returns:
-            bool: Signifies if the selected car and date slots are not
-            already selected and pending for payment
+            List[Row]: List of all reservation records
         """
-        lock_key = f"{user_id}_{car_id}_{start_date}_{end_date}"
-        is_lock_exists = False
-        async with Redis(connection_pool=self.redis_pool) as redis:
-            is_lock_exists = True if await redis.get(lock_key) else False
+        query = select(*RESERVATION_OUTPUT_COLUMNS)
+        if filters is not None:
+            query = query.where(*self.filter_clauses(filters))
+        if after_id is not None:
+            query = query.where(Reservation.id > after_id)
+        elif offset:
+            query = query.offset(offset)
 
-        return is_lock_exists
+        reservations = await self.read_session.execute(
+            query.order_by(Reservation.id).limit(limit),
+        )
+        return reservations.fetchall()
+
+    async def stream_reservations(
+        self,
+        filters: ReservationFilterDTO,
+    ) -> AsyncIterator[List[Row]]:
+        """Stream all reservations matching the filters, ordered by id.
 
-    async def get_all_reservation(self, limit: int, offset: int) -> List[Reservation]:
-        """Get all reservations.
+        Rows are read through a server-side cursor, only one batch is
+        held in memory at a time whatever the number of reservations.
 
         Args:
-            limit (int): limit of records to fetch
-            offset (int): fetching records after a particular number in the sorted order
+            filters (ReservationFilterDTO): filters to apply
 
-        Returns:
-            List[Reservation]: List of all reservation records
+        Yields:
+            List[Row]: batches of at most `EXPORT_BATCH_SIZE` reservations
         """
-        reservations = await self.session.execute(
-            select(Reservation).limit(limit).offset(offset),
+        result = await self.read_session.stream(
+            select(*RESERVATION_OUTPUT_COLUMNS)
+            .where(*self.filter_clauses(filters))
+            .order_by(Reservation.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE),
         )
-        return reservations.scalars().fetchall()
+        async for partition in result.partitions(EXPORT_BATCH_SIZE):
+            yield partition
+
+    @staticmethod
+    def filter_clauses(filters: ReservationFilterDTO) -> List[ColumnElement]:
+        """Where clauses of the reservations list filters.
+
+        Each equality filter has an `(<column>, id)` index, so the
+        filtered pages are read in id order without sorting.
+
+        Args:
+            filters (ReservationFilterDTO): filters to apply
 
-    async def get_reservation_by_id(self, reservation_id: str) -> Reservation:
+        Returns:
+            List[ColumnElement]: clauses to AND together
+        """
+        clauses = []
+        if filters.user_id is not None:
+            clauses.append(Reservation.user_id == filters.user_id)
+        if filters.car_id is not None:
+            clauses.append(Reservation.car_id == filters.car_id)
+        if filters.status is not None:
+            clauses.append(Reservation.status == filters.status.value)
+        if filters.start_date is not None or filters.end_date is not None:
+            window = func.daterange(filters.start_date, filters.end_date, "[]")
+            clauses.append(Reservation.period.overlaps(window))
+        return clauses
+
+    async def get_reservation_by_id(self, reservation_id: int) -> Optional[Reservation]:
         """Get reservation by id.
 
+        Relationships raise when they weren't loaded by the query.
+
         Args:
-            reservation_id (UUID): unique identifier for a reservation
+            reservation_id (int): unique identifier for a reservation
 
         Returns:
-            Reservation: Reservation record
+            Optional[Reservation]: Reservation record, None if not found
         """
-        query = select(Reservation).where(Reservation.id == reservation_id)
-        rows = await self.session.execute(query)
-        return rows.scalars().fetch()
+        rows = await self.session.execute(
+            select(Reservation).where(Reservation.id == reservation_id),
+        )
+        return rows.scalars().one_or_none()
@@ -1,20 +1,60 @@
 from typing import AsyncGenerator
 
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
+from car_rental_service.db.replicas import wrote_recently
+
 
 async def get_db_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     Create and get database session.
 
+    Work left in its transaction is committed after the response, unless
+    the request failed. DAOs commit their writes themselves with
+    `unit_of_work`, to give the connection back early.
+
     :param request: current request.
     :yield: database session.
     """
     session: AsyncSession = request.app.state.db_session_factory()
 
-    try:  # noqa: WPS501
+    try:
         yield session
-    finally:
+    except Exception:
+        await session.rollback()
+        raise
+    else:
         await session.commit()
+    finally:
         await session.close()
+
+
+async def get_db_read_session(
+    request: Request,
+    session: AsyncSession = Depends(get_db_session),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Create and get a database session for read-only queries.
+
+    The session is bound to a read replica, unless none is in sync or
+    the client wrote recently and must see its writes. The primary
+    session is used then.
+
+    :param request: current request.
+    :param session: session of the primary database.
+    :yield: database session.
+    """
+    factory = None
+    if not wrote_recently(request):
+        factory = request.app.state.db_replicas.session_factory()
+    if factory is None:
+        yield session
+        return
+
+    replica_session: AsyncSession = factory()
+    try:  # noqa: WPS501
+        yield replica_session
+    finally:
+        await replica_session.close()
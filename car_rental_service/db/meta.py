@@ -1,3 +1,10 @@
 import sqlalchemy as sa
 
 meta = sa.MetaData()
+
+# `btree_gist` lets GiST exclusion constraints compare plain scalar columns.
+sa.event.listen(
+    meta,
+    "before_create",
+    sa.DDL("CREATE EXTENSION IF NOT EXISTS btree_gist"),
+)
@@ -0,0 +1,65 @@
+"""reservation period range and overlap exclusion constraint
+
+Revision ID: 38cf6221142d
+Revises: 644b08479951
+Create Date: 2026-10-18 09:12:41.203518
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "38cf6221142d"
+down_revision = "644b08479951"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    # Stored generated column, existing rows are backfilled by the rewrite.
+    op.add_column(
+        "reservations",
+        sa.Column(
+            "period",
+            postgresql.DATERANGE(),
+            sa.Computed("daterange(start_date, end_date, '[]')", persisted=True),
+            nullable=True,
+        ),
+    )
+    # Already double-booked reservations would make the constraint below
+    # fail, stop with the conflicts listed so they are resolved by hand.
+    conflicts = op.get_bind().execute(
+        sa.text(
+            """
+            SELECT o.id, r.id FROM reservations AS r
+            JOIN reservations AS o
+              ON o.car_id = r.car_id
+             AND o.id < r.id
+             AND o.period && r.period
+            WHERE r.status = 'SUCCESS' AND o.status = 'SUCCESS'
+            ORDER BY o.id, r.id
+            """,
+        ),
+    )
+    overlapping = ", ".join(f"{first} and {second}" for first, second in conflicts)
+    if overlapping:
+        raise RuntimeError(
+            "Cannot add the overlap constraint, these reservations share "
+            f"days of the same car: {overlapping}. Cancel one of each pair "
+            "and run the migration again.",
+        )
+    op.create_exclude_constraint(
+        "ex_reservations_car_id_period",
+        "reservations",
+        ("car_id", "="),
+        ("period", "&&"),
+        where="status = 'SUCCESS'",
+        using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("ex_reservations_car_id_period", "reservations")
+    op.drop_column("reservations", "period")
@@ -0,0 +1,33 @@
+"""reservations list filter indexes
+
+Revision ID: f6dbcbe45b33
+Revises: 38cf6221142d
+Create Date: 2026-10-18 11:04:17.532904
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f6dbcbe45b33"
+down_revision = "38cf6221142d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_reservations_user_id_id", "reservations", ["user_id", "id"])
+    op.create_index("ix_reservations_car_id_id", "reservations", ["car_id", "id"])
+    op.create_index("ix_reservations_status_id", "reservations", ["status", "id"])
+    op.create_index(
+        "ix_reservations_period",
+        "reservations",
+        ["period"],
+        postgresql_using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_reservations_period", table_name="reservations")
+    op.drop_index("ix_reservations_status_id", table_name="reservations")
+    op.drop_index("ix_reservations_car_id_id", table_name="reservations")
+    op.drop_index("ix_reservations_user_id_id", table_name="reservations")
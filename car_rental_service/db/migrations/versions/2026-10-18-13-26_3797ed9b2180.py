@@ -0,0 +1,39 @@
+"""car zones and search filter indexes
+
+Revision ID: 3797ed9b2180
+Revises: f6dbcbe45b33
+Create Date: 2026-10-18 13:26:41.208153
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3797ed9b2180"
+down_revision = "f6dbcbe45b33"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("cars", sa.Column("zone_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "cars_zone_id_fkey",
+        "cars",
+        "car_availability_zones",
+        ["zone_id"],
+        ["id"],
+    )
+    op.create_index(
+        "ix_cars_zone_id_category_id_brand",
+        "cars",
+        ["zone_id", "category_id", "brand"],
+    )
+    op.create_index("ix_cars_category_id_brand", "cars", ["category_id", "brand"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_cars_category_id_brand", table_name="cars")
+    op.drop_index("ix_cars_zone_id_category_id_brand", table_name="cars")
+    op.drop_constraint("cars_zone_id_fkey", "cars", type_="foreignkey")
+    op.drop_column("cars", "zone_id")
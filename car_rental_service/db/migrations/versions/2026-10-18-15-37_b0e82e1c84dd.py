@@ -0,0 +1,70 @@
+"""reservation holds
+
+Revision ID: b0e82e1c84dd
+Revises: 714f05c2dbcc
+Create Date: 2026-10-18 15:37:12.480315
+
+Nothing wrote PROCESSING reservations before holds. Any such row has
+no expiry and would block its car for good once holds are exclusive.
+The upgrade doesn't guess what they stand for: it stops and lists them,
+to be cancelled or confirmed by hand before running it again.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b0e82e1c84dd"
+down_revision = "714f05c2dbcc"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "reservations",
+        sa.Column("hold_expires_at", sa.DateTime(), nullable=True),
+    )
+    processing = op.get_bind().execute(
+        sa.text(
+            "SELECT id FROM reservations WHERE status = 'PROCESSING' ORDER BY id",
+        ),
+    )
+    processing_ids = ", ".join(str(reservation_id) for (reservation_id,) in processing)
+    if processing_ids:
+        raise RuntimeError(
+            "Cannot turn PROCESSING reservations into holds, these have no "
+            f"expiry: {processing_ids}. Cancel or confirm them and run the "
+            "migration again.",
+        )
+    op.drop_constraint("ex_reservations_car_id_period", "reservations")
+    op.create_exclude_constraint(
+        "ex_reservations_car_id_period",
+        "reservations",
+        ("car_id", "="),
+        ("period", "&&"),
+        where="status IN ('PROCESSING', 'SUCCESS')",
+        using="gist",
+    )
+    op.create_index(
+        "ix_reservations_hold_expires_at",
+        "reservations",
+        ["hold_expires_at"],
+        postgresql_where=sa.text("status = 'PROCESSING'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_reservations_hold_expires_at", table_name="reservations")
+    op.execute(
+        "UPDATE reservations SET status = 'EXPIRED' WHERE status = 'PROCESSING'",
+    )
+    op.drop_constraint("ex_reservations_car_id_period", "reservations")
+    op.create_exclude_constraint(
+        "ex_reservations_car_id_period",
+        "reservations",
+        ("car_id", "="),
+        ("period", "&&"),
+        where="status = 'SUCCESS'",
+        using="gist",
+    )
+    op.drop_column("reservations", "hold_expires_at")
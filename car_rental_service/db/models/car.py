@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import String, Integer
 from sqlalchemy.sql.schema import Column, ForeignKey
@@ -5,14 +6,15 @@ from sqlalchemy.sql.schema import Column, ForeignKey
 from car_rental_service.db.base import Base
 
 
-# **NOTE**: Moved the below `Car` model in the same module as `Reservation`
-# as both need to load in a specific order
-
-
 class Car(Base):
     """Model for master car repository."""
 
     __tablename__: str = "cars"
+    __table_args__ = (
+        # Search filters, a zone is usually picked first, then a category.
+        Index("ix_cars_zone_id_category_id_brand", "zone_id", "category_id", "brand"),
+        Index("ix_cars_category_id_brand", "category_id", "brand"),
+    )
 
     name = Column(String(length=100), nullable=False)
     brand = Column(String(length=50), nullable=False)
@@ -20,6 +22,10 @@ class Car(Base):
 
     # foregin relations
     category_id = Column(Integer, ForeignKey("categories.id"))
+    zone_id = Column(Integer, ForeignKey("car_availability_zones.id"))
+    # Loaded only on request, with `selectinload(Car.reservations)`.
     reservations = relationship(
         "Reservation",
+        back_populates="car",
+        lazy="raise",
     )
@@ -0,0 +1,34 @@
+from sqlalchemy import Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql.schema import Column
+from sqlalchemy.sql.sqltypes import DateTime, Integer, String, Text
+
+from car_rental_service.db.base import Base
+
+
+class OutboxEvent(Base):
+    """Side effect of a write, committed with it and delivered afterwards."""
+
+    __tablename__: str = "outbox_events"
+    __table_args__ = (
+        # Events left to deliver, in the order the worker takes them.
+        Index(
+            "ix_outbox_events_pending",
+            "available_at",
+            "id",
+            postgresql_where=text("delivered_at IS NULL"),
+        ),
+    )
+
+    topic = Column(String(length=50), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    # Earliest time of the next delivery attempt.
+    available_at = Column(
+        DateTime,
+        nullable=False,
+        default=func.now(),
+        server_default=func.now(),
+    )
+    delivered_at = Column(DateTime)
+    last_error = Column(Text)
@@ -1,63 +1,73 @@
+from datetime import date
+
+from sqlalchemy import Computed, Index, and_, func, text
+from sqlalchemy.dialects.postgresql import DATERANGE, ExcludeConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql.sqltypes import String, Date, Integer
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.sqltypes import String, Date, DateTime, Integer
 from sqlalchemy.sql.schema import Column, ForeignKey
 
 from car_rental_service.db.base import Base
+from car_rental_service.schema import ReservationStatus
 
-
-# class Car(Base):
-#     """Model for master car repository."""
-
-#     __tablename__: str = "cars"
-
-#     name = Column(String(length=100), nullable=False)
-#     brand = Column(String(length=50), nullable=False)
-#     registered_number = Column(String(length=12), nullable=False)
-
-#     # foregin relations
-#     category_id = Column(Integer, ForeignKey("categories.id"))
-#     reservations = relationship(
-#         "Reservation",
-#         lazy="joined",
-#     )
-
-
-# class User(Base):
-#     """Model for user."""
-
-#     __tablename__: str = "users"
-
-#     name = Column(String(length=100), nullable=False)
-#     email = Column(String(length=30), nullable=False)
-#     mobile = Column(String(length=10))
-
-#     reservations = relationship(
-#         "Reservation",
-#         lazy="joined",
-#     )
+# Statuses of the reservations taking their car: confirmed ones and the
+# ones held while the customer pays.
+ACTIVE_STATUSES = (ReservationStatus.processing.value, ReservationStatus.success.value)
 
 
 class Reservation(Base):
     """Model for all car reservations made."""
 
     __tablename__: str = "reservations"
+    __table_args__ = (
+        # A car can't have two active reservations sharing a day.
+        # The constraint's GiST index also serves every overlap lookup.
+        ExcludeConstraint(
+            ("car_id", "="),
+            ("period", "&&"),
+            name="ex_reservations_car_id_period",
+            using="gist",
+            where=text("status IN ('PROCESSING', 'SUCCESS')"),
+        ),
+        # Filters of the reservations list, which is paginated by id.
+        Index("ix_reservations_user_id_id", "user_id", "id"),
+        Index("ix_reservations_car_id_id", "car_id", "id"),
+        Index("ix_reservations_status_id", "status", "id"),
+        Index("ix_reservations_period", "period", postgresql_using="gist"),
+        # Holds in the order they expire, for the sweeper.
+        Index(
+            "ix_reservations_hold_expires_at",
+            "hold_expires_at",
+            postgresql_where=text("status = 'PROCESSING'"),
+        ),
+    )
 
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
     status = Column(String(length=10), nullable=False)
-
-    # foreign relations
+    period = Column(
+        DATERANGE,
+        Computed("daterange(start_date, end_date, '[]')", persisted=True),
+    )
+    # End of the hold of a PROCESSING reservation, it can't be confirmed later.
+    hold_expires_at = Column(DateTime)
+
+    # foreign relations, never loaded implicitly: queries select the
+    # columns they need or load a relationship with an explicit option
     car_id = Column(Integer, ForeignKey("cars.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
-
-
-car = relationship(
-    "Car",
-    back_populates="reservations",
-    lazy="joined",
-)
-user = relationship(
-    "User",
-    back_populates="reservations",
-    lazy="joined",
-)
+    car = relationship("Car", back_populates="reservations", lazy="raise")
+    user = relationship("User", back_populates="reservations", lazy="raise")
+
+    @classmethod
+    def overlaps(cls, start_date: date, end_date: date) -> ColumnElement:
+        """Filter for active reservations sharing a day with the interval.
+
+        Both interval ends are inclusive, so a reservation ending on
+        `start_date` still blocks it. Held cars are taken until their
+        hold is swept.
+        """
+        return and_(
+            cls.status.in_(ACTIVE_STATUSES),
+            cls.period.overlaps(func.daterange(start_date, end_date, "[]")),
+        )
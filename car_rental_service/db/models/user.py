@@ -14,7 +14,9 @@ class User(Base):
     email = Column(String(length=30), nullable=False)
     mobile = Column(String(length=10))
 
+    # Loaded only on request, with `selectinload(User.reservations)`.
     reservations = relationship(
         "Reservation",
-        lazy="joined",
+        back_populates="user",
+        lazy="raise",
     )
@@ -0,0 +1,68 @@
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from car_rental_service.services.metrics.metrics import (
+    DB_CONNECTION_HELD_SECONDS,
+    DB_POOL_CHECKOUT_SECONDS,
+)
+from car_rental_service.settings import settings
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long checkouts wait for a connection.
+
+    The wait includes opening a connection when the pool grows.
+    """
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+def _on_checkout(
+    dbapi_connection: Any,
+    record: Any,
+    proxy: Any,
+) -> None:
+    record.info["checked_out_at"] = time.perf_counter()
+
+
+def _on_checkin(dbapi_connection: Any, record: Any) -> None:
+    checked_out_at = record.info.pop("checked_out_at", None)
+    if checked_out_at is not None:
+        DB_CONNECTION_HELD_SECONDS.observe(time.perf_counter() - checked_out_at)
+
+
+def create_pooled_engine(url: str) -> AsyncEngine:
+    """
+    Create an engine with the configured pool.
+
+    The pool records how long connections are waited for and held.
+
+    :param url: database URL.
+    :returns: engine.
+    """
+    engine = create_async_engine(
+        url,
+        echo=settings.db_echo,
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=settings.db_worker_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle,
+        connect_args={
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "command_timeout": settings.db_command_timeout,
+        },
+    )
+    event.listen(engine.sync_engine.pool, "checkout", _on_checkout)
+    event.listen(engine.sync_engine.pool, "checkin", _on_checkin)
+    return engine
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from car_rental_service.services.metrics.metrics import DB_REPLICA_LAG_SECONDS
+from car_rental_service.settings import settings
+
+# Seconds the replica is behind the primary, 0 when it replayed all it
+# received or when the database is not a replica.
+REPLICATION_LAG_QUERY = text(
+    """
+    SELECT COALESCE(
+        CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END,
+        0
+    )
+    """,
+)
+
+# Set on responses to writes, holds the time of the write.
+LAST_WRITE_COOKIE = "last_write_at"
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+logger = logging.getLogger(__name__)
+
+
+def read_your_writes_window() -> float:
+    """
+    Seconds during which a client reads from the primary after a write.
+
+    A replica within the lag guard has replayed every write older than
+    the max lag, give or take one lag check.
+
+    :returns: seconds.
+    """
+    return settings.db_replica_max_lag + settings.db_replica_check_interval
+
+
+def wrote_recently(request: Request) -> bool:
+    """
+    Whether a replica may still miss the last write of the client.
+
+    :param request: current request.
+    :returns: True if the client must read from the primary.
+    """
+    try:
+        last_write_at = float(request.cookies.get(LAST_WRITE_COOKIE, ""))
+    except ValueError:
+        return False
+    return time.time() - last_write_at < read_your_writes_window()
+
+
+class ReplicaSet:
+    """Read replicas of the primary database, picked round-robin.
+
+    A replica lagging more than `max_lag` seconds, or which can't be
+    reached, is skipped until a later check finds it in sync. Lags are
+    unknown, so replicas are skipped, until the first check.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float) -> None:
+        self.engines = engines
+        self.max_lag = max_lag
+        self.session_factories = [
+            sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+            for engine in engines
+        ]
+        self.lags = [math.inf] * len(engines)
+        self._turns = itertools.count()
+
+    def session_factory(self) -> Optional[sessionmaker]:
+        """
+        Session factory of the next replica within the lag guard.
+
+        :returns: session factory, None if no replica is in sync.
+        """
+        for _ in range(len(self.engines)):
+            index = next(self._turns) % len(self.engines)
+            if self.lags[index] <= self.max_lag:
+                return self.session_factories[index]
+        return None
+
+    async def check_lags(self) -> None:
+        """Measure the replication lag of every replica."""
+        await asyncio.gather(
+            *[self._check_lag(index) for index in range(len(self.engines))],
+        )
+
+    async def monitor(self, interval: float) -> None:  # pragma: no cover
+        """
+        Check the replication lags forever.
+
+        :param interval: seconds between two checks.
+        """
+        while True:  # noqa: WPS457
+            await asyncio.sleep(interval)
+            try:
+                await self.check_lags()
+            except Exception:
+                logger.exception("Replication lag check failed.")
+
+    def in_sync_engines(self) -> List[AsyncEngine]:
+        """
+        Engines of the replicas within the lag guard.
+
+        :returns: engines.
+        """
+        return [
+            engine
+            for engine, lag in zip(self.engines, self.lags)
+            if lag <= self.max_lag
+        ]
+
+    async def dispose(self) -> None:  # pragma: no cover
+        """Close the connections of every replica."""
+        for engine in self.engines:
+            await engine.dispose()
+
+    async def _check_lag(self, index: int) -> None:
+        try:
+            lag = await asyncio.wait_for(
+                self._query_lag(index),
+                settings.db_replica_check_timeout,
+            )
+        except Exception as error:
+            logger.warning("Read replica %d is unreachable: %r", index, error)
+            lag = math.inf
+        self.lags[index] = float(lag)
+        DB_REPLICA_LAG_SECONDS.labels(index).set(self.lags[index])
+
+    async def _query_lag(self, index: int) -> float:
+        async with self.engines[index].connect() as connection:
+            return await connection.scalar(REPLICATION_LAG_QUERY)
+
+
+class ReadYourWritesMiddleware:
+    """Marks the clients which wrote, so they read from the primary for a while.
+
+    Every successful unsafe request sets the `last_write_at` cookie,
+    which `get_db_read_session` checks.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:  # noqa: WPS430
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{LAST_WRITE_COOKIE}={time.time():.3f}; "
+                    f"Max-Age={math.ceil(read_your_writes_window())}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
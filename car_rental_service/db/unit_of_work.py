@@ -0,0 +1,24 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@asynccontextmanager
+async def unit_of_work(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Run a short transaction on the session around the SQL of a block.
+
+    The transaction is committed when the block succeeds and rolled back
+    when it raises. Its connection goes back to the pool either way, so
+    slow I/O between two blocks, such as a payment, holds no connection.
+
+    :param session: database session.
+    :yields: the session, in a transaction.
+    """
+    try:
+        yield session
+    except BaseException:
+        await session.rollback()
+        raise
+    await session.commit()
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from car_rental_service.db.dao.car_dao import CarDAO
+from car_rental_service.db.dao.reservation_dao import ReservationDAO
+from car_rental_service.services.catalog.catalog import CarCatalog
+from car_rental_service.settings import settings
+from car_rental_service.web.exceptions import ReservationNotFound
+
+
+async def prepare_hot_statements(session: AsyncSession, read_only: bool) -> None:
+    """
+    Run the statements of searches and bookings once.
+
+    Statements are prepared on first use and cached by the connection,
+    running them through the DAOs caches the exact SQL requests send.
+    Searches go straight to their SQL, past the search cache, the
+    occupancy index and the sharing of identical searches, so every
+    connection prepares them. Nothing is written, not even a sequence
+    value: the bookings are warmed up by the row lock of changes and
+    cancels, taken on an id no reservation has.
+
+    :param session: session bound to the connection to warm up.
+    :param read_only: skip the booking statements, for read replicas.
+    """
+    today = date.today()
+    car_dao = CarDAO(
+        session,
+        redis=None,
+        catalog=CarCatalog(),
+        primary_session=session,
+    )
+    await car_dao.get_reserved_cars(today, today)
+    if not settings.occupancy_index:
+        await car_dao.select_available_cars(today, today)
+
+    reservation_dao = ReservationDAO(
+        session,
+        redis=None,
+        payment_gateway=None,
+        read_session=session,
+    )
+    await reservation_dao.get_all_reservation(limit=1)
+    await reservation_dao.get_all_reservation(limit=1, after_id=0)
+    if read_only:
+        return
+    try:
+        await reservation_dao.lock_active_reservation(0)
+    except ReservationNotFound:
+        pass
+
+
+async def _warm_up_connection(engine: AsyncEngine, read_only: bool) -> None:
+    async with engine.connect() as connection:
+        async with AsyncSession(bind=connection) as session:
+            await prepare_hot_statements(session, read_only)
+            await session.rollback()
+
+
+async def warm_up_pool(
+    engine: AsyncEngine,
+    connections: int,
+    read_only: bool = False,
+) -> None:
+    """
+    Open pool connections before the first requests need them.
+
+    Connections are opened concurrently and each one prepares the hot
+    statements, so the first requests after a deploy pay neither the
+    connect nor the parse cost.
+
+    :param engine: engine whose pool is warmed up.
+    :param connections: number of connections to open.
+    :param read_only: skip the booking statements, for read replicas.
+    """
+    await asyncio.gather(
+        *[_warm_up_connection(engine, read_only) for _ in range(connections)],
+    )
@@ -0,0 +1,373 @@
+"""Bulk-load synthetic cars, users and reservations for scale testing.
+
+Run with `python -m car_rental_service.generate --cars 100000
+--users 1000000 --reservations 50000000` against a migrated database.
+Rows are streamed with COPY, and the reservation indexes are rebuilt
+once after the load instead of being updated row by row.
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Iterator, List, Sequence, Tuple
+from uuid import uuid4
+
+import asyncpg
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import AddConstraint, CreateIndex, DropConstraint, DropIndex
+
+from car_rental_service.db.models.reservation import Reservation
+from car_rental_service.schema import ReservationStatus
+from car_rental_service.settings import settings
+
+BRAND_MODELS = {
+    "Maruti": ("Swift", "Baleno", "Dzire", "Ertiga"),
+    "Hyundai": ("i20", "Creta", "Verna", "Venue"),
+    "Tata": ("Nexon", "Punch", "Tiago", "Harrier"),
+    "Mahindra": ("XUV700", "Thar", "Scorpio"),
+    "Toyota": ("Innova", "Fortuner", "Glanza"),
+    "Honda": ("City", "Amaze"),
+}
+STATE_CODES = ("DL", "HR", "KA", "MH", "TN", "UP", "GJ", "RJ")
+
+# Trip lengths in days and how often they occur: mostly short trips,
+# with a tail of weekly and monthly rentals.
+TRIP_DAYS = (1, 2, 3, 4, 5, 6, 7, 10, 14, 21, 30)
+TRIP_WEIGHTS = (18, 22, 18, 10, 7, 5, 9, 4, 4, 2, 1)
+MEAN_TRIP_DAYS = sum(
+    days * weight for days, weight in zip(TRIP_DAYS, TRIP_WEIGHTS)
+) / sum(TRIP_WEIGHTS)
+# Days between booking and pickup follow an exponential distribution.
+MEAN_LEAD_DAYS = 14
+MAX_LEAD_DAYS = 180
+CANCELLATION_RATE = 0.08
+
+CAR_COLUMNS = (
+    "uuid",
+    "created_at",
+    "updated_at",
+    "name",
+    "brand",
+    "registered_number",
+    "category_id",
+    "zone_id",
+)
+USER_COLUMNS = ("uuid", "created_at", "updated_at", "name", "email", "mobile")
+RESERVATION_COLUMNS = (
+    "uuid",
+    "created_at",
+    "updated_at",
+    "car_id",
+    "user_id",
+    "start_date",
+    "end_date",
+    "status",
+)
+
+
+def car_rows(
+    count: int,
+    category_ids: Sequence[int],
+    zone_ids: Sequence[int],
+    rng: random.Random,
+    now: datetime,
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    Generate cars of random brands, models, categories and zones.
+
+    :param count: number of cars.
+    :param category_ids: existing categories.
+    :param zone_ids: existing zones.
+    :param rng: random generator.
+    :param now: creation time of the cars.
+    :yields: rows in `CAR_COLUMNS` order.
+    """
+    brands = list(BRAND_MODELS)
+    for _ in range(count):
+        brand = rng.choice(brands)
+        registered_number = "{0}{1:02d}{2}{3}{4:04d}".format(
+            rng.choice(STATE_CODES),
+            rng.randint(1, 99),
+            chr(rng.randint(65, 90)),
+            chr(rng.randint(65, 90)),
+            rng.randint(1, 9999),
+        )
+        yield (
+            uuid4(),
+            now,
+            now,
+            rng.choice(BRAND_MODELS[brand]),
+            brand,
+            registered_number,
+            rng.choice(category_ids),
+            rng.choice(zone_ids),
+        )
+
+
+def user_rows(
+    first_number: int,
+    count: int,
+    rng: random.Random,
+    now: datetime,
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    Generate users with unique emails.
+
+    :param first_number: number of the first user, keeps emails unique
+        across runs.
+    :param count: number of users.
+    :param rng: random generator.
+    :param now: creation time of the users.
+    :yields: rows in `USER_COLUMNS` order.
+    """
+    for number in range(first_number, first_number + count):
+        yield (
+            uuid4(),
+            now,
+            now,
+            f"User {number}",
+            f"user{number}@example.com",
+            str(rng.randint(6_000_000_000, 9_999_999_999)),
+        )
+
+
+def trip_lengths(count: int, span: int, rng: random.Random) -> List[int]:
+    """
+    Draw the lengths of the successive trips of one car.
+
+    :param count: number of trips.
+    :param span: days the trips must fit in.
+    :param rng: random generator.
+    :returns: lengths in days, one day each if the draw doesn't fit.
+    """
+    lengths = rng.choices(TRIP_DAYS, TRIP_WEIGHTS, k=count)
+    if sum(lengths) > span:
+        return [1] * count
+    return lengths
+
+
+def reservation_rows(  # noqa: WPS210
+    car_ids: Sequence[int],
+    user_ids: Sequence[int],
+    count: int,
+    first_day: date,
+    last_day: date,
+    rng: random.Random,
+    now: datetime,
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    Generate a booking history with no overlapping trips per car.
+
+    Trips are spread over the cars evenly and placed on each car's
+    calendar with random idle gaps between them. Some users rent far
+    more often than others, and bookings are made a couple of weeks
+    before pickup.
+
+    :param car_ids: cars to book, they must have no reservations yet.
+    :param user_ids: users who book.
+    :param count: number of reservations.
+    :param first_day: earliest pickup.
+    :param last_day: latest return.
+    :param rng: random generator.
+    :param now: no booking is made later than this.
+    :yields: rows in `RESERVATION_COLUMNS` order.
+    """
+    span = (last_day - first_day).days + 1
+    per_car, extra = divmod(count, len(car_ids))
+    for index, car_id in enumerate(car_ids):
+        lengths = trip_lengths(per_car + (index < extra), span, rng)
+        idle = span - sum(lengths)
+        cuts = sorted(rng.randint(0, idle) for _ in lengths)
+        day = first_day
+        previous_cut = 0
+        for length, cut in zip(lengths, cuts):
+            start = day + timedelta(days=cut - previous_cut)
+            end = start + timedelta(days=length - 1)
+            day = end + timedelta(days=1)
+            previous_cut = cut
+            lead = min(rng.expovariate(1 / MEAN_LEAD_DAYS), MAX_LEAD_DAYS)
+            booked_at = min(
+                datetime.combine(start, datetime.min.time()) - timedelta(days=lead),
+                now,
+            )
+            if rng.random() < CANCELLATION_RATE:
+                status = ReservationStatus.cancelled.value
+            else:
+                status = ReservationStatus.success.value
+            yield (
+                uuid4(),
+                booked_at,
+                booked_at,
+                car_id,
+                # Squaring skews the picks towards the first users.
+                user_ids[int(len(user_ids) * rng.random() ** 2)],
+                start,
+                end,
+                status,
+            )
+
+
+def _ddl(element: Any) -> str:
+    return str(element.compile(dialect=postgresql.dialect()))
+
+
+async def _copy(
+    connection: asyncpg.Connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterator[Tuple[Any, ...]],
+    count: int,
+) -> None:
+    started = time.perf_counter()
+    await connection.copy_records_to_table(table, records=rows, columns=columns)
+    elapsed = time.perf_counter() - started
+    print(f"{table:<13}{count:>12} rows {elapsed:8.1f} s")
+
+
+async def _new_ids(connection: asyncpg.Connection, table: str, after: int) -> List[int]:
+    rows = await connection.fetch(
+        f"SELECT id FROM {table} WHERE id > $1 ORDER BY id",  # noqa: S608
+        after,
+    )
+    return [row["id"] for row in rows]
+
+
+async def _sync_sequence(connection: asyncpg.Connection, table: str) -> int:
+    """
+    Move the id sequence of a table past its rows.
+
+    The seed migration inserts explicit ids, leaving the sequences behind.
+
+    :param connection: database connection.
+    :param table: table name.
+    :returns: highest id of the table, 0 when it's empty.
+    """
+    return await connection.fetchval(
+        f"SELECT coalesce(setval(pg_get_serial_sequence('{table}', 'id'), max(id)), 0) "  # noqa: E501, S608
+        f"FROM {table}",
+    )
+
+
+async def generate(args: argparse.Namespace) -> None:
+    """
+    Load the generated rows.
+
+    Reservations only go to the cars generated by the same run, so
+    they can't overlap existing ones.
+
+    :param args: command line arguments.
+    """
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    connection = await asyncpg.connect(
+        str(settings.db_url.with_scheme("postgresql")),
+    )
+    try:
+        await connection.execute("SET synchronous_commit TO off")
+        category_ids = [
+            row["id"] for row in await connection.fetch("SELECT id FROM categories")
+        ]
+        zone_ids = [
+            row["id"]
+            for row in await connection.fetch("SELECT id FROM car_availability_zones")
+        ]
+        last_car_id = await _sync_sequence(connection, "cars")
+        last_user_id = await _sync_sequence(connection, "users")
+        await _copy(
+            connection,
+            "cars",
+            CAR_COLUMNS,
+            car_rows(args.cars, category_ids, zone_ids, rng, now),
+            args.cars,
+        )
+        await _copy(
+            connection,
+            "users",
+            USER_COLUMNS,
+            user_rows(last_user_id + 1, args.users, rng, now),
+            args.users,
+        )
+        if args.reservations:
+            await _load_reservations(connection, args, rng, now, last_car_id)
+        await connection.execute("ANALYZE cars, users, reservations")
+    finally:
+        await connection.close()
+
+
+async def _load_reservations(
+    connection: asyncpg.Connection,
+    args: argparse.Namespace,
+    rng: random.Random,
+    now: datetime,
+    last_car_id: int,
+) -> None:
+    await _sync_sequence(connection, "reservations")
+    car_ids = await _new_ids(connection, "cars", last_car_id)
+    user_ids = await _new_ids(connection, "users", 0)
+    rows = reservation_rows(
+        car_ids,
+        user_ids,
+        args.reservations,
+        args.first_day,
+        args.last_day,
+        rng,
+        now,
+    )
+    table = Reservation.__table__
+    constraints = [
+        constraint
+        for constraint in table.constraints
+        if constraint.name == "ex_reservations_car_id_period"
+    ]
+    # DDL is transactional, a failed load leaves the indexes in place.
+    async with connection.transaction():
+        for constraint in constraints:
+            await connection.execute(_ddl(DropConstraint(constraint)))
+        for index in table.indexes:
+            await connection.execute(_ddl(DropIndex(index)))
+        await _copy(
+            connection,
+            "reservations",
+            RESERVATION_COLUMNS,
+            rows,
+            args.reservations,
+        )
+        started = time.perf_counter()
+        for index in table.indexes:
+            await connection.execute(_ddl(CreateIndex(index)))
+        for constraint in constraints:
+            await connection.execute(_ddl(AddConstraint(constraint)))
+        print(f"{'indexes':<13}{'':>17} {time.perf_counter() - started:8.1f} s")
+
+
+def main() -> None:
+    """Entrypoint of the data generator."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cars", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--reservations", type=int, default=100_000)
+    parser.add_argument("--first-day", type=date.fromisoformat)
+    parser.add_argument("--last-day", type=date.fromisoformat)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Three years of history and a quarter of upcoming trips by default.
+    if args.last_day is None:
+        args.last_day = date.today() + timedelta(days=90)
+    if args.first_day is None:
+        args.first_day = args.last_day - timedelta(days=3 * 365)
+    span = (args.last_day - args.first_day).days + 1
+    if args.reservations and not args.cars:
+        parser.error("reservations need --cars, they only go to new cars")
+    if args.cars and math.ceil(args.reservations / args.cars) * MEAN_TRIP_DAYS > span:
+        parser.error(
+            "too many reservations per car for the dates, "
+            "add cars or widen --first-day/--last-day",
+        )
+    asyncio.run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
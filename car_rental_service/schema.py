@@ -5,3 +5,16 @@ class ReservationStatus(str, Enum):
     success = "SUCCESS"
     cancelled = "CANCELLED"
     processing = "PROCESSING"
+    expired = "EXPIRED"
+
+
+class CarSort(str, Enum):
+    id = "id"
+    name = "name"
+    brand = "brand"
+
+
+class OutboxTopic(str, Enum):
+    reservation_created = "reservation.created"
+    reservation_cancelled = "reservation.cancelled"
+    reservation_changed = "reservation.changed"
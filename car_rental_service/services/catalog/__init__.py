@@ -0,0 +1 @@
+"""Car catalog service."""
@@ -0,0 +1,151 @@
+import heapq
+from collections import defaultdict
+from itertools import islice
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from car_rental_service.db.models.car import Car
+from car_rental_service.schema import CarSort
+
+
+class CarRecord(NamedTuple):
+    """Compact read-only copy of a car, as exposed by search."""
+
+    id: int
+    uuid: UUID
+    created_at: datetime
+    updated_at: datetime
+    name: str
+    brand: str
+    registered_number: str
+    category_id: Optional[int]
+    zone_id: Optional[int]
+
+
+class CarFilters(NamedTuple):
+    """Attributes a searched car must have, None matches any value."""
+
+    category_id: Optional[int] = None
+    brand: Optional[str] = None
+    zone_id: Optional[int] = None
+
+    def is_set(self) -> bool:
+        """Whether any attribute is filtered on."""
+        return any(value is not None for value in self)
+
+    def matches(self, car: CarRecord) -> bool:
+        """
+        Whether the car has every filtered attribute.
+
+        :param car: car to check.
+        :returns: True on a match.
+        """
+        return all(
+            value is None or getattr(car, field) == value
+            for field, value in zip(self._fields, self)
+        )
+
+
+# Columns to select for building `CarRecord` rows.
+CAR_RECORD_COLUMNS = [getattr(Car, field) for field in CarRecord._fields]
+# Attributes searches can be filtered and counted on.
+FACETS = CarFilters._fields
+
+
+def sort_key(sort: CarSort) -> Any:
+    """
+    Key ordering cars for a sort, ties are broken by id.
+
+    :param sort: requested order.
+    :returns: key function.
+    """
+    if sort == CarSort.id:
+        return lambda car: car.id
+    field = sort.value
+    return lambda car: (getattr(car, field), car.id)
+
+
+class CarCatalog:
+    """In-process copy of the car fleet.
+
+    Cars rarely change, so searches filter this copy instead of
+    selecting and hydrating `Car` rows on every request. A reload
+    swaps the whole mapping, readers never see a partial catalog.
+    """
+
+    def __init__(self) -> None:
+        self.cars: Dict[int, CarRecord] = {}
+        # Cars by value of each facet, so filtered searches only walk
+        # the cars of the smallest matching group.
+        self.groups: Dict[str, Dict[Any, List[CarRecord]]] = {}
+        self.is_loaded = False
+
+    async def load(self, session: AsyncSession) -> None:
+        """
+        (Re)load the catalog from the database.
+
+        :param session: database session.
+        """
+        rows = await session.execute(
+            select(*CAR_RECORD_COLUMNS).order_by(Car.id),
+        )
+        cars = {row.id: CarRecord(*row) for row in rows}
+        groups: Dict[str, Dict[Any, List[CarRecord]]] = {
+            facet: defaultdict(list) for facet in FACETS
+        }
+        for car in cars.values():
+            for facet in FACETS:
+                groups[facet][getattr(car, facet)].append(car)
+        self.cars, self.groups = cars, groups
+        self.is_loaded = True
+
+    def available(
+        self,
+        reserved_car_ids: Iterable[int],
+        car_id: Optional[int] = None,
+        filters: CarFilters = CarFilters(),
+        sort: CarSort = CarSort.id,
+        limit: Optional[int] = None,
+    ) -> List[CarRecord]:
+        """
+        Cars of the catalog which are not reserved.
+
+        :param reserved_car_ids: ids of the reserved cars.
+        :param car_id: restrict the result to a single car.
+        :param filters: attributes the cars must have.
+        :param sort: order of the cars.
+        :param limit: most cars to return.
+        :returns: available cars.
+        """
+        reserved = set(reserved_car_ids)
+        if car_id:
+            car = self.cars.get(car_id)
+            if car and car_id not in reserved and filters.matches(car):
+                return [car]
+            return []
+
+        cars = (
+            car
+            for car in self._candidates(filters)
+            if car.id not in reserved and filters.matches(car)
+        )
+        if sort == CarSort.id:
+            # Candidates are already ordered by id.
+            return list(islice(cars, limit))
+        if limit is None:
+            return sorted(cars, key=sort_key(sort))
+        return heapq.nsmallest(limit, cars, key=sort_key(sort))
+
+    def _candidates(self, filters: CarFilters) -> Iterable[CarRecord]:
+        groups = [
+            self.groups[facet].get(value, [])
+            for facet, value in zip(FACETS, filters)
+            if value is not None
+        ]
+        if not groups:
+            return self.cars.values()
+        return min(groups, key=len)
@@ -0,0 +1,13 @@
+from starlette.requests import Request
+
+from car_rental_service.services.catalog.catalog import CarCatalog
+
+
+def get_car_catalog(request: Request) -> CarCatalog:  # pragma: no cover
+    """
+    Returns the car catalog of the application.
+
+    :param request: current request.
+    :returns: car catalog.
+    """
+    return request.app.state.car_catalog
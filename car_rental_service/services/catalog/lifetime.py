@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+from fastapi import FastAPI
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from car_rental_service.services.catalog.catalog import CarCatalog
+from car_rental_service.settings import settings
+
+# Publish any message on this channel after changing cars, every worker
+# then reloads its catalog.
+CATALOG_CHANNEL = "car_catalog:invalidate"
+# Seconds waited for a message at a time, below the socket timeout so an
+# idle channel doesn't read as a dead connection.
+LISTEN_TIMEOUT = 1
+# Seconds before resubscribing after a failure, doubled by every failure
+# in a row up to the maximum.
+RESUBSCRIBE_DELAY = 1
+MAX_RESUBSCRIBE_DELAY = 30
+
+logger = logging.getLogger(__name__)
+
+
+async def publish_catalog_change(redis: Redis) -> None:
+    """
+    Notifies all workers that cars have changed.
+
+    :param redis: redis client.
+    """
+    await redis.publish(CATALOG_CHANNEL, 1)
+
+
+async def _reload_catalog(app: FastAPI) -> None:  # pragma: no cover
+    async with AsyncSession(app.state.db_engine) as session:
+        await app.state.car_catalog.load(session)
+
+
+async def _listen_for_changes(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Reloads the catalog whenever a change is published.
+
+    Changes published while the subscription was down are missed,
+    so the catalog is reloaded after every resubscription. Any failure,
+    of Redis or of a reload, is logged and followed by a resubscription.
+
+    :param app: current fastapi application.
+    """
+    delay = RESUBSCRIBE_DELAY
+    while True:  # noqa: WPS457
+        try:
+            async with Redis(connection_pool=app.state.redis_pool) as redis:
+                async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(CATALOG_CHANNEL)
+                    await _reload_catalog(app)
+                    delay = RESUBSCRIBE_DELAY
+                    while True:  # noqa: WPS457
+                        message = await pubsub.get_message(timeout=LISTEN_TIMEOUT)
+                        if message is not None:
+                            await _reload_catalog(app)
+        except Exception:
+            logger.exception(
+                "Car catalog subscription failed, resubscribing in %s s.",
+                delay,
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESUBSCRIBE_DELAY)
+
+
+async def init_car_catalog(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Loads the car catalog and keeps it in sync with the database.
+
+    :param app: current fastapi application.
+    """
+    app.state.car_catalog = CarCatalog()
+    if settings.car_catalog:
+        await _reload_catalog(app)
+        app.state.car_catalog_listener = asyncio.create_task(
+            _listen_for_changes(app),
+        )
+
+
+async def shutdown_car_catalog(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops following car changes.
+
+    :param app: current FastAPI app.
+    """
+    if settings.car_catalog:
+        app.state.car_catalog_listener.cancel()
@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+from fastapi import FastAPI
+from prometheus_client import multiprocess
+
+from car_rental_service.services.metrics.metrics import (
+    DB_POOL_CONNECTIONS,
+    EVENT_LOOP_LAG_SECONDS,
+    REDIS_POOL_CONNECTIONS,
+    multiprocess_dir,
+)
+from car_rental_service.settings import settings
+
+
+def _report_pools(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Reports the usage of the connection pools.
+
+    The gauges are set rather than read when metrics are collected,
+    with several workers another process answers the collection.
+
+    :param app: current fastapi application.
+    """
+    db_pool = app.state.db_engine.pool
+    DB_POOL_CONNECTIONS.labels("checked_out").set(db_pool.checkedout())
+    DB_POOL_CONNECTIONS.labels("idle").set(db_pool.checkedin())
+    DB_POOL_CONNECTIONS.labels("overflow").set(max(db_pool.overflow(), 0))
+
+    redis_pool = app.state.redis_pool
+    REDIS_POOL_CONNECTIONS.labels("in_use").set(redis_pool.in_use())
+    REDIS_POOL_CONNECTIONS.labels("available").set(redis_pool.idle())
+
+
+async def _sample_runtime(app: FastAPI, interval: float) -> None:  # pragma: no cover
+    """
+    Measures how late the event loop wakes up a sleeping task.
+
+    A loop blocked by CPU bound work or blocking calls delays every
+    request by the same amount. The pools are reported on each wake up.
+
+    :param app: current fastapi application.
+    :param interval: seconds between two measures.
+    """
+    loop = asyncio.get_running_loop()
+    while True:  # noqa: WPS457
+        _report_pools(app)
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.set(max(loop.time() - started - interval, 0))
+
+
+def init_metrics(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts collecting the runtime metrics.
+
+    :param app: current fastapi application.
+    """
+    app.state.runtime_sampler = asyncio.create_task(
+        _sample_runtime(app, settings.metrics_loop_lag_interval),
+    )
+
+
+async def shutdown_metrics(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops collecting the runtime metrics.
+
+    :param app: current FastAPI app.
+    """
+    app.state.runtime_sampler.cancel()
+    if multiprocess_dir():
+        # Drops the live gauges of this worker from the other workers' output.
+        multiprocess.mark_process_dead(os.getpid())
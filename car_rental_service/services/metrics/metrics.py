@@ -0,0 +1,90 @@
+import os
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Directory where each worker writes its metrics, set when several
+# workers serve the application.
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Seconds, from an in-memory lookup up to a payment timing out.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DAO_STAGE_SECONDS = Histogram(
+    "dao_stage_duration_seconds",
+    "Latency of each stage of the DAO operations.",
+    ["operation", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool.",
+    buckets=LATENCY_BUCKETS,
+)
+DB_CONNECTION_HELD_SECONDS = Histogram(
+    "db_connection_held_seconds",
+    "Time a database connection stays checked out of the pool.",
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Database connections of the pools by state.",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag of each read replica, +Inf when unreachable.",
+    ["replica"],
+    multiprocess_mode="liveall",
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections",
+    "Redis connections of the pools by state.",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+REDIS_POOL_EXHAUSTED_TOTAL = Counter(
+    "redis_pool_exhausted_total",
+    "Redis commands which found every connection in use, by outcome of the wait.",
+    ["outcome"],
+)
+EVENT_LOOP_LAG_SECONDS = Gauge(
+    "event_loop_lag_seconds",
+    "Delay of the event loop in running a timer callback.",
+    multiprocess_mode="liveall",
+)
+SINGLE_FLIGHT_SHARED_TOTAL = Counter(
+    "single_flight_shared_total",
+    "Calls answered by an identical call already in flight.",
+    ["operation"],
+)
+
+
+def multiprocess_dir() -> Optional[str]:
+    """
+    Directory shared by the workers for their metrics.
+
+    :returns: the directory, None when a single process serves the metrics.
+    """
+    return os.environ.get(MULTIPROC_DIR_ENV)
@@ -0,0 +1,60 @@
+import time
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from car_rental_service.services.metrics.metrics import HTTP_REQUEST_SECONDS
+
+# Route label of requests matching no route, raw paths would explode
+# the number of series.
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Path template of the route handling a request.
+
+    :param scope: ASGI scope of the request.
+    :returns: route path such as `/api/reservations/`.
+    """
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """Records the latency of every HTTP request.
+
+    The request ends when the last body chunk is sent, so streamed
+    responses are measured whole.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Matched up front, routing rewrites the path of mounted apps.
+        route = route_template(scope)
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:  # noqa: WPS430
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                route,
+                status_code,
+            ).observe(time.perf_counter() - started)
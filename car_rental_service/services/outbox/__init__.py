@@ -0,0 +1 @@
+"""Outbox service."""
@@ -0,0 +1,57 @@
+import logging
+import random
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxMessage(NamedTuple):
+    """Event of the outbox, as handed to a sink."""
+
+    id: int
+    uuid: UUID
+    topic: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class OutboxSink(ABC):
+    """Interface of the consumers of outbox events: mailer, analytics..."""
+
+    @abstractmethod
+    async def deliver(self, message: OutboxMessage) -> None:
+        """Deliver an event.
+
+        Events are delivered at least once, a consumer may receive one
+        again, the message uuid identifies duplicates.
+
+        Args:
+            message (OutboxMessage): Event to deliver
+
+        Raises:
+            Exception: Any error has the event retried later
+        """
+
+    async def close(self) -> None:
+        """Release resources held by the sink."""
+
+
+class LocalOutboxSink(OutboxSink):
+    """Local stand-in for the consumers of outbox events.
+
+    It logs the events and keeps the last `history` of them, and fails
+    `failure_rate` of the deliveries.
+    """
+
+    def __init__(self, failure_rate: float = 0, history: int = 1000) -> None:
+        self.failure_rate = failure_rate
+        self.delivered: Deque[OutboxMessage] = deque(maxlen=history)
+
+    async def deliver(self, message: OutboxMessage) -> None:
+        if random.random() < self.failure_rate:  # noqa: S311
+            raise ConnectionError("Simulated delivery failure.")
+        logger.info("Delivered %s event %s.", message.topic, message.uuid)
+        self.delivered.append(message)
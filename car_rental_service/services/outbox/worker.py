@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import List
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from car_rental_service.db.models.outbox import OutboxEvent
+from car_rental_service.db.unit_of_work import unit_of_work
+from car_rental_service.services.outbox.sink import OutboxMessage, OutboxSink
+from car_rental_service.settings import settings
+
+# Columns to select for building `OutboxMessage` rows.
+OUTBOX_MESSAGE_COLUMNS = [
+    getattr(OutboxEvent, field) for field in OutboxMessage._fields
+]
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds before retrying an event, doubling with every failed attempt.
+
+    :param attempts: failed attempts so far, at least 1.
+    :returns: delay in seconds.
+    """
+    return min(
+        settings.outbox_retry_delay * 2 ** (attempts - 1),
+        settings.outbox_max_retry_delay,
+    )
+
+
+async def claim_batch(session: AsyncSession, batch_size: int) -> List[OutboxMessage]:
+    """
+    Take a batch of due events for `outbox_lease` seconds.
+
+    The events are locked with SKIP LOCKED only for the time of pushing
+    their `available_at` past the lease, so workers running side by side
+    share the outbox without delivering an event twice at once. An event
+    whose worker died before recording the outcome is due again once the
+    lease is over.
+
+    :param session: database session.
+    :param batch_size: most events to take.
+    :returns: the events taken, in no particular order.
+    """
+    due = (
+        select(OutboxEvent.id)
+        .where(
+            OutboxEvent.delivered_at.is_(None),
+            OutboxEvent.available_at <= func.now(),
+            OutboxEvent.attempts < settings.outbox_max_attempts,
+        )
+        .order_by(OutboxEvent.available_at, OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    async with unit_of_work(session):
+        rows = await session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_(due))
+            .values(
+                available_at=func.now() + timedelta(seconds=settings.outbox_lease),
+            )
+            .returning(*OUTBOX_MESSAGE_COLUMNS)
+            .execution_options(synchronize_session=False),
+        )
+        return [OutboxMessage(*row) for row in rows]
+
+
+async def deliver_batch(
+    session: AsyncSession,
+    sink: OutboxSink,
+    batch_size: int,
+) -> int:
+    """
+    Deliver a batch of due events, recording each outcome.
+
+    The events are claimed and their outcomes recorded in two short
+    transactions, no transaction stays open while the sink works. They
+    are delivered concurrently, in no particular order, each within
+    `outbox_delivery_timeout` seconds. An event failing
+    `outbox_max_attempts` times is left undelivered, with its last error.
+
+    :param session: database session, outside of a transaction.
+    :param sink: consumer of the events.
+    :param batch_size: most events to deliver.
+    :returns: number of events taken.
+    """
+    messages = await claim_batch(session, batch_size)
+    if not messages:
+        return 0
+    outcomes = await asyncio.gather(
+        *[
+            asyncio.wait_for(sink.deliver(message), settings.outbox_delivery_timeout)
+            for message in messages
+        ],
+        return_exceptions=True,
+    )
+
+    delivered: List[int] = []
+    async with unit_of_work(session):
+        for message, outcome in zip(messages, outcomes):
+            if not isinstance(outcome, Exception):
+                delivered.append(message.id)
+                continue
+            logger.warning(
+                "Delivery of %s event %s failed: %r",
+                message.topic,
+                message.uuid,
+                outcome,
+            )
+            delay = timedelta(seconds=retry_delay(message.attempts + 1))
+            await session.execute(
+                update(OutboxEvent)
+                .where(
+                    OutboxEvent.id == message.id,
+                    # Delivered by another worker after the lease ran out.
+                    OutboxEvent.delivered_at.is_(None),
+                )
+                .values(
+                    attempts=OutboxEvent.attempts + 1,
+                    available_at=func.now() + delay,
+                    last_error=repr(outcome),
+                ),
+            )
+        if delivered:
+            await session.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(delivered))
+                .values(delivered_at=func.now()),
+            )
+    return len(messages)
+
+
+async def run_worker(
+    session_factory: sessionmaker,
+    sink: OutboxSink,
+) -> None:  # pragma: no cover
+    """
+    Deliver the outbox events forever.
+
+    Batches follow each other while the outbox is backlogged, the
+    worker polls every `outbox_poll_interval` seconds once drained. A
+    failed batch is logged and retried after the poll interval.
+
+    :param session_factory: makes the sessions of the batches.
+    :param sink: consumer of the events.
+    """
+    while True:  # noqa: WPS457
+        try:
+            async with session_factory() as session:
+                taken = await deliver_batch(
+                    session,
+                    sink,
+                    settings.outbox_batch_size,
+                )
+        except Exception:
+            logger.exception("Outbox batch failed.")
+            taken = 0
+        if taken < settings.outbox_batch_size:
+            await asyncio.sleep(settings.outbox_poll_interval)
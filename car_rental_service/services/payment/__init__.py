@@ -0,0 +1 @@
+"""Payment service."""
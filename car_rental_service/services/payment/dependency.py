@@ -0,0 +1,13 @@
+from starlette.requests import Request
+
+from car_rental_service.services.payment.gateway import PaymentGateway
+
+
+def get_payment_gateway(request: Request) -> PaymentGateway:  # pragma: no cover
+    """
+    Returns the payment gateway of the application.
+
+    :param request: current request.
+    :returns: payment gateway.
+    """
+    return request.app.state.payment_gateway
@@ -0,0 +1,113 @@
+import asyncio
+import random
+from abc import ABC, abstractmethod
+from uuid import uuid4
+
+import httpx
+
+from car_rental_service.web.exceptions import PaymentFailed
+
+
+class PaymentGateway(ABC):
+    """Interface of the payment providers used while booking a car."""
+
+    @abstractmethod
+    async def charge(self, user_id: int, reference: str) -> str:
+        """Charge the customer for a reservation.
+
+        Args:
+            user_id (int): Customer being charged
+            reference (str): Identifies what the charge is for
+
+        Raises:
+            PaymentFailed: The payment was declined or timed out
+
+        Returns:
+            str: Transaction id of the charge
+        """
+
+    @abstractmethod
+    async def refund(self, transaction_id: str) -> None:
+        """Refund a previous charge.
+
+        Args:
+            transaction_id (str): Transaction id returned by `charge`
+        """
+
+    async def close(self) -> None:
+        """Release resources held by the gateway."""
+
+
+class SimulatedPaymentGateway(PaymentGateway):
+    """Local stand-in for a payment provider.
+
+    It waits for `latency` seconds without blocking the event loop
+    and declines `failure_rate` of the charges.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        failure_rate: float = 0,
+        timeout: float = 5,
+    ) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.timeout = timeout
+
+    async def charge(self, user_id: int, reference: str) -> str:
+        try:
+            await asyncio.wait_for(asyncio.sleep(self.latency), timeout=self.timeout)
+        except asyncio.TimeoutError as timeout_error:
+            raise PaymentFailed() from timeout_error
+
+        if random.random() < self.failure_rate:  # noqa: S311
+            raise PaymentFailed()
+        return uuid4().hex
+
+    async def refund(self, transaction_id: str) -> None:
+        await asyncio.sleep(self.latency)
+
+
+class HTTPPaymentGateway(PaymentGateway):
+    """Payment provider reached over HTTP.
+
+    All requests share one pooled `httpx.AsyncClient`, so connections
+    to the provider are kept alive between bookings.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 5,
+        max_connections: int = 100,
+    ) -> None:
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def charge(self, user_id: int, reference: str) -> str:
+        try:
+            response = await self.client.post(
+                "/charges",
+                json={"user_id": user_id, "reference": reference},
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as http_error:
+            raise PaymentFailed() from http_error
+        try:
+            return response.json()["id"]
+        except (ValueError, KeyError, TypeError) as malformed_error:
+            raise PaymentFailed() from malformed_error
+
+    async def refund(self, transaction_id: str) -> None:
+        response = await self.client.post(f"/charges/{transaction_id}/refund")
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,36 @@
+from fastapi import FastAPI
+
+from car_rental_service.services.payment.gateway import (
+    HTTPPaymentGateway,
+    SimulatedPaymentGateway,
+)
+from car_rental_service.settings import PaymentGatewayKind, settings
+
+
+def init_payment_gateway(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the configured payment gateway.
+
+    :param app: current fastapi application.
+    """
+    if settings.payment_gateway == PaymentGatewayKind.HTTP:
+        app.state.payment_gateway = HTTPPaymentGateway(
+            base_url=settings.payment_url,
+            timeout=settings.payment_timeout,
+            max_connections=settings.payment_max_connections,
+        )
+    else:
+        app.state.payment_gateway = SimulatedPaymentGateway(
+            latency=settings.payment_latency,
+            failure_rate=settings.payment_failure_rate,
+            timeout=settings.payment_timeout,
+        )
+
+
+async def shutdown_payment_gateway(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Closes the payment gateway.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.payment_gateway.close()
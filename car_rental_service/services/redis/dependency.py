@@ -1,6 +1,7 @@
 from typing import AsyncGenerator
 
-from redis.asyncio import Redis
+from fastapi import Depends
+from redis.asyncio import ConnectionPool, Redis
 from starlette.requests import Request
 
 
@@ -24,3 +25,20 @@ async def get_redis_pool(
     :returns:  redis connection pool.
     """
     return request.app.state.redis_pool
+
+
+async def get_redis(
+    redis_pool: ConnectionPool = Depends(get_redis_pool),
+) -> AsyncGenerator[Redis, None]:
+    """
+    Returns a redis client shared by the whole request.
+
+    The DAOs and the handler of a request reuse one client. It takes a
+    pool connection per command or pipeline only, none is held while
+    the request waits on something else.
+
+    :param redis_pool: redis connection pool.
+    :yields: redis client.
+    """
+    async with Redis(connection_pool=redis_pool) as redis:
+        yield redis
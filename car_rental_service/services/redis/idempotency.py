@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+import ujson
+from redis.asyncio import Redis
+
+from car_rental_service.services.redis.lock import release_lock
+
+# Seconds between two checks of a request still in flight.
+POLL_INTERVAL = 0.05
+
+# Replaces the claim by the response, only if the key still holds the claim.
+COMPLETE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    redis.call("SET", KEYS[1], ARGV[2], "PX", ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def idempotency_key(scope: str, key: str) -> str:
+    """
+    Key holding the outcome of an idempotent request.
+
+    :param scope: operation the client key applies to.
+    :param key: key sent by the client.
+    :returns: redis key.
+    """
+    return f"idempotency:{scope}:{key}"
+
+
+async def claim(
+    redis: Redis,
+    key: str,
+    fingerprint: str,
+    ttl_ms: int,
+) -> Optional[str]:
+    """
+    Mark a request as in flight, unless its key is already known.
+
+    :param redis: redis client.
+    :param key: redis key of the request.
+    :param fingerprint: digest of the request payload.
+    :param ttl_ms: time after which a crashed request frees the key.
+    :returns: claim to complete or abandon the request with, None if
+        the key is already claimed or completed.
+    """
+    pending = ujson.dumps({"fingerprint": fingerprint, "claim": uuid4().hex})
+    if await redis.set(key, pending, nx=True, px=ttl_ms):
+        return pending
+    return None
+
+
+async def complete(
+    redis: Redis,
+    key: str,
+    pending: str,
+    fingerprint: str,
+    response: Dict[str, Any],
+    ttl_ms: int,
+) -> bool:
+    """
+    Store the response of a request, for its retries to replay it.
+
+    Nothing is stored once the claim expired, a retry may have claimed
+    the key since and its outcome is the one kept.
+
+    :param redis: redis client.
+    :param key: redis key of the request.
+    :param pending: claim returned by `claim`.
+    :param fingerprint: digest of the request payload.
+    :param response: status code, headers and body of the response.
+    :param ttl_ms: time the response is kept.
+    :returns: whether the response was stored.
+    """
+    stored = ujson.dumps({"fingerprint": fingerprint, "response": response})
+    store = redis.register_script(COMPLETE_SCRIPT)
+    return bool(await store(keys=[key], args=[pending, stored, ttl_ms]))
+
+
+async def abandon(redis: Redis, key: str, pending: str) -> None:
+    """
+    Free the key of a request whose outcome isn't kept, if still claimed.
+
+    :param redis: redis client.
+    :param key: redis key of the request.
+    :param pending: claim returned by `claim`.
+    """
+    await release_lock(redis, [key], pending)
+
+
+async def wait_for_response(
+    redis: Redis,
+    key: str,
+    fingerprint: str,
+    timeout: float,
+) -> Optional[Dict[str, Any]]:
+    """
+    Wait for a request in flight to store its response.
+
+    A request with another payload doesn't wait, its key is misused.
+
+    :param redis: redis client.
+    :param key: redis key of the request.
+    :param fingerprint: digest of the waiting request's payload.
+    :param timeout: seconds to wait at most.
+    :returns: stored fingerprint and response, only the fingerprint if
+        the request is still in flight at the timeout or has another
+        payload, None if the key was freed meanwhile.
+    """
+    deadline = time.monotonic() + timeout
+    while True:  # noqa: WPS457
+        stored = await redis.get(key)
+        if stored is None:
+            return None
+        entry = ujson.loads(stored)
+        if (
+            "response" in entry
+            or entry["fingerprint"] != fingerprint
+            or time.monotonic() >= deadline
+        ):
+            return entry
+        await asyncio.sleep(POLL_INTERVAL)
@@ -1,6 +1,6 @@
 from fastapi import FastAPI
-from redis.asyncio import ConnectionPool
 
+from car_rental_service.services.redis.pool import create_redis_pool
 from car_rental_service.settings import settings
 
 
@@ -10,9 +10,7 @@ def init_redis(app: FastAPI) -> None:  # pragma: no cover
 
     :param app: current fastapi application.
     """
-    app.state.redis_pool = ConnectionPool.from_url(
-        str(settings.redis_url),
-    )
+    app.state.redis_pool = create_redis_pool(str(settings.redis_url))
 
 
 async def shutdown_redis(app: FastAPI) -> None:  # pragma: no cover
@@ -0,0 +1,145 @@
+from typing import List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+# Takes every key for the owner token, or none of them if one is already held.
+ACQUIRE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call("EXISTS", key) == 1 then
+        return 0
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call("SET", key, ARGV[1], "PX", ARGV[2])
+end
+return 1
+"""
+
+# Takes groups of keys for the owner token, a group is taken whole or not
+# at all. ARGV holds the token, the TTL, "1" to take every group or none,
+# then the number of keys of each group; KEYS holds the groups in order.
+ACQUIRE_GROUPS_SCRIPT = """
+local token, ttl, atomic = ARGV[1], ARGV[2], ARGV[3] == "1"
+
+local function is_free(first, last)
+    for index = first, last do
+        if redis.call("EXISTS", KEYS[index]) == 1 then
+            return false
+        end
+    end
+    return true
+end
+
+local function take(first, last)
+    for index = first, last do
+        redis.call("SET", KEYS[index], token, "PX", ttl)
+    end
+end
+
+local groups = {}
+local first = 1
+for group = 1, #ARGV - 3 do
+    local last = first + tonumber(ARGV[group + 3]) - 1
+    groups[group] = {first, last}
+    first = last + 1
+end
+
+local acquired = {}
+for group, bounds in ipairs(groups) do
+    if is_free(bounds[1], bounds[2]) then
+        acquired[group] = 1
+        if not atomic then
+            take(bounds[1], bounds[2])
+        end
+    elseif atomic then
+        return {}
+    else
+        acquired[group] = 0
+    end
+end
+if atomic then
+    for _, bounds in ipairs(groups) do
+        take(bounds[1], bounds[2])
+    end
+end
+return acquired
+"""
+
+# Deletes only the keys still held by the owner token.
+RELEASE_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call("GET", key) == ARGV[1] then
+        released = released + redis.call("DEL", key)
+    end
+end
+return released
+"""
+
+
+async def acquire_lock(
+    redis: Redis,
+    keys: Sequence[str],
+    ttl_ms: int,
+) -> Optional[str]:
+    """
+    Atomically acquire a lock spanning several keys.
+
+    A single key takes the plain `SET NX PX` path, several keys are
+    taken all-or-nothing by a script. Both cost one round trip.
+
+    :param redis: redis client.
+    :param keys: keys forming the lock.
+    :param ttl_ms: milliseconds after which the lock expires.
+    :returns: owner token needed to release the lock, None if it is held.
+    """
+    token = uuid4().hex
+    if len(keys) == 1:
+        acquired = await redis.set(keys[0], token, nx=True, px=ttl_ms)
+    else:
+        acquire = redis.register_script(ACQUIRE_SCRIPT)
+        acquired = await acquire(keys=keys, args=[token, ttl_ms])
+    return token if acquired else None
+
+
+async def acquire_lock_groups(
+    redis: Redis,
+    groups: Sequence[Sequence[str]],
+    ttl_ms: int,
+    atomic: bool,
+) -> Tuple[str, List[bool]]:
+    """
+    Acquire several multi-key locks in one round trip.
+
+    All groups share one owner token, so the acquired ones can be
+    released together by `release_lock`.
+
+    :param redis: redis client.
+    :param groups: keys of each lock.
+    :param ttl_ms: milliseconds after which the locks expire.
+    :param atomic: acquire every lock or none of them.
+    :returns: owner token and whether each lock was acquired.
+    """
+    token = uuid4().hex
+    acquire = redis.register_script(ACQUIRE_GROUPS_SCRIPT)
+    acquired = await acquire(
+        keys=[key for keys in groups for key in keys],
+        args=[token, ttl_ms, int(atomic), *[len(keys) for keys in groups]],
+    )
+    if not acquired:
+        return token, [False] * len(groups)
+    return token, [bool(flag) for flag in acquired]
+
+
+async def release_lock(redis: Redis, keys: Sequence[str], token: str) -> int:
+    """
+    Release a lock if it is still held by the given owner.
+
+    :param redis: redis client.
+    :param keys: keys forming the lock.
+    :param token: owner token returned by `acquire_lock`.
+    :returns: number of released keys.
+    """
+    release = redis.register_script(RELEASE_SCRIPT)
+    return await release(keys=keys, args=[token])
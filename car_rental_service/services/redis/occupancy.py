@@ -0,0 +1,258 @@
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from car_rental_service.db.models.reservation import ACTIVE_STATUSES, Reservation
+from car_rental_service.services.redis.lock import acquire_lock, release_lock
+from car_rental_service.utils import iter_days
+
+# Set once the bitmaps mirror the reservations table, searches only
+# trust the index while it is present.
+READY_KEY = "occupancy:ready"
+OCCUPANCY_KEY_PATTERN = "occupancy:day:*"
+REBUILD_LOCK_KEY = "occupancy:rebuild"
+REBUILD_LOCK_TTL_MS = 600_000
+REBUILD_BATCH_SIZE = 1000
+# Bitmap changes made while a rebuild runs, replayed on the rebuilt
+# bitmaps. Changes are only journaled while the list exists.
+JOURNAL_KEY = "occupancy:journal"
+JOURNAL_START = "start"
+BUILD_KEY_PATTERN = "occupancy:build:*"
+
+# Puts the rebuilt bitmaps in place of the live ones and replays the
+# journaled changes on them, atomically. KEYS holds the journal, the
+# ready flag, the rebuilt bitmaps, the live bitmaps they replace, then
+# the live bitmaps of days without bookings; ARGV[1] holds the number of
+# rebuilt bitmaps. The replayed changes name their own bitmaps.
+SWAP_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return -1
+end
+local built = tonumber(ARGV[1])
+for index = 3, 2 + built do
+    redis.call("RENAME", KEYS[index], KEYS[index + built])
+end
+for index = 3 + 2 * built, #KEYS do
+    redis.call("DEL", KEYS[index])
+end
+local changes = redis.call("LRANGE", KEYS[1], 1, -1)
+for _, change in ipairs(changes) do
+    local key, car_id, bit = string.match(change, "^(%S+) (%d+) (%d)$")
+    redis.call("SETBIT", key, tonumber(car_id), tonumber(bit))
+end
+redis.call("DEL", KEYS[1])
+redis.call("SET", KEYS[2], 1)
+return #changes
+"""
+
+
+def occupancy_key(day: date) -> str:
+    """
+    Key of the bitmap of a day, bit `car_id` is set when the car is booked.
+
+    :param day: calendar day.
+    :returns: redis key.
+    """
+    return f"occupancy:day:{day.isoformat()}"
+
+
+def build_key(day: date) -> str:
+    """
+    Key of the bitmap of a day while the bitmaps are rebuilt.
+
+    :param day: calendar day.
+    :returns: redis key.
+    """
+    return f"occupancy:build:{day.isoformat()}"
+
+
+def set_bits(bitmap: bytes) -> List[int]:
+    """
+    Offsets of the set bits of a redis bitmap.
+
+    :param bitmap: bitmap as returned by GET, most significant bit first.
+    :returns: offsets in ascending order.
+    """
+    offsets = []
+    for byte_index, byte in enumerate(bitmap):
+        if not byte:
+            continue
+        for bit in range(8):
+            if byte & (0x80 >> bit):
+                offsets.append(byte_index * 8 + bit)
+    return offsets
+
+
+async def mark_occupied(
+    redis: Redis,
+    bookings: Iterable[Tuple[int, date, date]],
+) -> None:
+    """
+    Flag the cars as booked on every day of their interval.
+
+    :param redis: redis client.
+    :param bookings: booked car ids with the first and last day of the booking.
+    """
+    await update_occupancy(redis, booked=bookings)
+
+
+async def update_occupancy(
+    redis: Redis,
+    booked: Iterable[Tuple[int, date, date]] = (),
+    released: Iterable[Tuple[int, date, date]] = (),
+) -> None:
+    """
+    Flag the released days of cars as free and the booked ones as taken.
+
+    Both are applied atomically, released days first, so a booking
+    moved to overlapping dates keeps the days it still covers. Active
+    reservations of a car never share a day, so the days of a released
+    one are free.
+
+    :param redis: redis client.
+    :param booked: booked car ids with the first and last day of the booking.
+    :param released: released car ids with the first and last day of the booking.
+    """
+    async with redis.pipeline(transaction=True) as pipe:
+        queue_occupancy_update(pipe, booked, released)
+        await pipe.execute()
+
+
+def queue_occupancy_update(
+    pipe: Pipeline,
+    booked: Iterable[Tuple[int, date, date]] = (),
+    released: Iterable[Tuple[int, date, date]] = (),
+) -> None:
+    """
+    Queue the commands of `update_occupancy` on a transactional pipeline.
+
+    The changes are journaled too, for a running rebuild to replay them.
+
+    :param pipe: pipeline sending the commands.
+    :param booked: booked car ids with the first and last day of the booking.
+    :param released: released car ids with the first and last day of the booking.
+    """
+    for bookings, bit in ((released, 0), (booked, 1)):
+        for car_id, start_date, end_date in bookings:
+            for day in iter_days(start_date, end_date):
+                pipe.setbit(occupancy_key(day), car_id, bit)
+                pipe.rpushx(JOURNAL_KEY, f"{occupancy_key(day)} {car_id} {bit}")
+
+
+async def mark_occupancy_unready(redis: Redis) -> None:
+    """
+    Make searches use SQL until the next rebuild of the bitmaps.
+
+    :param redis: redis client.
+    """
+    await redis.delete(READY_KEY)
+
+
+async def reserved_car_ids(
+    redis: Redis,
+    start_date: date,
+    end_date: date,
+) -> Optional[List[int]]:
+    """
+    Ids of the cars booked on any day of the interval.
+
+    The day bitmaps are OR-ed server side, so a single bitmap
+    crosses the network whatever the interval length.
+
+    :param redis: redis client.
+    :param start_date: first day of the interval.
+    :param end_date: last day of the interval.
+    :returns: car ids, None while the index is not ready.
+    """
+    keys = [occupancy_key(day) for day in iter_days(start_date, end_date)]
+    destination = f"occupancy:query:{uuid4().hex}"
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.exists(READY_KEY)
+        pipe.bitop("OR", destination, *keys)
+        pipe.get(destination)
+        pipe.delete(destination)
+        is_ready, _, bitmap, _ = await pipe.execute()
+
+    if not is_ready:
+        return None
+    return set_bits(bitmap or b"")
+
+
+async def rebuild_occupancy(redis: Redis, session: AsyncSession) -> Optional[int]:
+    """
+    Rebuild the day bitmaps from the reservations table.
+
+    Searches fall back to SQL while the rebuild runs. Only one rebuild
+    runs at a time across all workers. The bitmaps are built aside from
+    a snapshot of the table. Bookings and releases keep updating the
+    live bitmaps meanwhile and are journaled, the journal is replayed
+    on the rebuilt bitmaps when they replace the live ones.
+
+    :param redis: redis client.
+    :param session: database session.
+    :raises RuntimeError: the journal expired before the rebuild ended.
+    :returns: number of indexed reservations, None if another rebuild runs.
+    """
+    lock_token = await acquire_lock(redis, [REBUILD_LOCK_KEY], REBUILD_LOCK_TTL_MS)
+    if lock_token is None:
+        return None
+
+    try:
+        # Journaling starts before the snapshot is taken, so no change
+        # is missed by both.
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(READY_KEY, JOURNAL_KEY)
+            pipe.rpush(JOURNAL_KEY, JOURNAL_START)
+            pipe.pexpire(JOURNAL_KEY, REBUILD_LOCK_TTL_MS)
+            await pipe.execute()
+        leftover_keys = [key async for key in redis.scan_iter(match=BUILD_KEY_PATTERN)]
+        if leftover_keys:
+            await redis.delete(*leftover_keys)
+
+        indexed = 0
+        days = set()
+        rows = await session.stream(
+            select(
+                Reservation.car_id,
+                Reservation.start_date,
+                Reservation.end_date,
+            ).where(Reservation.status.in_(ACTIVE_STATUSES)),
+        )
+        async for partition in rows.partitions(REBUILD_BATCH_SIZE):
+            async with redis.pipeline(transaction=False) as pipe:
+                for car_id, start_date, end_date in partition:
+                    for day in iter_days(start_date, end_date):
+                        pipe.setbit(build_key(day), car_id, 1)
+                        days.add(day)
+                await pipe.execute()
+            indexed += len(partition)
+
+        built = sorted(days)
+        live_keys = {occupancy_key(day) for day in built}
+        stale_keys = [
+            key
+            async for key in redis.scan_iter(match=OCCUPANCY_KEY_PATTERN)
+            if key.decode() not in live_keys
+        ]
+        swap = redis.register_script(SWAP_SCRIPT)
+        replayed = await swap(
+            keys=[
+                JOURNAL_KEY,
+                READY_KEY,
+                *[build_key(day) for day in built],
+                *[occupancy_key(day) for day in built],
+                *stale_keys,
+            ],
+            args=[len(built)],
+        )
+        if replayed < 0:
+            raise RuntimeError("The occupancy journal expired during the rebuild.")
+    finally:
+        await redis.delete(JOURNAL_KEY)
+        await release_lock(redis, [REBUILD_LOCK_KEY], lock_token)
+    return indexed
@@ -0,0 +1,93 @@
+from typing import Any, Set
+
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio.connection import Connection
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from car_rental_service.services.metrics.metrics import REDIS_POOL_EXHAUSTED_TOTAL
+from car_rental_service.settings import settings
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """
+    Bounded pool counting the commands which wait for a free connection.
+
+    Commands wait up to `timeout` seconds when every connection is in
+    use, instead of failing at once like the default pool.
+    """
+
+    def reset(self) -> None:
+        """Forget every connection, as the parent pool does."""
+        super().reset()
+        self._handed_out: Set[Connection] = set()
+
+    async def get_connection(
+        self,
+        command_name: str,
+        *keys: Any,
+        **options: Any,
+    ) -> Connection:
+        """
+        Take a connection, waiting for one when the pool is exhausted.
+
+        :param command_name: command the connection is taken for.
+        :param keys: keys of the command.
+        :param options: options of the command.
+        :raises RedisConnectionError: no connection was freed in time.
+        :returns: connected connection.
+        """
+        exhausted = self.pool.empty()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except RedisConnectionError:
+            if exhausted:
+                REDIS_POOL_EXHAUSTED_TOTAL.labels("timed_out").inc()
+            raise
+        if exhausted:
+            REDIS_POOL_EXHAUSTED_TOTAL.labels("waited").inc()
+        self._handed_out.add(connection)
+        return connection
+
+    async def release(self, connection: Connection) -> None:
+        """
+        Give a connection back to the pool.
+
+        :param connection: connection taken by `get_connection`.
+        """
+        self._handed_out.discard(connection)
+        await super().release(connection)
+
+    def in_use(self) -> int:
+        """
+        Count the connections taken by commands.
+
+        :returns: number of connections.
+        """
+        return len(self._handed_out)
+
+    def idle(self) -> int:
+        """
+        Count the connections created and waiting in the pool.
+
+        :returns: number of connections.
+        """
+        return len(self._connections) - len(self._handed_out)
+
+
+def create_redis_pool(url: str, **connection_kwargs: Any) -> InstrumentedConnectionPool:
+    """
+    Create a pool with the configured size and timeouts.
+
+    :param url: redis URL.
+    :param connection_kwargs: more connection options.
+    :returns: connection pool.
+    """
+    return InstrumentedConnectionPool.from_url(
+        url,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_connect_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+        **connection_kwargs,
+    )
@@ -0,0 +1,144 @@
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+import ujson
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from car_rental_service.settings import settings
+from car_rental_service.utils import iter_days
+
+# Shortest lifetime of a day version, whatever the cached searches'.
+MIN_DAY_VERSION_TTL_MS = 86_400_000
+
+
+def day_version_ttl_ms(entry_ttl_ms: int) -> int:
+    """
+    Lifetime of the day versions, at least twice the cached searches'.
+
+    An expired version reads as 0 again and may climb back to the
+    version an old entry was stamped with, so versions must outlive
+    every entry stamped with them.
+
+    :param entry_ttl_ms: lifetime of the cached searches.
+    :returns: milliseconds.
+    """
+    return max(MIN_DAY_VERSION_TTL_MS, 2 * entry_ttl_ms)
+
+
+def search_key(start_date: date, end_date: date) -> str:
+    """
+    Key of the cached reserved cars of a search window.
+
+    :param start_date: first day of the window.
+    :param end_date: last day of the window.
+    :returns: redis key.
+    """
+    return f"search:reserved:{start_date.isoformat()}:{end_date.isoformat()}"
+
+
+def day_version_key(day: date) -> str:
+    """
+    Key of the counter bumped by every booking of the day.
+
+    :param day: calendar day.
+    :returns: redis key.
+    """
+    return f"search:version:{day.isoformat()}"
+
+
+async def get_reserved_cars(
+    redis: Redis,
+    start_date: date,
+    end_date: date,
+) -> Tuple[Optional[List[int]], List[int]]:
+    """
+    Cached reserved cars of a window, along with the window's day versions.
+
+    An entry is only valid while no booking touched its window since it
+    was stored, that is while the versions it was stored with still
+    match. Both are read in one round trip.
+
+    :param redis: redis client.
+    :param start_date: first day of the window.
+    :param end_date: last day of the window.
+    :returns: car ids, None when missing or stale, and the versions to
+        store a fresh entry with.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.get(search_key(start_date, end_date))
+        pipe.mget([day_version_key(day) for day in iter_days(start_date, end_date)])
+        entry, raw_versions = await pipe.execute()
+    versions = [int(version or 0) for version in raw_versions]
+    if entry is None:
+        return None, versions
+    cached = ujson.loads(entry)
+    if cached["versions"] != versions:
+        return None, versions
+    return cached["car_ids"], versions
+
+
+async def store_reserved_cars(
+    redis: Redis,
+    start_date: date,
+    end_date: date,
+    versions: List[int],
+    car_ids: Iterable[int],
+    ttl_ms: int,
+) -> None:
+    """
+    Cache the reserved cars of a window.
+
+    The versions of its days are kept alive for longer than the entry,
+    even when they were about to expire.
+
+    :param redis: redis client.
+    :param start_date: first day of the window.
+    :param end_date: last day of the window.
+    :param versions: day versions read before querying the cars.
+    :param car_ids: ids of the reserved cars.
+    :param ttl_ms: lifetime of the entry.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.set(
+            search_key(start_date, end_date),
+            ujson.dumps({"versions": versions, "car_ids": list(car_ids)}),
+            px=ttl_ms,
+        )
+        for day, version in zip(iter_days(start_date, end_date), versions):
+            if version:
+                pipe.pexpire(day_version_key(day), day_version_ttl_ms(ttl_ms))
+        await pipe.execute()
+
+
+async def invalidate_reserved_cars(
+    redis: Redis,
+    bookings: Iterable[Tuple[date, date]],
+) -> None:
+    """
+    Invalidate every cached window sharing a day with the bookings.
+
+    :param redis: redis client.
+    :param bookings: first and last day of each booking.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        queue_invalidation(pipe, bookings)
+        await pipe.execute()
+
+
+def queue_invalidation(pipe: Pipeline, bookings: Iterable[Tuple[date, date]]) -> None:
+    """
+    Queue the commands of `invalidate_reserved_cars` on a pipeline.
+
+    :param pipe: pipeline sending the commands.
+    :param bookings: first and last day of each booking.
+    """
+    days = {
+        day
+        for start_date, end_date in bookings
+        for day in iter_days(start_date, end_date)
+    }
+    version_ttl_ms = day_version_ttl_ms(settings.search_cache_ttl_ms)
+    for day in sorted(days):
+        pipe.incr(day_version_key(day))
+        pipe.pexpire(day_version_key(day), version_ttl_ms)
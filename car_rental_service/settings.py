@@ -1,7 +1,7 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseSettings
 from yarl import URL
@@ -20,6 +20,13 @@ class LogLevel(str, enum.Enum):  # noqa: WPS600
     FATAL = "FATAL"
 
 
+class PaymentGatewayKind(str, enum.Enum):  # noqa: WPS600
+    """Available payment gateways."""
+
+    SIMULATED = "SIMULATED"
+    HTTP = "HTTP"
+
+
 class Settings(BaseSettings):
     """
     Application settings.
@@ -39,6 +46,8 @@ class Settings(BaseSettings):
     environment: str = "dev"
 
     log_level: LogLevel = LogLevel.INFO
+    # Encode large list responses straight from rows, skipping pydantic
+    raw_json_responses: bool = True
 
     # Variables for the database
     db_host: str = "localhost"
@@ -47,6 +56,34 @@ class Settings(BaseSettings):
     db_pass: str = "car_rental_service"
     db_base: str = "car_rental_service"
     db_echo: bool = False
+    # connections all workers may open together, split between the workers
+    # when db_pool_size is not set
+    db_max_connections: int = 60
+    # connections kept open by each worker, up to db_max_overflow more are
+    # opened under load
+    db_pool_size: Optional[int] = None
+    db_max_overflow: int = 5
+    # seconds a request waits for a free connection
+    db_pool_timeout: float = 30
+    # check connections on checkout, costs a round trip per checkout
+    db_pool_pre_ping: bool = False
+    # seconds after which a connection is replaced, -1 keeps them forever
+    db_pool_recycle: int = 1800
+    # prepared statements cached by each connection, 0 disables the cache
+    db_statement_cache_size: int = 100
+    # seconds before a query is given up
+    db_command_timeout: Optional[float] = 60
+    # connections opened and warmed up by each worker at startup
+    db_warmup_connections: int = 2
+
+    # URLs of read replicas, searches and listings are read from them
+    db_replica_urls: List[str] = []
+    # seconds of replication lag above which a replica is not read
+    db_replica_max_lag: float = 5
+    # seconds between two replication lag checks
+    db_replica_check_interval: float = 1
+    # seconds a lag check may take before the replica counts as unreachable
+    db_replica_check_timeout: float = 1
 
     # Variables for Redis
     redis_host: str = "car_rental_service-redis"
@@ -54,6 +91,87 @@ class Settings(BaseSettings):
     redis_user: Optional[str] = None
     redis_pass: Optional[str] = None
     redis_base: Optional[int] = None
+    # connections each worker may open, commands wait when all are in use
+    redis_max_connections: int = 50
+    # seconds a command waits for a free connection
+    redis_pool_timeout: float = 5
+    # seconds before a command, or opening a connection, is given up
+    redis_socket_timeout: Optional[float] = 5
+    redis_socket_connect_timeout: Optional[float] = 2
+    # seconds a connection may stay idle before it is checked with a PING
+    redis_health_check_interval: int = 30
+    # Answer availability searches from per-day occupancy bitmaps in Redis
+    occupancy_index: bool = False
+    # bearer token the admin endpoints require, they refuse every request
+    # when it is not set
+    admin_token: Optional[str] = None
+
+    # Serve searched cars from an in-process copy of the fleet
+    car_catalog: bool = True
+    # Identical concurrent searches of a worker share one lookup
+    search_single_flight: bool = True
+    # milliseconds the reserved cars of a search window stay cached in
+    # Redis for every worker, bookings invalidate them; 0 disables it
+    search_cache_ttl_ms: int = 0
+
+    # milliseconds a car stays locked for a customer who is paying for it
+    reservation_lock_ttl_ms: int = 300_000
+    # seconds a held car waits for its payment before the hold expires
+    reservation_hold_ttl: float = 600
+    # seconds between two sweeps of the expired holds
+    reservation_hold_sweep_interval: float = 10
+    # most expired holds released by one sweep transaction
+    reservation_hold_sweep_batch_size: int = 500
+    # most reservations accepted by one bulk request
+    bulk_reservation_max_items: int = 100
+    # milliseconds a response to a request with an Idempotency-Key is
+    # replayed to its retries
+    idempotency_ttl_ms: int = 86_400_000
+    # milliseconds retries wait for the original request still in flight
+    idempotency_pending_ttl_ms: int = 30_000
+
+    # Variables for the payment gateway
+    payment_gateway: PaymentGatewayKind = PaymentGatewayKind.SIMULATED
+    payment_url: str = "http://localhost:8080"
+    # seconds before a pending payment is given up
+    payment_timeout: float = 5
+    # pool size of the HTTP gateway
+    payment_max_connections: int = 100
+    # behaviour of the simulated gateway
+    payment_latency: float = 0.3
+    payment_failure_rate: float = 0
+
+    # Variables for the outbox worker
+    # most events delivered by one batch
+    outbox_batch_size: int = 100
+    # seconds between two polls of a drained outbox
+    outbox_poll_interval: float = 1
+    # failed deliveries after which an event is given up
+    outbox_max_attempts: int = 10
+    # seconds before the first retry, doubled by every further failure
+    outbox_retry_delay: float = 1
+    # longest wait between two retries, in seconds
+    outbox_max_retry_delay: float = 300
+    # seconds the events taken by a worker are hidden from the others,
+    # they are taken again afterwards if the worker died meanwhile
+    outbox_lease: float = 60
+    # seconds before a delivery counts as failed, kept below the lease
+    outbox_delivery_timeout: float = 30
+
+    # seconds between two event loop lag measures
+    metrics_loop_lag_interval: float = 0.5
+
+    @property
+    def db_worker_pool_size(self) -> int:
+        """
+        Connections kept open by each worker.
+
+        :return: pool size of a worker.
+        """
+        if self.db_pool_size is not None:
+            return self.db_pool_size
+        worker_connections = self.db_max_connections // self.workers_count
+        return max(worker_connections - self.db_max_overflow, 1)
 
     @property
     def db_url(self) -> URL:
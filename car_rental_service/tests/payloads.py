@@ -1,4 +1,5 @@
 from car_rental_service.web.api.reservation.schema import (
+    BulkReservationInputDTO,
     ReservationInputDTO,
 )
 
@@ -9,3 +10,22 @@ CREATE_RESERVATION_PAYLOAD = ReservationInputDTO(
     start_date="2022-08-10",
     end_date="2022-08-15",
 )
+
+OVERLAPPING_RESERVATION_PAYLOAD = ReservationInputDTO(
+    car_id=1,
+    user_id=2,
+    start_date="2022-08-14",
+    end_date="2022-08-20",
+)
+
+FLEET_RESERVATION_PAYLOAD = BulkReservationInputDTO(
+    reservations=[
+        ReservationInputDTO(
+            car_id=car_id,
+            user_id=3,
+            start_date="2022-09-05",
+            end_date="2022-09-11",
+        )
+        for car_id in (1, 2, 3)
+    ],
+)
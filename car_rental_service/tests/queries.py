@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Transaction control statements, which don't count as queries.
+SAVEPOINT_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+@contextmanager
+def assert_query_count(session: AsyncSession, expected: int) -> Iterator[List[str]]:
+    """
+    Assert the number of SQL queries run by the session's engine in the block.
+
+    Catches N+1 loads, whose count grows with the rows, and relationships
+    loaded by queries nobody asked for.
+
+    :param session: session whose engine is watched.
+    :param expected: number of queries the block must run.
+    :yields: statements run so far.
+    """
+    engine = session.bind.sync_engine
+    statements: List[str] = []
+
+    def record(  # noqa: WPS211, WPS430
+        connection: Any,
+        cursor: Any,
+        statement: str,
+        *args: Any,
+    ) -> None:
+        if not statement.startswith(SAVEPOINT_STATEMENTS):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert len(statements) == expected, "{0} queries instead of {1}:\n{2}".format(
+        len(statements),
+        expected,
+        "\n".join(statements),
+    )
@@ -0,0 +1,31 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime
+
+from car_rental_service.generate import RESERVATION_COLUMNS, reservation_rows
+
+
+def test_generated_reservations_never_overlap_per_car() -> None:
+    first_day, last_day = date(2022, 1, 1), date(2022, 12, 31)
+    rows = [
+        dict(zip(RESERVATION_COLUMNS, row))
+        for row in reservation_rows(
+            car_ids=[1, 2, 3],
+            user_ids=[1, 2],
+            count=200,
+            first_day=first_day,
+            last_day=last_day,
+            rng=random.Random(0),
+            now=datetime(2022, 6, 1),
+        )
+    ]
+
+    assert len(rows) == 200
+    trips = defaultdict(list)
+    for row in rows:
+        assert first_day <= row["start_date"] <= row["end_date"] <= last_day
+        assert row["created_at"] <= datetime(2022, 6, 1)
+        trips[row["car_id"]].append((row["start_date"], row["end_date"]))
+    for car_trips in trips.values():
+        for previous, following in zip(car_trips, car_trips[1:]):
+            assert previous[1] < following[0]
@@ -0,0 +1,68 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from redis.asyncio import ConnectionPool
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from car_rental_service.__main__ import share_metrics_dir
+from car_rental_service.services.metrics.metrics import MULTIPROC_DIR_ENV
+from car_rental_service.settings import settings
+from car_rental_service.tests.payloads import CREATE_RESERVATION_PAYLOAD
+
+
+@pytest.mark.anyio
+async def test_metrics(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    await client.post(
+        fastapi_app.url_path_for("create_reservation"),
+        data=CREATE_RESERVATION_PAYLOAD.json(),
+    )
+    response = await client.get(fastapi_app.url_path_for("metrics"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert (
+        'http_request_duration_seconds_count{method="POST",'
+        'route="/api/reservations/",status="204"}'
+    ) in response.text
+    assert (
+        'dao_stage_duration_seconds_count{operation="create_reservation",'
+        'stage="payment"}'
+    ) in response.text
+
+
+@pytest.mark.anyio
+async def test_metrics_merge_every_worker(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "workers_count", 2)
+    monkeypatch.setenv(MULTIPROC_DIR_ENV, str(tmp_path))
+    stale_file = tmp_path / "counter_0.db"
+    stale_file.touch()
+    share_metrics_dir()
+    assert not stale_file.exists()
+
+    worker = (
+        "from car_rental_service.services.metrics.metrics import "
+        "HTTP_REQUEST_SECONDS\n"
+        "HTTP_REQUEST_SECONDS.labels('GET', '/worker', '200').observe(0.01)\n"
+    )
+    subprocess.run([sys.executable, "-c", worker], check=True)
+    response = await client.get(fastapi_app.url_path_for("metrics"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/worker",status="200"} 1.0'
+    ) in response.text
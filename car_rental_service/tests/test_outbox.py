@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from redis.asyncio import Redis
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from car_rental_service.db.dao.reservation_dao import ReservationDAO
+from car_rental_service.db.models.outbox import OutboxEvent
+from car_rental_service.schema import OutboxTopic
+from car_rental_service.services.outbox import worker
+from car_rental_service.services.outbox.sink import (
+    LocalOutboxSink,
+    OutboxMessage,
+    OutboxSink,
+)
+from car_rental_service.services.outbox.worker import claim_batch, deliver_batch
+from car_rental_service.services.payment.gateway import PaymentGateway
+from car_rental_service.settings import settings
+from car_rental_service.tests.payloads import CREATE_RESERVATION_PAYLOAD
+
+
+@pytest.mark.anyio
+async def test_booking_event_is_delivered_once(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    reservation = await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+    sink = LocalOutboxSink()
+
+    assert await deliver_batch(dbsession, sink, batch_size=10) == 1
+    assert await deliver_batch(dbsession, sink, batch_size=10) == 0
+
+    [message] = sink.delivered
+    assert message.topic == OutboxTopic.reservation_created.value
+    assert message.payload["reservation_id"] == reservation.id
+    assert message.payload["start_date"] == "2022-08-10"
+    event = await dbsession.get(OutboxEvent, message.id, populate_existing=True)
+    assert event.delivered_at is not None
+
+
+@pytest.mark.anyio
+async def test_failed_delivery_is_retried_later(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+    sink = LocalOutboxSink(failure_rate=1)
+
+    assert await deliver_batch(dbsession, sink, batch_size=10) == 1
+    # Not due again until its retry delay is over.
+    assert await deliver_batch(dbsession, sink, batch_size=10) == 0
+
+    event = (
+        await dbsession.execute(
+            select(OutboxEvent).execution_options(populate_existing=True)
+        )
+    ).scalar_one()
+    assert event.attempts == 1
+    assert event.delivered_at is None
+    assert event.available_at > event.created_at
+    assert "Simulated delivery failure" in event.last_error
+    assert not sink.delivered
+
+
+@pytest.mark.anyio
+async def test_delivery_holds_no_transaction(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+    in_transaction = []
+
+    class TransactionCheckingSink(LocalOutboxSink):
+        async def deliver(self, message: OutboxMessage) -> None:
+            in_transaction.append(dbsession.in_transaction())
+            await super().deliver(message)
+
+    assert await deliver_batch(dbsession, TransactionCheckingSink(), 10) == 1
+    assert in_transaction == [False]
+
+
+@pytest.mark.anyio
+async def test_claimed_events_are_leased(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+
+    assert len(await claim_batch(dbsession, batch_size=10)) == 1
+    # Taken by the first claim until its lease is over.
+    assert await claim_batch(dbsession, batch_size=10) == []
+
+    # An expired lease, as left by a worker dying during the delivery.
+    await dbsession.execute(
+        update(OutboxEvent).values(available_at=OutboxEvent.created_at),
+    )
+    [message] = await claim_batch(dbsession, batch_size=10)
+    assert message.attempts == 0
+
+
+@pytest.mark.anyio
+async def test_worker_survives_failed_batches(
+    dbsession: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    batches = []
+
+    async def failing_batch(
+        session: AsyncSession,
+        sink: OutboxSink,
+        batch_size: int,
+    ) -> int:
+        batches.append(batch_size)
+        if len(batches) == 1:
+            raise asyncio.TimeoutError()
+        return 0
+
+    async def delivered(count: int) -> None:
+        while len(batches) < count:
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(worker, "deliver_batch", failing_batch)
+    monkeypatch.setattr(settings, "outbox_poll_interval", 0.01)
+    running = asyncio.create_task(
+        worker.run_worker(lambda: dbsession, LocalOutboxSink()),
+    )
+    try:
+        await asyncio.wait_for(delivered(2), timeout=1)
+        assert not running.done()
+    finally:
+        running.cancel()
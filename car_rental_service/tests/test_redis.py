@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeConnection
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from car_rental_service.services.redis.pool import InstrumentedConnectionPool
+
+
+def exhausted(outcome: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "redis_pool_exhausted_total",
+            {"outcome": outcome},
+        )
+        or 0
+    )
+
+
+@pytest.mark.anyio
+async def test_exhausted_redis_pool_is_reported() -> None:
+    pool = InstrumentedConnectionPool(
+        max_connections=1,
+        timeout=0.05,
+        connection_class=FakeConnection,
+        server=FakeServer(),
+    )
+    timed_out, waited = exhausted("timed_out"), exhausted("waited")
+    connection = await pool.get_connection("GET")
+    assert (pool.in_use(), pool.idle()) == (1, 0)
+
+    with pytest.raises(RedisConnectionError):
+        await pool.get_connection("GET")
+    assert exhausted("timed_out") == timed_out + 1
+
+    async def release_soon() -> None:  # noqa: WPS430
+        await asyncio.sleep(0.01)
+        await pool.release(connection)
+
+    releasing = asyncio.create_task(release_soon())
+    assert await pool.get_connection("GET") is connection
+    await releasing
+    assert exhausted("waited") == waited + 1
+    assert (pool.in_use(), pool.idle()) == (1, 0)
+    await pool.release(connection)
+    assert (pool.in_use(), pool.idle()) == (0, 1)
+    await pool.disconnect()
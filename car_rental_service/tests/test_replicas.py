@@ -0,0 +1,147 @@
+import asyncio
+import math
+
+import pytest
+from httpx import AsyncClient
+from redis.asyncio import ConnectionPool, Redis
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from car_rental_service.db.dao.car_dao import CarDAO
+from car_rental_service.db.dao.reservation_dao import ReservationDAO
+from car_rental_service.db.dependencies import get_db_session
+from car_rental_service.db.replicas import LAST_WRITE_COOKIE, ReplicaSet
+from car_rental_service.services.catalog.catalog import CarCatalog
+from car_rental_service.services.catalog.dependency import get_car_catalog
+from car_rental_service.services.payment.dependency import get_payment_gateway
+from car_rental_service.services.payment.gateway import PaymentGateway
+from car_rental_service.services.redis import search_cache
+from car_rental_service.services.redis.dependency import get_redis_pool
+from car_rental_service.settings import settings
+from car_rental_service.tests.payloads import CREATE_RESERVATION_PAYLOAD
+from car_rental_service.web.api.reservation.schema import ReservationInputDTO
+from car_rental_service.web.application import get_app
+
+
+@pytest.mark.anyio
+async def test_replicas_are_picked_round_robin_within_the_lag_guard(
+    _engine: AsyncEngine,
+) -> None:
+    unreachable = create_async_engine(
+        "postgresql+asyncpg://car_rental_service@localhost:1/car_rental_service",
+    )
+    replicas = ReplicaSet([_engine, unreachable, _engine], max_lag=5)
+    assert replicas.session_factory() is None
+
+    await replicas.check_lags()
+
+    assert replicas.lags[1] == math.inf
+    picked = [replicas.session_factory() for _ in range(4)]
+    assert picked == [replicas.session_factories[index] for index in (0, 2, 0, 2)]
+    await unreachable.dispose()
+
+
+@pytest.mark.anyio
+async def test_hanging_replica_is_skipped(
+    _engine: AsyncEngine,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "db_replica_check_timeout", 0.1)
+
+    async def never_answer(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        await reader.read()
+
+    server = await asyncio.start_server(never_answer, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    hanging = create_async_engine(
+        f"postgresql+asyncpg://car_rental_service@127.0.0.1:{port}/db",
+    )
+    replicas = ReplicaSet([_engine, hanging], max_lag=5)
+    replicas.lags = [0, 0]
+
+    await replicas.check_lags()
+
+    assert replicas.lags == [0, math.inf]
+    server.close()
+    await hanging.dispose()
+
+
+@pytest.mark.anyio
+async def test_client_reads_its_own_writes(
+    _engine: AsyncEngine,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+    payment_gateway: PaymentGateway,
+    car_catalog: CarCatalog,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "db_replica_urls", ["replica"])
+    application = get_app()
+    application.dependency_overrides[get_db_session] = lambda: dbsession
+    application.dependency_overrides[get_redis_pool] = lambda: fake_redis_pool
+    application.dependency_overrides[get_payment_gateway] = lambda: payment_gateway
+    application.dependency_overrides[get_car_catalog] = lambda: car_catalog
+    # The replica doesn't see the test transaction, as if it lagged behind.
+    application.state.db_replicas = ReplicaSet([_engine], max_lag=5)
+    await application.state.db_replicas.check_lags()
+    url = application.url_path_for("get_reservations")
+
+    async with AsyncClient(app=application, base_url="http://test.local") as client:
+        response = await client.get(url)
+        assert response.json() == []
+
+        response = await client.post(
+            application.url_path_for("create_reservation"),
+            data=CREATE_RESERVATION_PAYLOAD.json(),
+        )
+        assert LAST_WRITE_COOKIE in response.cookies
+
+        response = await client.get(url)
+        assert len(response.json()) == 3
+
+
+@pytest.mark.anyio
+async def test_replica_reads_are_not_shared_with_primary_reads(
+    _engine: AsyncEngine,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+    car_catalog: CarCatalog,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "search_single_flight", True)
+    await car_catalog.load(dbsession)
+    booking = ReservationInputDTO(
+        car_id=2,
+        user_id=1,
+        start_date="2022-09-20",
+        end_date="2022-09-22",
+    )
+    window = (booking.start_date, booking.end_date)
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(booking)
+
+    # The replica doesn't see the test transaction, as if it lagged behind.
+    async with AsyncSession(_engine) as replica_session:
+        replica_dao = CarDAO(
+            replica_session,
+            fake_redis,
+            car_catalog,
+            primary_session=dbsession,
+        )
+        primary_dao = CarDAO(dbsession, fake_redis, car_catalog, dbsession)
+        assert 2 not in await replica_dao.get_reserved_cars(*window)
+
+        on_replica, on_primary = await asyncio.gather(
+            replica_dao.get_available_cars(*map(str, window)),
+            primary_dao.get_available_cars(*map(str, window)),
+        )
+        assert 2 in {car.id for car in on_replica}
+        assert 2 not in {car.id for car in on_primary}
+
+        monkeypatch.setattr(settings, "search_cache_ttl_ms", 60_000)
+        assert 2 in await replica_dao.get_cached_reserved_cars(*window)
+    cached, _ = await search_cache.get_reserved_cars(fake_redis, *window)
+    assert 2 in cached
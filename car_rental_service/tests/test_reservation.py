@@ -1,12 +1,49 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import date, timedelta
+from typing import Any, Set
+
+import httpx
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession
-from redis.asyncio import ConnectionPool
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import selectinload
+from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError
 from starlette import status
+from starlette.responses import Response
 
 from car_rental_service.db.dao.reservation_dao import ReservationDAO
-from car_rental_service.tests.payloads import CREATE_RESERVATION_PAYLOAD
+from car_rental_service.db.models.reservation import Reservation
+from car_rental_service.db.models.user import User
+from car_rental_service.schema import ReservationStatus
+from car_rental_service.services.payment.dependency import get_payment_gateway
+from car_rental_service.services.payment.gateway import (
+    HTTPPaymentGateway,
+    PaymentGateway,
+    SimulatedPaymentGateway,
+)
+from car_rental_service.services.redis.occupancy import READY_KEY
+from car_rental_service.settings import settings
+from car_rental_service.tests.payloads import (
+    CREATE_RESERVATION_PAYLOAD,
+    FLEET_RESERVATION_PAYLOAD,
+    OVERLAPPING_RESERVATION_PAYLOAD,
+)
+from car_rental_service.tests.queries import assert_query_count
+from car_rental_service.web.exceptions import (
+    CarIsLockedForReservation,
+    PaymentFailed,
+    ReservationAlreadyExist,
+)
+from car_rental_service.web.idempotency import run_idempotently
+from car_rental_service.web.lifetime import _sweep_expired_holds
 
 
 @pytest.mark.anyio
@@ -36,13 +73,49 @@ async def test_create_reservations(
 
 
 @pytest.mark.anyio
-async def test_get_reservations(
+async def test_reversed_dates_are_rejected(
     fastapi_app: FastAPI,
     client: AsyncClient,
     dbsession: AsyncSession,
     fake_redis_pool: ConnectionPool,
 ) -> None:
-    dao = ReservationDAO(dbsession, fake_redis_pool)
+    reversed_dates = {"start_date": "2022-08-15", "end_date": "2022-08-10"}
+    payload = {"car_id": 1, "user_id": 1, **reversed_dates}
+
+    response = await client.post(
+        fastapi_app.url_path_for("create_reservation"),
+        json=payload,
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await client.post(
+        fastapi_app.url_path_for("create_reservations"),
+        json={"reservations": [payload]},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await client.patch(
+        fastapi_app.url_path_for("change_reservation", reservation_id="1"),
+        json=reversed_dates,
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await client.post(
+        fastapi_app.url_path_for("create_reservation"),
+        json={**payload, "end_date": "2022-08-15", "start_date": "2022-08-15"},
+    )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+@pytest.mark.anyio
+async def test_get_reservations(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
     await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
     url = fastapi_app.url_path_for("get_reservations")
     response = await client.get(url)
@@ -50,3 +123,607 @@ async def test_get_reservations(
 
     assert response.status_code == status.HTTP_200_OK
     assert len(reservations) >= 1
+
+
+@pytest.mark.anyio
+async def test_overlapping_reservation_is_rejected(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+
+    with pytest.raises(ReservationAlreadyExist):
+        await dao.create_reservation(OVERLAPPING_RESERVATION_PAYLOAD)
+
+
+@pytest.mark.anyio
+async def test_declined_payment_creates_no_reservation(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+) -> None:
+    dao = ReservationDAO(
+        dbsession,
+        fake_redis,
+        SimulatedPaymentGateway(latency=0, failure_rate=1),
+    )
+    with pytest.raises(PaymentFailed):
+        await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+
+    url = fastapi_app.url_path_for("search")
+    response = await client.get(
+        url,
+        params={"start_date": "2022-08-10", "end_date": "2022-08-15"},
+    )
+    assert 1 in {car["id"] for car in response.json()}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("body", [b"<html>Bad gateway</html>", b"{}", b"[]"])
+async def test_malformed_charge_response_fails_the_payment(body: bytes) -> None:
+    gateway = HTTPPaymentGateway("http://payments")
+    gateway.client = httpx.AsyncClient(
+        base_url="http://payments",
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=body)
+        ),
+    )
+    try:
+        with pytest.raises(PaymentFailed):
+            await gateway.charge(1, "reference")
+    finally:
+        await gateway.close()
+
+
+class FailingRefundPaymentGateway(SimulatedPaymentGateway):
+    async def refund(self, transaction_id: str) -> None:
+        raise httpx.ConnectError("Payment provider unreachable.")
+
+
+@pytest.mark.anyio
+async def test_failed_refund_keeps_the_booking_error(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    dao = ReservationDAO(
+        dbsession,
+        fake_redis,
+        FailingRefundPaymentGateway(latency=0),
+    )
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+
+    with pytest.raises(ReservationAlreadyExist):
+        await dao.create_reservation(OVERLAPPING_RESERVATION_PAYLOAD)
+    assert "the customer is still charged" in caplog.text
+
+
+@pytest.mark.anyio
+async def test_locked_days_block_overlapping_reservation(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    lock_token = await dao.lock_car_selection(
+        CREATE_RESERVATION_PAYLOAD.car_id,
+        CREATE_RESERVATION_PAYLOAD.start_date,
+        CREATE_RESERVATION_PAYLOAD.end_date,
+    )
+    assert lock_token is not None
+
+    with pytest.raises(CarIsLockedForReservation):
+        await dao.create_reservation(OVERLAPPING_RESERVATION_PAYLOAD)
+
+    await dao.release_car_selection_lock(
+        CREATE_RESERVATION_PAYLOAD.car_id,
+        CREATE_RESERVATION_PAYLOAD.start_date,
+        CREATE_RESERVATION_PAYLOAD.end_date,
+        lock_token,
+    )
+    await dao.create_reservation(OVERLAPPING_RESERVATION_PAYLOAD)
+
+
+@pytest.mark.anyio
+async def test_get_reservations_pages_by_cursor(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+    url = fastapi_app.url_path_for("get_reservations")
+
+    ids = []
+    params = {"limit": 2}
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        ids.extend(reservation["id"] for reservation in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+
+    assert len(ids) == 3
+    assert ids == sorted(ids)
+
+
+@pytest.mark.anyio
+async def test_get_reservations_filters(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    url = fastapi_app.url_path_for("get_reservations")
+
+    response = await client.get(url, params={"user_id": 2})
+    assert [reservation["id"] for reservation in response.json()] == [24]
+
+    response = await client.get(url, params={"car_id": 1, "end_date": "2022-08-04"})
+    assert [reservation["id"] for reservation in response.json()] == [23]
+
+    response = await client.get(url, params={"status": "CANCELLED"})
+    assert response.json() == []
+
+
+@pytest.mark.anyio
+async def test_get_reservations_rejects_invalid_cursor(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    url = fastapi_app.url_path_for("get_reservations")
+    response = await client.get(url, params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_export_reservations(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    url = fastapi_app.url_path_for("export_reservations")
+
+    response = await client.get(url)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [reservation["id"] for reservation in lines] == [23, 24]
+
+    response = await client.get(
+        url,
+        params={"format": "csv", "start_date": "2022-08-05"},
+    )
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert response.headers["content-type"].startswith("text/csv")
+    assert [row["id"] for row in rows] == ["24"]
+    assert rows[0]["start_date"] == "2022-08-05"
+
+
+@pytest.mark.anyio
+async def test_bulk_reservation_creates_all(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    url = fastapi_app.url_path_for("create_reservations")
+    response = await client.post(url, data=FLEET_RESERVATION_PAYLOAD.json())
+    outcomes = response.json()["reservations"]
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [outcome["status"] for outcome in outcomes] == ["created"] * 3
+    assert [outcome["reservation"]["car_id"] for outcome in outcomes] == [1, 2, 3]
+
+    response = await client.post(url, data=FLEET_RESERVATION_PAYLOAD.json())
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+@pytest.mark.anyio
+async def test_atomic_bulk_reservation_creates_nothing_on_conflict(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    payload = FLEET_RESERVATION_PAYLOAD.copy(deep=True)
+    # Car 1 is already booked on 2022-08-04.
+    payload.reservations[0].start_date = date(2022, 8, 4)
+    url = fastapi_app.url_path_for("create_reservations")
+    response = await client.post(url, data=payload.json())
+    outcomes = response.json()["reservations"]
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert [outcome["status"] for outcome in outcomes] == [
+        "conflict",
+        "skipped",
+        "skipped",
+    ]
+    url = fastapi_app.url_path_for("get_reservations")
+    response = await client.get(url, params={"user_id": 3})
+    assert response.json() == []
+
+
+@pytest.mark.anyio
+async def test_partial_bulk_reservation_reports_each_item(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    lock_token = await dao.lock_car_selection(3, date(2022, 9, 10), date(2022, 9, 10))
+    assert lock_token is not None
+
+    payload = FLEET_RESERVATION_PAYLOAD.copy(deep=True)
+    payload.atomic = False
+    payload.reservations[0].start_date = date(2022, 8, 4)
+    payload.reservations.append(payload.reservations[1].copy())
+    url = fastapi_app.url_path_for("create_reservations")
+    response = await client.post(url, data=payload.json())
+    outcomes = response.json()["reservations"]
+
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert [outcome["status"] for outcome in outcomes] == [
+        "conflict",
+        "created",
+        "locked",
+        "conflict",
+    ]
+    url = fastapi_app.url_path_for("get_reservations")
+    response = await client.get(url, params={"user_id": 3})
+    assert [reservation["car_id"] for reservation in response.json()] == [2]
+
+
+class CountingPaymentGateway(SimulatedPaymentGateway):
+    def __init__(self) -> None:
+        super().__init__(latency=0.05)
+        self.charges = 0
+
+    async def charge(self, user_id: int, reference: str) -> str:
+        self.charges += 1
+        return await super().charge(user_id, reference)
+
+
+@pytest.mark.anyio
+async def test_idempotent_reservation_is_booked_once(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+) -> None:
+    gateway = CountingPaymentGateway()
+    fastapi_app.dependency_overrides[get_payment_gateway] = lambda: gateway
+    url = fastapi_app.url_path_for("create_reservation")
+    headers = {"Idempotency-Key": "booking-1"}
+
+    responses = list(
+        await asyncio.gather(
+            *[
+                client.post(
+                    url, data=CREATE_RESERVATION_PAYLOAD.json(), headers=headers
+                )
+                for _ in range(2)
+            ],
+        ),
+    )
+    responses.append(
+        await client.post(url, data=CREATE_RESERVATION_PAYLOAD.json(), headers=headers),
+    )
+
+    assert gateway.charges == 1
+    assert {response.status_code for response in responses} == {
+        status.HTTP_204_NO_CONTENT,
+    }
+    assert len({response.headers["X-Location-Id"] for response in responses}) == 1
+    replayed = [response.headers.get("Idempotent-Replayed") for response in responses]
+    assert replayed.count("true") == 2
+
+    reused = await client.post(
+        url,
+        data=OVERLAPPING_RESERVATION_PAYLOAD.json(),
+        headers=headers,
+    )
+    assert reused.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert gateway.charges == 1
+
+
+@pytest.mark.anyio
+async def test_expired_idempotency_claim_keeps_the_retry_response(
+    fake_redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "idempotency_pending_ttl_ms", 50)
+    retried = asyncio.Event()
+
+    async def slow_booking() -> Response:
+        await retried.wait()
+        return Response(b"first", status_code=status.HTTP_201_CREATED)
+
+    async def retry_booking() -> Response:
+        return Response(b"retry", status_code=status.HTTP_201_CREATED)
+
+    async def retry_after_claim_expired() -> Response:
+        await asyncio.sleep(0.1)
+        response = await run_idempotently(
+            fake_redis, "test", "key", "digest", retry_booking
+        )
+        retried.set()
+        return response
+
+    first, retry = await asyncio.gather(
+        run_idempotently(fake_redis, "test", "key", "digest", slow_booking),
+        retry_after_claim_expired(),
+    )
+    assert (first.body, retry.body) == (b"first", b"retry")
+
+    async def not_run() -> Response:
+        raise AssertionError("The stored response must be replayed.")
+
+    replayed = await run_idempotently(fake_redis, "test", "key", "digest", not_run)
+    assert replayed.body == b"retry"
+
+
+@pytest.mark.anyio
+async def test_held_reservation_is_confirmed(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+) -> None:
+    hold_url = fastapi_app.url_path_for("hold_reservation")
+    response = await client.post(hold_url, data=CREATE_RESERVATION_PAYLOAD.json())
+    hold = response.json()
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert hold["status"] == ReservationStatus.processing.value
+    assert hold["hold_expires_at"]
+    overlapping = await client.post(
+        hold_url,
+        data=OVERLAPPING_RESERVATION_PAYLOAD.json(),
+    )
+    assert overlapping.status_code == status.HTTP_409_CONFLICT
+
+    confirm_url = fastapi_app.url_path_for(
+        "confirm_reservation",
+        reservation_id=hold["id"],
+    )
+    response = await client.post(confirm_url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == ReservationStatus.success.value
+    response = await client.post(confirm_url)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+@pytest.mark.anyio
+async def test_expired_hold_is_released(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    hold = await dao.hold_reservation(CREATE_RESERVATION_PAYLOAD)
+    await dbsession.execute(
+        update(Reservation)
+        .where(Reservation.id == hold.id)
+        .values(hold_expires_at=func.now() - timedelta(seconds=1)),
+    )
+
+    url = fastapi_app.url_path_for("confirm_reservation", reservation_id=hold.id)
+    response = await client.post(url)
+    assert response.status_code == status.HTTP_410_GONE
+
+    assert await dao.expire_holds(batch_size=10) == 1
+    assert await dao.expire_holds(batch_size=10) == 0
+    response = await client.post(url)
+    assert response.status_code == status.HTTP_410_GONE
+    rebooked = await dao.hold_reservation(OVERLAPPING_RESERVATION_PAYLOAD)
+    assert rebooked.status == ReservationStatus.processing.value
+
+
+@pytest.mark.anyio
+async def test_expired_hold_is_neither_changed_nor_cancelled(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    hold = await dao.hold_reservation(CREATE_RESERVATION_PAYLOAD)
+    await dbsession.execute(
+        update(Reservation)
+        .where(Reservation.id == hold.id)
+        .values(hold_expires_at=func.now() - timedelta(seconds=1)),
+    )
+    await dbsession.commit()
+
+    response = await client.patch(
+        fastapi_app.url_path_for("change_reservation", reservation_id=hold.id),
+        json={"start_date": "2022-09-01", "end_date": "2022-09-03"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    response = await client.post(
+        fastapi_app.url_path_for("cancel_reservation", reservation_id=hold.id),
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert await dao.expire_holds(batch_size=10) == 1
+
+
+@pytest.mark.anyio
+async def test_hold_sweeper_survives_redis_failures(
+    _engine: AsyncEngine,
+    fake_redis_pool: ConnectionPool,
+    payment_gateway: PaymentGateway,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sweeps = []
+
+    async def expire_holds(dao: ReservationDAO, batch_size: int) -> int:
+        sweeps.append(batch_size)
+        if len(sweeps) == 1:
+            raise RedisConnectionError("Connection closed by server.")
+        return 0
+
+    async def swept(count: int) -> None:
+        while len(sweeps) < count:
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(ReservationDAO, "expire_holds", expire_holds)
+    monkeypatch.setattr(settings, "reservation_hold_sweep_interval", 0.01)
+    app = FastAPI()
+    app.state.db_engine = _engine
+    app.state.redis_pool = fake_redis_pool
+    app.state.payment_gateway = payment_gateway
+    sweeper = asyncio.create_task(_sweep_expired_holds(app))
+    try:
+        await asyncio.wait_for(swept(2), timeout=1)
+        assert not sweeper.done()
+    finally:
+        sweeper.cancel()
+
+
+@pytest.mark.anyio
+async def test_change_and_cancel_update_occupancy(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "occupancy_index", True)
+    monkeypatch.setattr(settings, "admin_token", "admin-token")
+    await client.post(
+        fastapi_app.url_path_for("rebuild_occupancy_index"),
+        headers={"Authorization": "Bearer admin-token"},
+    )
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    reservation_id = (await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)).id
+    search_url = fastapi_app.url_path_for("search")
+
+    async def available(start_date: str, end_date: str) -> Set[int]:
+        response = await client.get(
+            search_url,
+            params={"start_date": start_date, "end_date": end_date},
+        )
+        return {car["id"] for car in response.json()}
+
+    change_url = fastapi_app.url_path_for(
+        "change_reservation",
+        reservation_id=reservation_id,
+    )
+    response = await client.patch(
+        change_url,
+        json={"start_date": "2022-08-13", "end_date": "2022-08-18"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["start_date"] == "2022-08-13"
+    assert 1 in await available("2022-08-10", "2022-08-12")
+    assert 1 not in await available("2022-08-13", "2022-08-13")
+    assert 1 not in await available("2022-08-16", "2022-08-18")
+
+    response = await client.patch(
+        change_url,
+        json={"start_date": "2022-08-04", "end_date": "2022-08-06"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    cancel_url = fastapi_app.url_path_for(
+        "cancel_reservation",
+        reservation_id=reservation_id,
+    )
+    response = await client.post(cancel_url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == ReservationStatus.cancelled.value
+    assert 1 in await available("2022-08-13", "2022-08-18")
+    response = await client.post(cancel_url)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+@pytest.mark.anyio
+async def test_booking_ends_its_transaction(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+    assert not dbsession.in_transaction()
+
+    with pytest.raises(ReservationAlreadyExist):
+        await dao.create_reservation(OVERLAPPING_RESERVATION_PAYLOAD)
+    assert not dbsession.in_transaction()
+    booked = await dbsession.scalar(
+        select(func.count()).where(
+            Reservation.overlaps(
+                CREATE_RESERVATION_PAYLOAD.start_date,
+                CREATE_RESERVATION_PAYLOAD.end_date,
+            ),
+        ),
+    )
+    assert booked == 1
+
+
+@pytest.mark.anyio
+async def test_reservation_reads_run_fixed_queries(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+) -> None:
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+    url = fastapi_app.url_path_for("get_reservations")
+    for params in ({"limit": 1}, {"limit": 50}):
+        with assert_query_count(dbsession, 1):
+            response = await client.get(url, params=params)
+        assert response.status_code == status.HTTP_200_OK
+
+    with assert_query_count(dbsession, 1) as statements:
+        user = await dbsession.get(User, CREATE_RESERVATION_PAYLOAD.user_id)
+    assert "reservations" not in statements[0]
+    with pytest.raises(InvalidRequestError):
+        user.reservations  # noqa: WPS428
+
+    with assert_query_count(dbsession, 2):
+        user = await dbsession.scalar(
+            select(User)
+            .where(User.id == CREATE_RESERVATION_PAYLOAD.user_id)
+            .options(selectinload(User.reservations))
+            .execution_options(populate_existing=True),
+        )
+    assert user.reservations
+
+
+@pytest.mark.anyio
+async def test_booking_survives_a_failed_availability_update(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def execute(*args: Any, **kwargs: Any) -> None:
+        raise RedisConnectionError("Connection closed by server.")
+
+    monkeypatch.setattr(settings, "occupancy_index", True)
+    await fake_redis.set(READY_KEY, 1)
+    monkeypatch.setattr(Pipeline, "execute", execute)
+    dao = ReservationDAO(dbsession, fake_redis, payment_gateway)
+    reservation = await dao.create_reservation(CREATE_RESERVATION_PAYLOAD)
+
+    assert await dao.get_reservation_by_id(reservation.id) is not None
+    # Searches use SQL until the index is rebuilt.
+    assert not await fake_redis.exists(READY_KEY)
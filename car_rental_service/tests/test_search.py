@@ -1,10 +1,39 @@
+import asyncio
+from datetime import date
+from typing import Any
+
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession
-from redis.asyncio import ConnectionPool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from redis.asyncio import ConnectionPool, Redis
+from sqlalchemy import delete, event, func, select, text
 from starlette import status
 
+from car_rental_service.db.dao.car_dao import CarDAO
+from car_rental_service.db.dao.reservation_dao import ReservationDAO
+from car_rental_service.db.models.car import Car
+from car_rental_service.db.models.reservation import Reservation
+from car_rental_service.db.warmup import warm_up_pool
+from car_rental_service.services.catalog import lifetime as catalog_lifetime
+from car_rental_service.services.catalog.catalog import CarCatalog
+from car_rental_service.services.payment.gateway import PaymentGateway
+from car_rental_service.services.redis import search_cache
+from car_rental_service.services.redis.occupancy import (
+    rebuild_occupancy,
+    reserved_car_ids,
+    update_occupancy,
+)
+from car_rental_service.settings import settings
+from car_rental_service.tests.payloads import CREATE_RESERVATION_PAYLOAD
+from car_rental_service.tests.queries import assert_query_count
+from car_rental_service.web.api.reservation.schema import ReservationInputDTO
+
+# Next id the reservations sequence hands out.
+RESERVATION_ID_SEQUENCE_QUERY = (
+    "SELECT last_value + is_called::int FROM reservations_id_seq"
+)
+
 
 @pytest.mark.anyio
 async def test_search(
@@ -22,3 +51,412 @@ async def test_search(
 
     assert response.status_code == status.HTTP_200_OK
     assert len(cars) >= 1
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("route", ["search", "search_facets"])
+async def test_search_rejects_reversed_dates(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+    route: str,
+) -> None:
+    response = await client.get(
+        fastapi_app.url_path_for(route),
+        params={"start_date": "2022-08-15", "end_date": "2022-08-10"},
+    )
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_search_excludes_partially_overlapping_reservations(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    url = fastapi_app.url_path_for("search")
+    response = await client.get(
+        url,
+        params={"start_date": "2022-08-03", "end_date": "2022-08-04"},
+    )
+    car_ids = {car["id"] for car in response.json()}
+
+    assert response.status_code == status.HTTP_200_OK
+    assert 1 not in car_ids
+    assert car_ids == {2, 3}
+
+
+@pytest.mark.anyio
+async def test_search_with_occupancy_index(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "occupancy_index", True)
+    monkeypatch.setattr(settings, "admin_token", "admin-token")
+    rebuild_url = fastapi_app.url_path_for("rebuild_occupancy_index")
+    rebuild_response = await client.post(rebuild_url)
+    assert rebuild_response.status_code == status.HTTP_401_UNAUTHORIZED
+    rebuild_response = await client.post(
+        rebuild_url,
+        headers={"Authorization": "Bearer wrong-token"},
+    )
+    assert rebuild_response.status_code == status.HTTP_401_UNAUTHORIZED
+    rebuild_response = await client.post(
+        rebuild_url,
+        headers={"Authorization": "Bearer admin-token"},
+    )
+    assert rebuild_response.json() == {"reservations": 2}
+
+    url = fastapi_app.url_path_for("search")
+    response = await client.get(
+        url,
+        params={"start_date": "2022-08-04", "end_date": "2022-08-05"},
+    )
+    assert {car["id"] for car in response.json()} == {2, 3}
+
+    await client.post(
+        fastapi_app.url_path_for("create_reservation"),
+        data=CREATE_RESERVATION_PAYLOAD.json(),
+    )
+    response = await client.get(
+        url,
+        params={"start_date": "2022-08-10", "end_date": "2022-08-11"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert {car["id"] for car in response.json()} == {2, 3}
+
+
+@pytest.mark.anyio
+async def test_occupancy_rebuild_keeps_changes_made_meanwhile(
+    dbsession: AsyncSession,
+    fake_redis: Redis,
+    payment_gateway: PaymentGateway,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "occupancy_index", True)
+    booking = ReservationInputDTO(
+        car_id=2,
+        user_id=1,
+        start_date="2022-09-20",
+        end_date="2022-09-22",
+    )
+    window = (booking.start_date, booking.end_date)
+    await ReservationDAO(dbsession, fake_redis, payment_gateway).create_reservation(
+        booking,
+    )
+    stream = dbsession.stream
+
+    async def stream_then_change(statement: Any) -> Any:  # noqa: WPS430
+        rows = await stream(statement)
+        # Car 2 is released and car 3 booked once the snapshot is taken.
+        await update_occupancy(
+            fake_redis,
+            booked=[(3, *window)],
+            released=[(2, *window)],
+        )
+        return rows
+
+    monkeypatch.setattr(dbsession, "stream", stream_then_change)
+    assert await rebuild_occupancy(fake_redis, dbsession)
+
+    reserved = await reserved_car_ids(fake_redis, *window)
+    assert 2 not in reserved
+    assert 3 in reserved
+
+
+@pytest.mark.anyio
+async def test_search_from_car_catalog(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    car_catalog: CarCatalog,
+) -> None:
+    await car_catalog.load(dbsession)
+    await dbsession.execute(delete(Car).where(Car.id == 3))
+
+    url = fastapi_app.url_path_for("search")
+    response = await client.get(
+        url,
+        params={"start_date": "2022-08-03", "end_date": "2022-08-04"},
+    )
+    cars = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [car["id"] for car in cars] == [2, 3]
+    assert cars[0]["registered_number"] == "HR26AZ5678"
+
+
+@pytest.mark.anyio
+async def test_catalog_listener_survives_failures(
+    fake_redis_pool: ConnectionPool,
+    fake_redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    reloads = []
+
+    async def reload_catalog(app: FastAPI) -> None:  # noqa: WPS430
+        reloads.append(app)
+        if len(reloads) == 1:
+            raise ConnectionRefusedError()
+
+    async def reloaded(count: int) -> None:  # noqa: WPS430
+        while len(reloads) < count:
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(catalog_lifetime, "_reload_catalog", reload_catalog)
+    monkeypatch.setattr(catalog_lifetime, "LISTEN_TIMEOUT", 0.01)
+    monkeypatch.setattr(catalog_lifetime, "RESUBSCRIBE_DELAY", 0.01)
+    app = FastAPI()
+    app.state.redis_pool = fake_redis_pool
+    listener = asyncio.create_task(catalog_lifetime._listen_for_changes(app))
+    try:
+        await asyncio.wait_for(reloaded(2), timeout=1)
+        # Idle for longer than a listen timeout, then notified.
+        await asyncio.sleep(0.05)
+        await catalog_lifetime.publish_catalog_change(fake_redis)
+        await asyncio.wait_for(reloaded(3), timeout=1)
+        assert not listener.done()
+    finally:
+        listener.cancel()
+
+
+@pytest.mark.anyio
+async def test_search_raw_json_matches_response_model(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    url = fastapi_app.url_path_for("search")
+    params = {"start_date": "2022-08-10", "end_date": "2022-08-15"}
+
+    monkeypatch.setattr(settings, "raw_json_responses", True)
+    raw_response = await client.get(url, params=params)
+    monkeypatch.setattr(settings, "raw_json_responses", False)
+    model_response = await client.get(url, params=params)
+
+    assert raw_response.status_code == status.HTTP_200_OK
+    assert raw_response.headers["content-type"] == "application/json"
+    assert raw_response.json() == model_response.json()
+
+
+@pytest.mark.anyio
+async def test_day_versions_outlive_cached_searches(
+    fake_redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    cache_ttl_ms = 3 * 86_400_000
+    monkeypatch.setattr(settings, "search_cache_ttl_ms", cache_ttl_ms)
+    window = (date(2022, 8, 3), date(2022, 8, 4))
+    await search_cache.invalidate_reserved_cars(fake_redis, [window])
+    version_key = search_cache.day_version_key(window[0])
+    assert await fake_redis.pttl(version_key) > cache_ttl_ms
+
+    # A version about to expire is kept alive by the entries stamped with it.
+    await fake_redis.pexpire(version_key, 1000)
+    _, versions = await search_cache.get_reserved_cars(fake_redis, *window)
+    await search_cache.store_reserved_cars(
+        fake_redis, *window, versions, [1], cache_ttl_ms
+    )
+    assert await fake_redis.pttl(version_key) > cache_ttl_ms
+
+
+@pytest.mark.anyio
+async def test_pool_warm_up_leaves_no_rows(
+    _engine: AsyncEngine,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "search_cache_ttl_ms", 60_000)
+    monkeypatch.setattr(settings, "search_single_flight", True)
+    anti_joins = []
+
+    def record(*args: Any) -> None:  # noqa: WPS430
+        statement = args[2]
+        if statement.startswith("SELECT cars.id") and "NOT (EXISTS" in statement:
+            anti_joins.append(statement)
+
+    async with AsyncSession(_engine) as session:
+        next_id = await session.scalar(text(RESERVATION_ID_SEQUENCE_QUERY))
+    event.listen(_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        await warm_up_pool(_engine, 3)
+    finally:
+        event.remove(_engine.sync_engine, "before_cursor_execute", record)
+    # Every connection prepared the search, none was shared.
+    assert len(anti_joins) == 3
+
+    async with AsyncSession(_engine) as session:
+        reservations = await session.execute(select(func.count(Reservation.id)))
+        assert reservations.scalar_one() == 0
+        # No reservation id was consumed either.
+        assert await session.scalar(text(RESERVATION_ID_SEQUENCE_QUERY)) == next_id
+
+
+@pytest.mark.anyio
+async def test_identical_concurrent_searches_share_one_lookup(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    lookups = []
+    find_available_cars = CarDAO.find_available_cars
+
+    async def slow_lookup(self, *args):  # noqa: WPS430
+        lookups.append(args)
+        await asyncio.sleep(0.05)
+        return await find_available_cars(self, *args)
+
+    monkeypatch.setattr(CarDAO, "find_available_cars", slow_lookup)
+    url = fastapi_app.url_path_for("search")
+    params = {"start_date": "2022-08-03", "end_date": "2022-08-04"}
+    responses = await asyncio.gather(
+        *[client.get(url, params=params) for _ in range(5)]
+    )
+
+    assert len(lookups) == 1
+    assert {car["id"] for car in responses[0].json()} == {2, 3}
+    assert all(response.json() == responses[0].json() for response in responses)
+
+
+@pytest.mark.anyio
+async def test_search_cache_is_invalidated_by_bookings(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "search_cache_ttl_ms", 60_000)
+    queries = []
+    get_reserved_cars = CarDAO.get_reserved_cars
+
+    async def count_queries(self, *args, **kwargs):  # noqa: WPS430
+        queries.append(args)
+        return await get_reserved_cars(self, *args, **kwargs)
+
+    monkeypatch.setattr(CarDAO, "get_reserved_cars", count_queries)
+    url = fastapi_app.url_path_for("search")
+    params = {"start_date": "2022-08-12", "end_date": "2022-08-20"}
+    for _ in range(2):
+        response = await client.get(url, params=params)
+        assert {car["id"] for car in response.json()} == {1, 2, 3}
+    assert len(queries) == 1
+
+    await client.post(
+        fastapi_app.url_path_for("create_reservation"),
+        data=CREATE_RESERVATION_PAYLOAD.json(),
+    )
+    response = await client.get(url, params=params)
+    assert {car["id"] for car in response.json()} == {2, 3}
+    assert len(queries) == 2
+
+
+@pytest.mark.anyio
+async def test_availability_calendar(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+) -> None:
+    await client.post(
+        fastapi_app.url_path_for("create_reservation"),
+        data=CREATE_RESERVATION_PAYLOAD.json(),
+    )
+    url = fastapi_app.url_path_for("availability_calendar")
+    response = await client.get(
+        url,
+        params={"start_date": "2022-08-01", "days": 20, "car_id": [2, 1, 404]},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [
+        {
+            "car_id": 1,
+            "free": [
+                {"start_date": "2022-08-01", "end_date": "2022-08-03"},
+                {"start_date": "2022-08-06", "end_date": "2022-08-09"},
+                {"start_date": "2022-08-16", "end_date": "2022-08-20"},
+            ],
+        },
+        {
+            "car_id": 2,
+            "free": [{"start_date": "2022-08-01", "end_date": "2022-08-20"}],
+        },
+    ]
+
+    response = await client.get(
+        url,
+        params={"start_date": "2022-08-01", "car_id": list(range(1, 102))},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("from_catalog", [False, True])
+async def test_search_filters_sort_and_facets(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    car_catalog: CarCatalog,
+    from_catalog: bool,
+) -> None:
+    if from_catalog:
+        await car_catalog.load(dbsession)
+    url = fastapi_app.url_path_for("search")
+    window = {"start_date": "2022-08-03", "end_date": "2022-08-04"}
+
+    response = await client.get(url, params={**window, "zone_id": 1})
+    assert [car["id"] for car in response.json()] == [2]
+    assert response.json()[0]["zone_id"] == 1
+
+    response = await client.get(url, params={**window, "brand": "Brand C"})
+    assert [car["id"] for car in response.json()] == [3]
+
+    response = await client.get(
+        url,
+        params={
+            "start_date": "2022-08-10",
+            "end_date": "2022-08-11",
+            "sort": "name",
+            "limit": 2,
+        },
+    )
+    assert [car["name"] for car in response.json()] == ["Car A", "Car B"]
+
+    response = await client.get(
+        fastapi_app.url_path_for("search_facets"),
+        params=window,
+    )
+    assert response.json() == {
+        "category_id": {"2": 1, "3": 1},
+        "brand": {"Brand B": 1, "Brand C": 1},
+        "zone_id": {"1": 1, "2": 1},
+    }
+
+
+@pytest.mark.anyio
+async def test_search_runs_fixed_queries(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    url = fastapi_app.url_path_for("search")
+    # Distinct windows, so neither search is answered from the cache.
+    for start_date, limit in (("2022-09-01", 1), ("2022-09-02", 50)):
+        with assert_query_count(dbsession, 1):
+            response = await client.get(
+                url,
+                params={
+                    "start_date": start_date,
+                    "end_date": "2022-09-09",
+                    "limit": limit,
+                },
+            )
+        assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import date, timedelta
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+
+def iter_days(start_date: date, end_date: date) -> Iterator[date]:
+    """Yield every day of an interval, both ends included.
+
+    :param start_date: first day of the interval.
+    :param end_date: last day of the interval.
+    :yields: days in ascending order.
+    """
+    for offset in range((end_date - start_date).days + 1):
+        yield start_date + timedelta(days=offset)
+
+
+def free_ranges(
+    start_date: date,
+    days: int,
+    booked: Iterable[Tuple[date, date]],
+) -> List[Tuple[date, date]]:
+    """Free intervals of a horizon, given the booked ones.
+
+    Days are flattened into a bytearray with one slice assignment per
+    booking, and free runs are found with `bytes.find`, so the work
+    done in Python grows with the number of intervals, not of days.
+
+    :param start_date: first day of the horizon.
+    :param days: length of the horizon.
+    :param booked: first and last day of each booking, may overlap or
+        stick out of the horizon.
+    :returns: first and last day of each free run, in order.
+    """
+    calendar = bytearray(b"\x01") * days
+    for booked_start, booked_end in booked:
+        first = max((booked_start - start_date).days, 0)
+        last = min((booked_end - start_date).days + 1, days)
+        if first < last:
+            calendar[first:last] = bytes(last - first)
+
+    ranges = []
+    first = calendar.find(1)
+    while first != -1:
+        last = calendar.find(0, first)
+        if last == -1:
+            last = days
+        ranges.append(
+            (
+                start_date + timedelta(days=first),
+                start_date + timedelta(days=last - 1),
+            ),
+        )
+        first = calendar.find(1, last)
+    return ranges
+
+
+class SingleFlight:
+    """Runs identical concurrent calls once, sharing the outcome.
+
+    The first caller of a key runs the call, callers arriving while it
+    is in flight wait for its result or exception. If the first caller
+    is cancelled, one of the waiting callers runs the call instead.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, "asyncio.Future"] = {}
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run the call, or join the identical call in flight.
+
+        :param key: identifies identical calls.
+        :param call: makes the awaitable to run.
+        :returns: result of the call.
+        """
+        while key in self._flights:
+            flight = self._flights[key]
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as error:
+            flight.set_exception(error)
+            # Waiting callers re-raise it, nobody has to retrieve it.
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        """
+        Whether a call of the key is running.
+
+        :param key: identifies identical calls.
+        :returns: True if a call is in flight.
+        """
+        return key in self._flights
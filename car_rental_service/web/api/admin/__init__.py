@@ -0,0 +1,4 @@
+"""Maintenance API."""
+from car_rental_service.web.api.admin.views import router
+
+__all__ = ["router"]
@@ -0,0 +1,27 @@
+from hmac import compare_digest
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+
+from car_rental_service.settings import settings
+
+
+async def verify_admin_token(
+    authorization: Optional[str] = Header(None),
+) -> None:
+    """
+    Lets through the requests bearing the admin token.
+
+    :param authorization: `Authorization` header of the request.
+    :raises HTTPException: the token is missing or wrong, or no token is
+        configured.
+    """
+    if settings.admin_token is None or not compare_digest(
+        authorization or "",
+        f"Bearer {settings.admin_token}",
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Admin token required.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
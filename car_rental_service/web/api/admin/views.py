@@ -0,0 +1,49 @@
+from fastapi import APIRouter, status
+from fastapi.param_functions import Depends
+from fastapi.responses import JSONResponse
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from car_rental_service.db.dependencies import get_db_session
+from car_rental_service.services.catalog.lifetime import publish_catalog_change
+from car_rental_service.services.redis.dependency import get_redis
+from car_rental_service.services.redis.occupancy import rebuild_occupancy
+from car_rental_service.web.api.admin.dependency import verify_admin_token
+
+router = APIRouter(dependencies=[Depends(verify_admin_token)])
+
+
+@router.post("/occupancy/rebuild")
+async def rebuild_occupancy_index(
+    session: AsyncSession = Depends(get_db_session),
+    redis: Redis = Depends(get_redis),
+) -> JSONResponse:
+    """
+    Rebuild the occupancy bitmaps from the reservations table.
+
+    :param session: database session.
+    :param redis: redis client.
+    :return: number of indexed reservations.
+    """
+    indexed = await rebuild_occupancy(redis, session)
+
+    if indexed is None:
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"message": "Occupancy rebuild already in progress."},
+        )
+    return JSONResponse(content={"reservations": indexed})
+
+
+@router.post("/catalog/refresh", status_code=status.HTTP_202_ACCEPTED)
+async def refresh_car_catalog(
+    redis: Redis = Depends(get_redis),
+) -> None:
+    """
+    Make every worker reload its car catalog.
+
+    Call it after changing cars.
+
+    :param redis: redis client.
+    """
+    await publish_catalog_change(redis)
@@ -1,4 +1,14 @@
 from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from car_rental_service.services.metrics.metrics import multiprocess_dir
 
 router = APIRouter()
 
@@ -10,3 +20,20 @@ def health_check() -> None:
 
     It returns 200 if the project is healthy.
     """
+
+
+@router.get("/metrics", response_class=Response)
+def metrics() -> Response:
+    """
+    Exposes the metrics in the Prometheus text format.
+
+    With several workers the metrics of all of them are merged, not
+    only those of the worker answering the request.
+
+    :return: current value of every metric.
+    """
+    registry = REGISTRY
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
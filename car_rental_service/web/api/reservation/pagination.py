@@ -0,0 +1,36 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from car_rental_service.web.exceptions import InvalidCursor
+
+CURSOR_PREFIX = "id:"
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Opaque cursor pointing after a reservation.
+
+    :param last_id: id of the last reservation of the page.
+    :returns: url safe cursor.
+    """
+    return urlsafe_b64encode(f"{CURSOR_PREFIX}{last_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Reservation id a cursor points after.
+
+    :param cursor: cursor returned with a previous page.
+    :raises InvalidCursor: if the cursor was not issued by `encode_cursor`.
+    :returns: id of the last reservation of the previous page.
+    """
+    try:
+        decoded = urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor()
+    if not decoded.startswith(CURSOR_PREFIX):
+        raise InvalidCursor()
+    try:
+        return int(decoded[len(CURSOR_PREFIX) :])
+    except ValueError:
+        raise InvalidCursor()
@@ -1,9 +1,26 @@
+from enum import Enum
 from uuid import UUID
 from datetime import datetime, date
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, root_validator
 
 from car_rental_service.schema import ReservationStatus
+from car_rental_service.settings import settings
+
+
+def check_date_range(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Refuse a reservation ending before it starts.
+
+    :param values: validated fields of the DTO.
+    :raises ValueError: when `end_date` is before `start_date`.
+    :returns: the fields, unchanged.
+    """
+    start_date, end_date = values.get("start_date"), values.get("end_date")
+    if start_date and end_date and start_date > end_date:
+        raise ValueError("end_date must not be before start_date")
+    return values
 
 
 class ReservationOutputDTO(BaseModel):
@@ -27,6 +44,33 @@ class ReservationOutputDTO(BaseModel):
         use_enum_values = True
 
 
+class ReservationHoldDTO(ReservationOutputDTO):
+    """DTO for a held reservation, to confirm before its hold expires."""
+
+    hold_expires_at: datetime
+
+
+class ReservationFilterDTO(BaseModel):
+    """DTO for filtering the reservations list.
+
+    `start_date` and `end_date` keep the reservations sharing a day
+    with the window, either end may be left open.
+    """
+
+    user_id: Optional[int] = None
+    car_id: Optional[int] = None
+    status: Optional[ReservationStatus] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+
+class ExportFormat(str, Enum):
+    """Formats of the reservations export."""
+
+    ndjson = "ndjson"
+    csv = "csv"
+
+
 class ReservationInputDTO(BaseModel):
     """DTO for creating new reservation."""
 
@@ -35,10 +79,63 @@ class ReservationInputDTO(BaseModel):
     start_date: date
     end_date: date
 
+    _check_dates = root_validator(allow_reuse=True)(check_date_range)
+
     class Config:
         orm_mode = True
 
 
+class ReservationChangeDTO(BaseModel):
+    """DTO for moving a reservation to other days."""
+
+    start_date: date
+    end_date: date
+
+    _check_dates = root_validator(allow_reuse=True)(check_date_range)
+
+
+class BulkReservationInputDTO(BaseModel):
+    """DTO for creating several reservations at once.
+
+    With `atomic` every reservation is created or none is, otherwise
+    each one succeeds or fails on its own.
+    """
+
+    reservations: List[ReservationInputDTO] = Field(
+        ...,
+        min_items=1,
+        max_items=settings.bulk_reservation_max_items,
+    )
+    atomic: bool = True
+
+
+class BulkItemStatus(str, Enum):
+    """Outcome of one reservation of a bulk request."""
+
+    created = "created"
+    conflict = "conflict"
+    locked = "locked"
+    payment_failed = "payment_failed"
+    skipped = "skipped"
+
+
+class BulkReservationItemDTO(BaseModel):
+    """DTO for the outcome of one reservation of a bulk request."""
+
+    index: int
+    status: BulkItemStatus
+    reservation: Optional[ReservationOutputDTO] = None
+
+    class Config:
+        use_enum_values = True
+
+
+class BulkReservationOutputDTO(BaseModel):
+    """DTO for the outcome of a bulk request, in the order of its items."""
+
+    reservations: List[BulkReservationItemDTO]
+
+
 CREATE_RESERVATION_RESPONSE_SCHEMAS = {
     409: {
         "description": "Reservation already exists.",
@@ -56,6 +153,14 @@ CREATE_RESERVATION_RESPONSE_SCHEMAS = {
             },
         },
     },
+    402: {
+        "description": "Payment failed.",
+        "content": {
+            "application/json": {
+                "message": "Payment failed.",
+            },
+        },
+    },
     500: {
         "description": "Something went wrong.",
         "content": {
@@ -67,7 +172,89 @@ CREATE_RESERVATION_RESPONSE_SCHEMAS = {
 }
 
 
+HOLD_RESERVATION_RESPONSE_SCHEMAS = {
+    409: CREATE_RESERVATION_RESPONSE_SCHEMAS[409],
+    500: CREATE_RESERVATION_RESPONSE_SCHEMAS[500],
+}
+
+
+CONFIRM_RESERVATION_RESPONSE_SCHEMAS = {
+    402: CREATE_RESERVATION_RESPONSE_SCHEMAS[402],
+    404: {
+        "description": "Reservation not found.",
+        "content": {
+            "application/json": {
+                "message": "Reservation not found.",
+            },
+        },
+    },
+    409: {
+        "description": "Reservation is not on hold.",
+        "content": {
+            "application/json": {
+                "message": "Reservation is not on hold.",
+            },
+        },
+    },
+    410: {
+        "description": "Reservation hold expired.",
+        "content": {
+            "application/json": {
+                "message": "Reservation hold expired.",
+            },
+        },
+    },
+    500: CREATE_RESERVATION_RESPONSE_SCHEMAS[500],
+}
+
+
+CANCEL_RESERVATION_RESPONSE_SCHEMAS = {
+    404: CONFIRM_RESERVATION_RESPONSE_SCHEMAS[404],
+    409: {
+        "description": "Reservation is cancelled or expired.",
+        "content": {
+            "application/json": {
+                "message": "Reservation is cancelled or expired.",
+            },
+        },
+    },
+    500: CREATE_RESERVATION_RESPONSE_SCHEMAS[500],
+}
+
+
+CHANGE_RESERVATION_RESPONSE_SCHEMAS = {
+    **CANCEL_RESERVATION_RESPONSE_SCHEMAS,
+    409: {
+        "description": (
+            "Reservation is cancelled or expired, "
+            "or the car is already reserved on the new days."
+        ),
+        "content": {
+            "application/json": {
+                "message": "Reservation already exists.",
+            },
+        },
+    },
+}
+
+
 GET_RESERVATION_RESPONSE_SCHEMAS = {
+    200: {
+        "headers": {
+            "X-Next-Cursor": {
+                "description": "Cursor of the next page, absent on the last page.",
+                "schema": {"type": "string"},
+            },
+        },
+    },
+    400: {
+        "description": "Invalid pagination cursor.",
+        "content": {
+            "application/json": {
+                "message": "Invalid pagination cursor.",
+            },
+        },
+    },
     500: {
         "description": "Something went wrong.",
         "content": {
@@ -77,3 +264,23 @@ GET_RESERVATION_RESPONSE_SCHEMAS = {
         },
     },
 }
+
+
+EXPORT_RESERVATION_RESPONSE_SCHEMAS = {
+    200: {
+        "description": "Reservations, one per line.",
+        "content": {
+            "application/x-ndjson": {},
+            "text/csv": {},
+        },
+    },
+}
+
+
+BULK_RESERVATION_RESPONSE_SCHEMAS = {
+    207: {
+        "description": "Some reservations failed, the others are created.",
+        "model": BulkReservationOutputDTO,
+    },
+    **CREATE_RESERVATION_RESPONSE_SCHEMAS,
+}
@@ -1,22 +1,78 @@
-from typing import List
+from functools import partial
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Header, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.param_functions import Depends
 
+from redis.asyncio import Redis
+from sqlalchemy.engine import Row
+
 from car_rental_service.db.dao.reservation_dao import ReservationDAO
-from car_rental_service.db.models.reservation import Reservation
+from car_rental_service.services.redis.dependency import get_redis
+from car_rental_service.settings import settings
 from car_rental_service.web.api.reservation.schema import (
+    BULK_RESERVATION_RESPONSE_SCHEMAS,
+    CANCEL_RESERVATION_RESPONSE_SCHEMAS,
+    CHANGE_RESERVATION_RESPONSE_SCHEMAS,
+    CONFIRM_RESERVATION_RESPONSE_SCHEMAS,
     CREATE_RESERVATION_RESPONSE_SCHEMAS,
+    EXPORT_RESERVATION_RESPONSE_SCHEMAS,
     GET_RESERVATION_RESPONSE_SCHEMAS,
+    HOLD_RESERVATION_RESPONSE_SCHEMAS,
+    BulkItemStatus,
+    BulkReservationInputDTO,
+    BulkReservationOutputDTO,
+    ExportFormat,
+    ReservationChangeDTO,
+    ReservationFilterDTO,
+    ReservationHoldDTO,
     ReservationInputDTO,
     ReservationOutputDTO,
 )
+from car_rental_service.web.api.reservation.pagination import (
+    decode_cursor,
+    encode_cursor,
+)
+from car_rental_service.web.idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    fingerprint,
+    run_idempotently,
+)
+from car_rental_service.web.responses import (
+    RawJSONResponse,
+    encode_rows,
+    iter_csv,
+    iter_ndjson,
+)
 from car_rental_service.web.exceptions import (
     CarIsLockedForReservation,
+    IdempotencyKeyInUse,
+    IdempotencyKeyReused,
+    InvalidCursor,
+    PaymentFailed,
     ReservationAlreadyExist,
+    ReservationHoldExpired,
+    ReservationNotActive,
+    ReservationNotFound,
+    ReservationNotOnHold,
 )
 
+MAX_PAGE_SIZE = 1000
+
+# Error returned for the first failed reservation of an atomic bulk request.
+BULK_ITEM_ERRORS = {
+    BulkItemStatus.conflict: ReservationAlreadyExist,
+    BulkItemStatus.locked: CarIsLockedForReservation,
+    BulkItemStatus.payment_failed: PaymentFailed,
+}
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
 router = APIRouter()
 
 
@@ -26,19 +82,88 @@ router = APIRouter()
     responses=GET_RESERVATION_RESPONSE_SCHEMAS,
 )
 async def get_reservations(
-    limit: int = 10,
-    offset: int = 0,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    offset: int = Query(0, ge=0, deprecated=True),
+    filters: ReservationFilterDTO = Depends(),
+    reservation_dao: ReservationDAO = Depends(),
+) -> Union[List[Row], Response]:
+    """
+    Retrieve a page of reservations ordered by id.
+
+    The cursor of the next page is returned in the `X-Next-Cursor`
+    header, the header is absent on the last page.
+
+    :param response: response to set the cursor header on.
+    :param limit: maximum number of reservations, defaults to 10.
+    :param cursor: cursor returned with the previous page.
+    :param offset: deprecated, reservations to skip when no cursor is given.
+    :param filters: reservations filters.
+    :param reservation_dao: DAO for reservation models.
+    :return: page of reservations.
+    """
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as invalid_cursor:
+        return JSONResponse(
+            status_code=invalid_cursor.status_code,
+            content={"message": invalid_cursor.message},
+        )
+
+    # One extra row tells whether a next page exists.
+    reservations = await reservation_dao.get_all_reservation(
+        limit=limit + 1,
+        offset=offset,
+        after_id=after_id,
+        filters=filters,
+    )
+    headers = {}
+    if len(reservations) > limit:
+        reservations = reservations[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(reservations[-1].id)
+
+    if settings.raw_json_responses:
+        return RawJSONResponse(
+            encode_rows(reservations, ReservationOutputDTO.__fields__),
+            headers=headers,
+        )
+    response.headers.update(headers)
+    return reservations
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses=EXPORT_RESERVATION_RESPONSE_SCHEMAS,
+)
+async def export_reservations(
+    export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    filters: ReservationFilterDTO = Depends(),
     reservation_dao: ReservationDAO = Depends(),
-) -> List[Reservation]:
+) -> StreamingResponse:
     """
-    Retrieve all dummy objects from the database.
+    Export all reservations matching the filters, ordered by id.
 
-    :param limit: limit of dummy objects, defaults to 10.
-    :param offset: offset of dummy objects, defaults to 0.
-    :param dummy_dao: DAO for dummy models.
-    :return: list of dummy obbjects from database.
+    The rows are streamed as they are read from the database, so the
+    export size is not bounded by the worker memory.
+
+    :param export_format: NDJSON or CSV, defaults to NDJSON.
+    :param filters: reservations filters.
+    :param reservation_dao: DAO for reservation models.
+    :return: streamed reservations.
     """
-    return await reservation_dao.get_all_reservation(limit=limit, offset=offset)
+    encode = iter_csv if export_format == ExportFormat.csv else iter_ndjson
+    partitions = reservation_dao.stream_reservations(filters)
+    return StreamingResponse(
+        encode(partitions, ReservationOutputDTO.__fields__),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename=reservations.{export_format.value}"
+            ),
+        },
+    )
 
 
 @router.post(
@@ -49,16 +174,59 @@ async def get_reservations(
 async def create_reservation(
     new_reservation_object: ReservationInputDTO,
     reservation_dao: ReservationDAO = Depends(),
+    redis: Redis = Depends(get_redis),
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias=IDEMPOTENCY_KEY_HEADER,
+        max_length=255,
+        description="Retries with the same key get the first response back.",
+    ),
 ) -> None:
     """Create new reservation.
 
     Args:
         new_reservation_object (ReservationInputDTO): _description_
         reservation_dao (ReservationDAO): _description_
+        redis (Redis): stores the responses to replay
+        idempotency_key (str, optional): identifies the retries of a request
 
     Returns:
         : _description_
     """
+    book = partial(book_reservation, new_reservation_object, reservation_dao)
+    if idempotency_key is None:
+        return await book()
+    try:
+        return await run_idempotently(
+            redis,
+            "create_reservation",
+            idempotency_key,
+            fingerprint(new_reservation_object.json().encode("utf-8")),
+            book,
+        )
+    except IdempotencyKeyInUse as idempotency_key_in_use:
+        return JSONResponse(
+            status_code=idempotency_key_in_use.status_code,
+            content={"message": idempotency_key_in_use.message},
+        )
+    except IdempotencyKeyReused as idempotency_key_reused:
+        return JSONResponse(
+            status_code=idempotency_key_reused.status_code,
+            content={"message": idempotency_key_reused.message},
+        )
+
+
+async def book_reservation(
+    new_reservation_object: ReservationInputDTO,
+    reservation_dao: ReservationDAO,
+) -> JSONResponse:
+    """
+    Book a car, answering every outcome with a JSON response.
+
+    :param new_reservation_object: reservation to create.
+    :param reservation_dao: reservation DAO.
+    :returns: response to the booking.
+    """
     try:
         resp = await reservation_dao.create_reservation(new_reservation_object)
         headers = {"X-Location-Id": str(resp.id)}
@@ -73,8 +241,201 @@ async def create_reservation(
             status_code=car_is_locked_for_reservation.status_code,
             content={"message": car_is_locked_for_reservation.message},
         )
+    except PaymentFailed as payment_failed:
+        return JSONResponse(
+            status_code=payment_failed.status_code,
+            content={"message": payment_failed.message},
+        )
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"message": "Something went wrong."},
         )
+
+
+@router.post(
+    "/holds",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ReservationHoldDTO,
+    responses=HOLD_RESERVATION_RESPONSE_SCHEMAS,
+)
+async def hold_reservation(
+    new_reservation_object: ReservationInputDTO,
+    reservation_dao: ReservationDAO = Depends(),
+) -> Union[Row, JSONResponse]:
+    """
+    Hold a car for a customer about to pay for it.
+
+    The hold is confirmed by `confirm_reservation` once paid, or
+    expires after `reservation_hold_ttl` seconds.
+
+    :param new_reservation_object: reservation to hold.
+    :param reservation_dao: DAO for reservation models.
+    :return: held reservation.
+    """
+    try:
+        return await reservation_dao.hold_reservation(new_reservation_object)
+    except ReservationAlreadyExist as reservation_already_exists:
+        return JSONResponse(
+            status_code=reservation_already_exists.status_code,
+            content={"message": reservation_already_exists.message},
+        )
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": "Something went wrong."},
+        )
+
+
+@router.post(
+    "/{reservation_id}/confirm",
+    response_model=ReservationOutputDTO,
+    responses=CONFIRM_RESERVATION_RESPONSE_SCHEMAS,
+)
+async def confirm_reservation(
+    reservation_id: int,
+    reservation_dao: ReservationDAO = Depends(),
+) -> Union[Row, JSONResponse]:
+    """
+    Charge the customer of a held reservation and confirm it.
+
+    A declined payment keeps the hold, the confirmation can be retried
+    until it expires.
+
+    :param reservation_id: id of the held reservation.
+    :param reservation_dao: DAO for reservation models.
+    :return: confirmed reservation.
+    """
+    try:
+        return await reservation_dao.confirm_reservation(reservation_id)
+    except (
+        ReservationNotFound,
+        ReservationNotOnHold,
+        ReservationHoldExpired,
+        PaymentFailed,
+    ) as error:
+        return JSONResponse(
+            status_code=error.status_code,
+            content={"message": error.message},
+        )
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": "Something went wrong."},
+        )
+
+
+@router.post(
+    "/{reservation_id}/cancel",
+    response_model=ReservationOutputDTO,
+    responses=CANCEL_RESERVATION_RESPONSE_SCHEMAS,
+)
+async def cancel_reservation(
+    reservation_id: int,
+    reservation_dao: ReservationDAO = Depends(),
+) -> Union[Row, JSONResponse]:
+    """
+    Cancel a confirmed or held reservation, freeing its days.
+
+    :param reservation_id: id of the reservation.
+    :param reservation_dao: DAO for reservation models.
+    :return: cancelled reservation.
+    """
+    try:
+        return await reservation_dao.cancel_reservation(reservation_id)
+    except (ReservationNotFound, ReservationNotActive) as error:
+        return JSONResponse(
+            status_code=error.status_code,
+            content={"message": error.message},
+        )
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": "Something went wrong."},
+        )
+
+
+@router.patch(
+    "/{reservation_id}",
+    response_model=ReservationOutputDTO,
+    responses=CHANGE_RESERVATION_RESPONSE_SCHEMAS,
+)
+async def change_reservation(
+    reservation_id: int,
+    change: ReservationChangeDTO,
+    reservation_dao: ReservationDAO = Depends(),
+) -> Union[Row, JSONResponse]:
+    """
+    Move a confirmed or held reservation to other days.
+
+    :param reservation_id: id of the reservation.
+    :param change: new days of the reservation.
+    :param reservation_dao: DAO for reservation models.
+    :return: changed reservation.
+    """
+    try:
+        return await reservation_dao.change_reservation(reservation_id, change)
+    except (
+        ReservationNotFound,
+        ReservationNotActive,
+        ReservationAlreadyExist,
+    ) as error:
+        return JSONResponse(
+            status_code=error.status_code,
+            content={"message": error.message},
+        )
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": "Something went wrong."},
+        )
+
+
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_201_CREATED,
+    response_model=BulkReservationOutputDTO,
+    responses=BULK_RESERVATION_RESPONSE_SCHEMAS,
+)
+async def create_reservations(
+    bulk_reservation: BulkReservationInputDTO,
+    reservation_dao: ReservationDAO = Depends(),
+) -> Union[BulkReservationOutputDTO, JSONResponse]:
+    """
+    Create several reservations at once.
+
+    An atomic request fails with the error of its first failed
+    reservation, otherwise a partially created batch answers
+    207 Multi-Status. The outcome of every reservation is reported.
+
+    :param bulk_reservation: reservations to create.
+    :param reservation_dao: DAO for reservation models.
+    :return: outcome of each reservation.
+    """
+    try:
+        outcomes = await reservation_dao.create_reservations(
+            bulk_reservation.reservations,
+            bulk_reservation.atomic,
+        )
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": "Something went wrong."},
+        )
+
+    report = BulkReservationOutputDTO(reservations=outcomes)
+    failures = [
+        outcome.status for outcome in outcomes if outcome.status in BULK_ITEM_ERRORS
+    ]
+    if not failures:
+        return report
+    if not bulk_reservation.atomic:
+        return JSONResponse(
+            status_code=status.HTTP_207_MULTI_STATUS,
+            content=jsonable_encoder(report),
+        )
+    error = BULK_ITEM_ERRORS[failures[0]]()
+    return JSONResponse(
+        status_code=error.status_code,
+        content={"message": error.message, **jsonable_encoder(report)},
+    )
@@ -1,6 +1,7 @@
 from fastapi.routing import APIRouter
 
 from car_rental_service.web.api import (
+    admin,
     docs,
     search,
     monitoring,
@@ -16,3 +17,4 @@ api_router.include_router(
     tags=["reservation"],
 )
 api_router.include_router(search.router, prefix="/search", tags=["search"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -1,5 +1,6 @@
 from uuid import UUID
-from datetime import datetime
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -18,7 +19,30 @@ class SearchOutputDTO(BaseModel):
     brand: str
     registered_number: str
     category_id: int
+    zone_id: Optional[int]
 
     class Config:
         orm_mode = True
         use_enum_values = True
+
+
+class FreeDaysDTO(BaseModel):
+    """Run of consecutive free days, both ends included."""
+
+    start_date: date
+    end_date: date
+
+
+class CarCalendarDTO(BaseModel):
+    """Free days of a car over the requested horizon."""
+
+    car_id: int
+    free: List[FreeDaysDTO]
+
+
+class SearchFacetsDTO(BaseModel):
+    """Number of available cars by category, brand and zone."""
+
+    category_id: Dict[int, int]
+    brand: Dict[str, int]
+    zone_id: Dict[int, int]
@@ -1,19 +1,125 @@
-from typing import List
-from fastapi import APIRouter
+from datetime import date
+from typing import Any, Dict, List, Optional, Union
+from fastapi import APIRouter, HTTPException, Query, status
 from fastapi.param_functions import Depends
 
-from car_rental_service.db.models.car import Car
 from car_rental_service.db.dao.car_dao import CarDAO
-from car_rental_service.web.api.search.schema import SearchOutputDTO
+from car_rental_service.schema import CarSort
+from car_rental_service.services.catalog.catalog import CarFilters, CarRecord
+from car_rental_service.settings import settings
+from car_rental_service.web.api.search.schema import (
+    CarCalendarDTO,
+    SearchFacetsDTO,
+    SearchOutputDTO,
+)
+from car_rental_service.web.responses import RawJSONResponse, encode_rows
 
 router = APIRouter()
 
+MAX_SEARCH_LIMIT = 1000
+MAX_CALENDAR_CARS = 100
+MAX_CALENDAR_DAYS = 366
 
-@router.get("/", response_model=List[SearchOutputDTO])
+
+def check_date_range(start_date: date, end_date: date) -> None:
+    """
+    Refuse a search interval ending before it starts.
+
+    :param start_date: first day of the interval.
+    :param end_date: last day of the interval.
+    :raises HTTPException: when `end_date` is before `start_date`.
+    """
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="end_date must not be before start_date.",
+        )
+
+
+@router.get(
+    "/",
+    response_model=List[SearchOutputDTO],
+    dependencies=[Depends(check_date_range)],
+)
 async def search(
     start_date: str,
     end_date: str,
     car_id: int = None,
+    category_id: Optional[int] = None,
+    brand: Optional[str] = None,
+    zone_id: Optional[int] = None,
+    sort: CarSort = CarSort.id,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_SEARCH_LIMIT),
+    car_dao: CarDAO = Depends(),
+) -> Union[List[CarRecord], RawJSONResponse]:
+    cars = await car_dao.get_available_cars(
+        start_date,
+        end_date,
+        car_id,
+        CarFilters(category_id, brand, zone_id),
+        sort,
+        limit,
+    )
+    if settings.raw_json_responses:
+        return RawJSONResponse(encode_rows(cars, SearchOutputDTO.__fields__))
+    return cars
+
+
+@router.get(
+    "/facets",
+    response_model=SearchFacetsDTO,
+    dependencies=[Depends(check_date_range)],
+)
+async def search_facets(
+    start_date: date,
+    end_date: date,
+    category_id: Optional[int] = None,
+    brand: Optional[str] = None,
+    zone_id: Optional[int] = None,
+    car_dao: CarDAO = Depends(),
+) -> Dict[str, Dict[Any, int]]:
+    """
+    Number of available cars by category, brand and zone.
+
+    :param start_date: first day of the interval.
+    :param end_date: last day of the interval.
+    :param category_id: only count cars of this category.
+    :param brand: only count cars of this brand.
+    :param zone_id: only count cars of this zone.
+    :param car_dao: car DAO.
+    :returns: counts by value of each facet.
+    """
+    return await car_dao.get_car_facets(
+        start_date,
+        end_date,
+        CarFilters(category_id, brand, zone_id),
+    )
+
+
+@router.get("/calendar", response_model=List[CarCalendarDTO])
+async def availability_calendar(
+    start_date: date,
+    car_id: List[int] = Query(..., max_items=MAX_CALENDAR_CARS),
+    days: int = Query(90, ge=1, le=MAX_CALENDAR_DAYS),
     car_dao: CarDAO = Depends(),
-) -> List[Car]:
-    return await car_dao.get_available_cars(start_date, end_date, car_id)
+) -> List[Dict[str, Any]]:
+    """
+    Free days of the cars over a horizon, in a single query.
+
+    :param start_date: first day of the horizon.
+    :param car_id: cars of the calendar, repeat the parameter for each.
+    :param days: length of the horizon.
+    :param car_dao: car DAO.
+    :returns: runs of free days of each existing car, by car id.
+    """
+    calendar = await car_dao.get_availability_calendar(car_id, start_date, days)
+    return [
+        {
+            "car_id": calendar_car_id,
+            "free": [
+                {"start_date": first_day, "end_date": last_day}
+                for first_day, last_day in free
+            ],
+        }
+        for calendar_car_id, free in calendar.items()
+    ]
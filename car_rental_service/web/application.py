@@ -5,6 +5,9 @@ from fastapi import FastAPI
 from fastapi.responses import UJSONResponse
 from fastapi.staticfiles import StaticFiles
 
+from car_rental_service.db.replicas import ReadYourWritesMiddleware
+from car_rental_service.services.metrics.middleware import PrometheusMiddleware
+from car_rental_service.settings import settings
 from car_rental_service.web.api.router import api_router
 from car_rental_service.web.lifetime import (
     register_shutdown_event,
@@ -36,6 +39,12 @@ def get_app() -> FastAPI:
     register_startup_event(app)
     register_shutdown_event(app)
 
+    # Sends the clients who just wrote to the primary database.
+    if settings.db_replica_urls:
+        app.add_middleware(ReadYourWritesMiddleware)
+    # Records the latency of every request.
+    app.add_middleware(PrometheusMiddleware)
+
     # Main router for the API.
     app.include_router(router=api_router, prefix="/api")
     # Adds static directory.
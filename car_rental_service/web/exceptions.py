@@ -35,3 +35,59 @@ class CarIsLockedForReservation(CustomException):
         self.message = "Car is locked for reservation."
         self.status_code = status.HTTP_406_NOT_ACCEPTABLE
         super().__init__(self.message, self.status_code)
+
+
+class PaymentFailed(CustomException):
+    def __init__(self):
+        self.message = "Payment failed."
+        self.status_code = status.HTTP_402_PAYMENT_REQUIRED
+        super().__init__(self.message, self.status_code)
+
+
+class InvalidCursor(CustomException):
+    def __init__(self):
+        self.message = "Invalid pagination cursor."
+        self.status_code = status.HTTP_400_BAD_REQUEST
+        super().__init__(self.message, self.status_code)
+
+
+class IdempotencyKeyInUse(CustomException):
+    def __init__(self):
+        self.message = "A request with this idempotency key is in progress."
+        self.status_code = status.HTTP_409_CONFLICT
+        super().__init__(self.message, self.status_code)
+
+
+class IdempotencyKeyReused(CustomException):
+    def __init__(self):
+        self.message = "Idempotency key was used with another request."
+        self.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+        super().__init__(self.message, self.status_code)
+
+
+class ReservationNotFound(CustomException):
+    def __init__(self):
+        self.message = "Reservation not found."
+        self.status_code = status.HTTP_404_NOT_FOUND
+        super().__init__(self.message, self.status_code)
+
+
+class ReservationNotOnHold(CustomException):
+    def __init__(self):
+        self.message = "Reservation is not on hold."
+        self.status_code = status.HTTP_409_CONFLICT
+        super().__init__(self.message, self.status_code)
+
+
+class ReservationNotActive(CustomException):
+    def __init__(self):
+        self.message = "Reservation is cancelled or expired."
+        self.status_code = status.HTTP_409_CONFLICT
+        super().__init__(self.message, self.status_code)
+
+
+class ReservationHoldExpired(CustomException):
+    def __init__(self):
+        self.message = "Reservation hold expired."
+        self.status_code = status.HTTP_410_GONE
+        super().__init__(self.message, self.status_code)
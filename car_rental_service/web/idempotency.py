@@ -0,0 +1,117 @@
+import hashlib
+import logging
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from starlette.responses import Response
+
+from car_rental_service.services.redis import idempotency
+from car_rental_service.settings import settings
+from car_rental_service.web.exceptions import IdempotencyKeyInUse, IdempotencyKeyReused
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Outcomes a retry may change, they are not replayed.
+UNSTORED_STATUSES = frozenset((406,))
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(payload: bytes) -> str:
+    """
+    Digest of a request payload, to tell a retry from a key reuse.
+
+    :param payload: canonical encoding of the request.
+    :returns: hex digest.
+    """
+    return hashlib.sha256(payload).hexdigest()
+
+
+async def run_idempotently(
+    redis: Redis,
+    scope: str,
+    key: str,
+    payload_fingerprint: str,
+    call: Callable[[], Awaitable[Response]],
+) -> Response:
+    """
+    Run a request once per idempotency key, replaying its response to retries.
+
+    A retry arriving while the original is in flight waits for its
+    response instead of running the request again. Server errors and
+    outcomes listed in `UNSTORED_STATUSES` free the key for a new attempt.
+
+    :param redis: redis client.
+    :param scope: operation the key applies to.
+    :param key: idempotency key sent by the client.
+    :param payload_fingerprint: digest of the request payload.
+    :param call: runs the request.
+    :raises IdempotencyKeyInUse: the original request is still running.
+    :raises IdempotencyKeyReused: the key came with another payload.
+    :returns: response of the request, replayed or not.
+    """
+    redis_key = idempotency.idempotency_key(scope, key)
+    while True:  # noqa: WPS457
+        pending = await idempotency.claim(
+            redis,
+            redis_key,
+            payload_fingerprint,
+            settings.idempotency_pending_ttl_ms,
+        )
+        if pending is not None:
+            break
+        entry = await idempotency.wait_for_response(
+            redis,
+            redis_key,
+            payload_fingerprint,
+            settings.idempotency_pending_ttl_ms / 1000,
+        )
+        # A freed key is claimed again.
+        if entry is not None:
+            if entry["fingerprint"] != payload_fingerprint:
+                raise IdempotencyKeyReused()
+            if "response" not in entry:
+                raise IdempotencyKeyInUse()
+            return replay(entry["response"])
+
+    try:
+        response = await call()
+    except BaseException:
+        await idempotency.abandon(redis, redis_key, pending)
+        raise
+    if response.status_code >= 500 or response.status_code in UNSTORED_STATUSES:
+        await idempotency.abandon(redis, redis_key, pending)
+    else:
+        stored = await idempotency.complete(
+            redis,
+            redis_key,
+            pending,
+            payload_fingerprint,
+            {
+                "status_code": response.status_code,
+                "headers": dict(response.headers),
+                "body": response.body.decode("utf-8"),
+            },
+            settings.idempotency_ttl_ms,
+        )
+        if not stored:
+            logger.warning(
+                "Claim of idempotency key %s expired before its response.",
+                redis_key,
+            )
+    return response
+
+
+def replay(stored: dict) -> Response:
+    """
+    Rebuild a stored response, flagged as replayed.
+
+    :param stored: status code, headers and body of the response.
+    :returns: response.
+    """
+    headers = {**stored["headers"], REPLAYED_HEADER: "true"}
+    return Response(
+        content=stored["body"].encode("utf-8"),
+        status_code=stored["status_code"],
+        headers=headers,
+    )
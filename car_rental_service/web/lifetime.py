@@ -1,17 +1,35 @@
-from asyncio import current_task
+import logging
+from asyncio import create_task, current_task, sleep
 from typing import Awaitable, Callable
 
 from fastapi import FastAPI
-from sqlalchemy.ext.asyncio import (
-    AsyncSession,
-    async_scoped_session,
-    create_async_engine,
-)
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
+from redis.asyncio import Redis
 from sqlalchemy.orm import sessionmaker
 
+from car_rental_service.db.dao.reservation_dao import ReservationDAO
+from car_rental_service.db.models import load_all_models
+from car_rental_service.db.pool import create_pooled_engine
+from car_rental_service.db.replicas import ReplicaSet
+from car_rental_service.db.warmup import warm_up_pool
+from car_rental_service.services.catalog.lifetime import (
+    init_car_catalog,
+    shutdown_car_catalog,
+)
+from car_rental_service.services.metrics.lifetime import (
+    init_metrics,
+    shutdown_metrics,
+)
+from car_rental_service.services.payment.lifetime import (
+    init_payment_gateway,
+    shutdown_payment_gateway,
+)
 from car_rental_service.services.redis.lifetime import init_redis, shutdown_redis
+from car_rental_service.services.redis.occupancy import rebuild_occupancy
 from car_rental_service.settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 def _setup_db(app: FastAPI) -> None:  # pragma: no cover
     """
@@ -23,7 +41,9 @@ def _setup_db(app: FastAPI) -> None:  # pragma: no cover
 
     :param app: fastAPI application.
     """
-    engine = create_async_engine(str(settings.db_url), echo=settings.db_echo)
+    # Flushes resolve foreign keys against every mapped table.
+    load_all_models()
+    engine = create_pooled_engine(str(settings.db_url))
     session_factory = async_scoped_session(
         sessionmaker(
             engine,
@@ -34,6 +54,68 @@ def _setup_db(app: FastAPI) -> None:  # pragma: no cover
     )
     app.state.db_engine = engine
     app.state.db_session_factory = session_factory
+    app.state.db_replicas = ReplicaSet(
+        [create_pooled_engine(url) for url in settings.db_replica_urls],
+        settings.db_replica_max_lag,
+    )
+
+
+async def _start_db(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Warms up the database pools and starts following the replicas' lag.
+
+    :param app: fastAPI application.
+    """
+    warmup_connections = min(
+        settings.db_warmup_connections,
+        settings.db_worker_pool_size,
+    )
+    await warm_up_pool(app.state.db_engine, warmup_connections)
+
+    replicas: ReplicaSet = app.state.db_replicas
+    await replicas.check_lags()
+    for replica_engine in replicas.in_sync_engines():
+        await warm_up_pool(replica_engine, warmup_connections, read_only=True)
+    app.state.db_replicas_monitor = create_task(
+        replicas.monitor(settings.db_replica_check_interval),
+    )
+
+
+async def _rebuild_occupancy_index(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Reconciles the occupancy bitmaps with the reservations table.
+
+    Searches keep using SQL until the rebuild completes.
+
+    :param app: fastAPI application.
+    """
+    async with AsyncSession(app.state.db_engine) as session:
+        async with Redis(connection_pool=app.state.redis_pool) as redis:
+            await rebuild_occupancy(redis, session)
+
+
+async def _sweep_expired_holds(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Releases the expired reservation holds, forever.
+
+    Sweeps follow each other while full batches are released. A failed
+    sweep, of the database or of Redis, is logged and retried later.
+
+    :param app: fastAPI application.
+    """
+    while True:  # noqa: WPS457
+        released = 0
+        try:
+            async with AsyncSession(app.state.db_engine) as session:
+                async with Redis(connection_pool=app.state.redis_pool) as redis:
+                    dao = ReservationDAO(session, redis, app.state.payment_gateway)
+                    released = await dao.expire_holds(
+                        settings.reservation_hold_sweep_batch_size,
+                    )
+        except Exception:
+            logger.exception("Sweeping the expired holds failed.")
+        if released < settings.reservation_hold_sweep_batch_size:
+            await sleep(settings.reservation_hold_sweep_interval)
 
 
 def register_startup_event(
@@ -52,7 +134,14 @@ def register_startup_event(
     @app.on_event("startup")
     async def _startup() -> None:  # noqa: WPS430
         _setup_db(app)
+        await _start_db(app)
         init_redis(app)
+        init_payment_gateway(app)
+        init_metrics(app)
+        await init_car_catalog(app)
+        if settings.occupancy_index:
+            app.state.occupancy_rebuild = create_task(_rebuild_occupancy_index(app))
+        app.state.hold_sweeper = create_task(_sweep_expired_holds(app))
         pass  # noqa: WPS420
 
     return _startup
@@ -70,9 +159,17 @@ def register_shutdown_event(
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:  # noqa: WPS430
+        if settings.occupancy_index:
+            app.state.occupancy_rebuild.cancel()
+        app.state.hold_sweeper.cancel()
+        await shutdown_car_catalog(app)
+        app.state.db_replicas_monitor.cancel()
         await app.state.db_engine.dispose()
+        await app.state.db_replicas.dispose()
 
         await shutdown_redis(app)
+        await shutdown_payment_gateway(app)
+        await shutdown_metrics(app)
         pass  # noqa: WPS420
 
     return _shutdown
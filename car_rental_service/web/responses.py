@@ -0,0 +1,98 @@
+import csv
+import io
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Sequence
+from uuid import UUID
+
+import ujson
+from starlette.responses import Response
+
+# Same representations pydantic's JSON encoder produces for these types.
+_ENCODERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    UUID: str,
+}
+
+
+class RawJSONResponse(Response):
+    """Response whose body is already encoded JSON."""
+
+    media_type = "application/json"
+
+
+def encode_row(row: Any, fields: Sequence[str]) -> Dict[str, Any]:
+    """
+    Pick the given fields of a row as JSON compatible values.
+
+    :param row: ORM object, SQLAlchemy row or named tuple.
+    :param fields: names of the fields to pick.
+    :returns: JSON compatible dict.
+    """
+    encoded = {}
+    for field in fields:
+        value = getattr(row, field)
+        encoder = _ENCODERS.get(type(value))
+        if encoder is None and isinstance(value, UUID):
+            # asyncpg returns its own UUID subclass.
+            encoder = str
+        encoded[field] = value if encoder is None else encoder(value)
+    return encoded
+
+
+def encode_rows(rows: Iterable[Any], fields: Sequence[str]) -> bytes:
+    """
+    Encode rows to a JSON array without validating them.
+
+    It skips the pydantic validation FastAPI runs on `response_model`,
+    so the fields must match the DTO declared for the route.
+
+    :param rows: ORM objects, SQLAlchemy rows or named tuples.
+    :param fields: names of the fields to encode.
+    :returns: encoded JSON array.
+    """
+    return ujson.dumps(
+        [encode_row(row, fields) for row in rows],
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+async def iter_ndjson(
+    partitions: AsyncIterator[List[Any]],
+    fields: Sequence[str],
+) -> AsyncIterator[bytes]:
+    """
+    Encode batches of rows to newline delimited JSON.
+
+    :param partitions: batches of ORM objects, SQLAlchemy rows or named tuples.
+    :param fields: names of the fields to encode.
+    :yields: one chunk of JSON lines per batch.
+    """
+    async for partition in partitions:
+        yield "".join(
+            ujson.dumps(encode_row(row, fields), ensure_ascii=False) + "\n"
+            for row in partition
+        ).encode("utf-8")
+
+
+async def iter_csv(
+    partitions: AsyncIterator[List[Any]],
+    fields: Sequence[str],
+) -> AsyncIterator[bytes]:
+    """
+    Encode batches of rows to CSV, starting with a header line.
+
+    :param partitions: batches of ORM objects, SQLAlchemy rows or named tuples.
+    :param fields: names of the fields to encode, used as the header.
+    :yields: the header, then one chunk of CSV lines per batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(fields))
+    writer.writeheader()
+    async for partition in partitions:
+        writer.writerows(encode_row(row, fields) for row in partition)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
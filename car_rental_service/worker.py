@@ -0,0 +1,42 @@
+"""Deliver the side effects of bookings from the outbox.
+
+Run with `python -m car_rental_service.worker`. Several workers can run
+side by side, each skips the events others are delivering.
+"""
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from car_rental_service.db.models import load_all_models
+from car_rental_service.db.pool import create_pooled_engine
+from car_rental_service.services.outbox.sink import LocalOutboxSink
+from car_rental_service.services.outbox.worker import run_worker
+from car_rental_service.settings import settings
+
+
+async def run() -> None:
+    """Deliver the events until interrupted."""
+    load_all_models()
+    engine = create_pooled_engine(str(settings.db_url))
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    sink = LocalOutboxSink()
+    try:
+        await run_worker(session_factory, sink)
+    finally:
+        await sink.close()
+        await engine.dispose()
+
+
+def main() -> None:
+    """Entrypoint of the outbox worker."""
+    logging.basicConfig(level=settings.log_level.value)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()